@@ -0,0 +1,84 @@
+"""
+Пропускная способность пакетного оформления заказов.
+
+Сравнивает оформление --orders заказов по одному (Order.add_order,
+--clients параллельных клиентов) и пакетами по --batch-size (Order.add_orders).
+
+    python -m benchmarks.batch_orders --orders 20000 --batch-size 500
+
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.seed import seed
+from config import settings
+from database import unit_of_work
+import models
+import schemas
+
+
+async def run(database_url: str, mode: str, orders: int, clients: int, batch_size: int) -> dict:
+    engine = create_async_engine(database_url, pool_size=clients, max_overflow=0)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await seed(engine, products=1000, orders=0)
+
+    async with session_factory() as db_async_session:
+        product_ids = (await db_async_session.scalars(select(models.Product.id))).all()
+    order_schemas = [
+        schemas.Order(product_id=random.choice(product_ids), quantity=1) for _ in range(orders)
+    ]
+    chunks = (
+        [[order] for order in order_schemas] if mode == "single"
+        else [order_schemas[i:i + batch_size] for i in range(0, orders, batch_size)]
+    )
+    created = 0
+
+    async def client() -> None:
+        nonlocal created
+        while chunks:
+            chunk = chunks.pop()
+            async with unit_of_work(session_factory()) as db_async_session:
+                if mode == "single":
+                    await models.Order.add_order(db_async_session, chunk[0])
+                    created += 1
+                else:
+                    results = await models.Order.add_orders(db_async_session, chunk)
+                    created += sum(result.order is not None for result in results)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    return {
+        "mode": mode,
+        "orders": orders,
+        "created": created,
+        "clients": clients,
+        "batch_size": batch_size if mode == "batch" else 1,
+        "orders_per_s": round(orders / elapsed, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--orders", type=int, default=20_000)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    for mode in ("single", "batch"):
+        report = asyncio.run(run(args.database_url, mode, args.orders, args.clients, args.batch_size))
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
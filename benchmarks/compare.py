@@ -0,0 +1,88 @@
+"""
+Сравнение двух запусков бенчмарков.
+
+Читает отчёты (строки JSON) базового и нового запуска, сопоставляет их
+по сценарию и выводит относительное изменение каждой метрики. Метрика
+считается регрессией, если она ухудшилась больше чем на --threshold;
+при наличии регрессий команда завершается с кодом 1.
+
+    python -m benchmarks.compare before.jsonl after.jsonl --threshold 0.1
+
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+# Metric -> True if a larger value is better
+METRICS = {
+    "requests_per_s": True,
+    "orders_per_s": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "errors": False,
+}
+KEY_FIELDS = ("scenario", "query", "mode", "workers")
+
+
+def report_key(report: dict) -> str:
+    return "/".join(str(report[field]) for field in KEY_FIELDS if field in report)
+
+
+def read_reports(path: str) -> Dict[str, dict]:
+    with open(path) as file:
+        reports = [json.loads(line) for line in file if line.strip()]
+    return {report_key(report): report for report in reports}
+
+
+def compare(baseline: Dict[str, dict], current: Dict[str, dict], threshold: float) -> List[dict]:
+    """
+    Изменения метрик по сценариям, присутствующим в обоих запусках.
+    `change` - относительное изменение, положительное значение - улучшение.
+
+    """
+    results = []
+    for key in baseline.keys() & current.keys():
+        for metric, higher_is_better in METRICS.items():
+            before = baseline[key].get(metric)
+            after = current[key].get(metric)
+            if before is None or after is None:
+                continue
+            gain = after - before if higher_is_better else before - after
+            if before:
+                change = gain / before
+            else:
+                change = 0.0 if not gain else gain * float("inf")
+            results.append({
+                "scenario": key,
+                "metric": metric,
+                "before": before,
+                "after": after,
+                "change": round(change, 3),
+                "regression": change < -threshold,
+            })
+
+    results.sort(key=lambda result: (result["scenario"], result["metric"]))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline", help="отчёт базового запуска")
+    parser.add_argument("current", help="отчёт нового запуска")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="допустимое ухудшение, доля от базового значения"
+    )
+    args = parser.parse_args()
+
+    results = compare(read_reports(args.baseline), read_reports(args.current), args.threshold)
+    for result in results:
+        print(json.dumps(result))
+
+    if any(result["regression"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
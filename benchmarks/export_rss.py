@@ -0,0 +1,118 @@
+"""
+Пиковое потребление памяти (RSS) при выгрузке заказов.
+
+Сравнивает потоковую выгрузку через серверный курсор
+с загрузкой всего списка в память, как это делал GET /api/orders.
+
+    python -m benchmarks.export_rss --orders 1000000 --seed
+
+Режимы запускаются в отдельных процессах, так как пиковый RSS
+процесса со временем только растёт.
+
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.seed import seed
+from config import settings
+import models
+import schemas
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def measure(database_url: str, mode: str, export_format: schemas.DataFormat) -> dict:
+    engine = create_async_engine(database_url)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db_async_session:
+        total = await db_async_session.scalar(select(func.count(models.OrderItem.id)))
+
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    first_chunk_at, rows, size = None, 0, 0
+
+    async def open_session() -> AsyncSession:
+        return session_factory()
+
+    if mode == "stream":
+        async for chunk in models.Order.export_orders(open_session, export_format):
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            size += len(chunk.encode())
+            rows += chunk.count("\n")
+    else:
+        async with session_factory() as db_async_session:
+            result = await db_async_session.execute(select(models.OrderItem))
+            order_items = result.unique().scalars().all()
+            first_chunk_at = time.perf_counter()
+            body = json.dumps(
+                [schemas.OrderResponse.model_validate(item).model_dump() for item in order_items]
+            )
+            rows, size = len(order_items), len(body.encode())
+
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    return {
+        "mode": mode,
+        "format": export_format.value,
+        "table_rows": total,
+        "exported_lines": rows,
+        "bytes": size,
+        "first_chunk_ms": round((first_chunk_at - started) * 1000, 2),
+        "total_s": round(elapsed, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--seed", action="store_true", help="наполнить БД перед замером")
+    parser.add_argument("--format", default="ndjson", choices=[f.value for f in schemas.DataFormat])
+    parser.add_argument("--mode", choices=["stream", "load_all"])
+    parser.add_argument("--skip-load-all", action="store_true", help="не запускать замер без курсора")
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        report = asyncio.run(measure(args.database_url, args.mode, schemas.DataFormat(args.format)))
+        print(json.dumps(report))
+        return
+
+    if args.seed:
+        async def run_seed() -> None:
+            engine = create_async_engine(args.database_url)
+            await seed(engine, products=1000, orders=args.orders)
+            await engine.dispose()
+        asyncio.run(run_seed())
+
+    modes = ["stream"] if args.skip_load_all else ["stream", "load_all"]
+    for mode in modes:
+        subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.export_rss",
+                "--database-url", args.database_url,
+                "--format", args.format,
+                "--mode", mode,
+            ],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
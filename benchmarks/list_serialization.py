@@ -0,0 +1,89 @@
+"""
+Скорость отдачи списков товаров и заказов через API.
+
+Постранично читает --rows строк из GET /api/products и GET /api/orders
+(приложение вызывается в процессе через ASGI) с обычной сериализацией
+через ORM и response_model и с FAST_LIST_SERIALIZATION.
+
+    python -m benchmarks.list_serialization --rows 100000 --seed
+
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.seed import seed
+from config import settings
+from database import make_session_factory, unit_of_work
+from main import app, get_db_read_session
+import pagination
+
+
+async def read_rows(client: httpx.AsyncClient, path: str, rows: int, limit: int) -> int:
+    read, cursor = 0, None
+    while read < rows:
+        params = {"limit": limit} if cursor is None else {"limit": limit, "cursor": cursor}
+        response = await client.get(path, params=params)
+        response.raise_for_status()
+        read += len(response.json())
+        cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    return read
+
+
+async def run(database_url: str, rows: int, limit: int, repeat: int, seed_data: bool) -> list:
+    engine = create_async_engine(database_url)
+    session_factory = make_session_factory(engine)
+    if seed_data:
+        await seed(engine, products=rows, orders=rows)
+
+    async def override_get_db():
+        async with unit_of_work(session_factory(), read_only=True) as db_async_session:
+            yield db_async_session
+
+    app.dependency_overrides[get_db_read_session] = override_get_db
+    reports = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ("/api/products", "/api/orders"):
+            for fast in (False, True):
+                settings.fast_list_serialization = fast
+                await read_rows(client, path, limit, limit)
+                best = None
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    read = await read_rows(client, path, rows, limit)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                reports.append({
+                    "path": path,
+                    "mode": "fast" if fast else "orm",
+                    "rows": read,
+                    "page_size": limit,
+                    "rows_per_s": round(read / best),
+                })
+    await engine.dispose()
+
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", action="store_true", help="наполнить БД перед замером")
+    args = parser.parse_args()
+
+    for report in asyncio.run(run(args.database_url, args.rows, args.limit, args.repeat, args.seed)):
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
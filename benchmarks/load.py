@@ -0,0 +1,183 @@
+"""
+Нагрузочные сценарии для API.
+
+Каждый сценарий выполняет --requests запросов силами --concurrency
+параллельных клиентов и выводит строку JSON с пропускной способностью
+и задержками p50/p95/p99. Запросы идут через httpx либо к приложению
+в том же процессе (по умолчанию, БД из настроек), либо к запущенному
+серверу (--base-url).
+
+    python -m benchmarks.load --seed --products 10000 --orders 100000 > before.jsonl
+    python -m benchmarks.load --base-url http://localhost:8000 --scenario list_products
+
+Отчёты двух запусков сравниваются командой python -m benchmarks.compare.
+
+"""
+import argparse
+import asyncio
+from contextlib import asynccontextmanager
+import json
+import random
+import statistics
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.seed import seed
+from config import settings
+
+Request = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+
+class Targets:
+    """ID товаров и заказов, по которым ходят сценарии."""
+
+    def __init__(self, product_ids: List[int], order_ids: List[int]) -> None:
+        # The first product is the hot SKU, the rest are ordered evenly
+        self.hot_product_id = product_ids[0]
+        self.cold_product_ids = product_ids[1:] or product_ids
+        self.product_ids = product_ids
+        self.order_ids = order_ids
+
+    @classmethod
+    async def load(cls, client: httpx.AsyncClient) -> "Targets":
+        products = (await client.get("/api/products", params={"limit": 1000})).json()
+        orders = (await client.get("/api/orders", params={"limit": 1000, "order": "desc"})).json()
+        if not products or not orders:
+            raise SystemExit("Нет товаров или заказов: запустите с --seed")
+        return cls([product["id"] for product in products], [order["id"] for order in orders])
+
+
+def make_scenarios(targets: Targets) -> Dict[str, Request]:
+    def create_order(product_ids: Callable[[], int]) -> Request:
+        return lambda client: client.post(
+            "/api/orders", json={"product_id": product_ids(), "quantity": 1}
+        )
+
+    return {
+        "list_products": lambda client: client.get("/api/products", params={"limit": 100}),
+        "list_orders": lambda client: client.get("/api/orders", params={"limit": 100}),
+        "product_detail": lambda client: client.get(
+            "/api/products/%s" % random.choice(targets.product_ids)
+        ),
+        "order_detail": lambda client: client.get(
+            "/api/orders/%s" % random.choice(targets.order_ids)
+        ),
+        "create_order_hot": create_order(lambda: targets.hot_product_id),
+        "create_order_cold": create_order(lambda: random.choice(targets.cold_product_ids)),
+        "update_status": lambda client: client.patch(
+            "/api/orders/%s" % random.choice(targets.order_ids),
+            json={"status_id": random.randint(1, 3)},
+        ),
+    }
+
+
+async def run_scenario(
+        client: httpx.AsyncClient,
+        name: str,
+        request: Request,
+        requests: int,
+        concurrency: int,
+) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await request(client)
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += response.is_error
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(percentiles[49], 2),
+        "p95_ms": round(percentiles[94], 2),
+        "p99_ms": round(percentiles[98], 2),
+    }
+
+
+@asynccontextmanager
+async def open_client(base_url: Optional[str], concurrency: int) -> AsyncIterator[httpx.AsyncClient]:
+    if base_url is not None:
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            yield client
+        return
+
+    # Imported here, so that a run against a server does not open the app's engines
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=60
+        ) as client:
+            yield client
+
+
+async def run(
+        base_url: Optional[str],
+        scenarios: List[str],
+        requests: int,
+        concurrency: int,
+) -> List[dict]:
+    reports = []
+    async with open_client(base_url, concurrency) as client:
+        available = make_scenarios(await Targets.load(client))
+        for name in scenarios:
+            reports.append(
+                await run_scenario(client, name, available[name], requests, concurrency)
+            )
+
+    return reports
+
+
+def main() -> None:
+    scenario_names = list(make_scenarios(Targets([0], [0])))
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", help="адрес запущенного сервера вместо приложения в процессе")
+    parser.add_argument("--database-url", default=settings.database_url, help="БД для --seed")
+    parser.add_argument("--seed", action="store_true", help="наполнить БД перед замером")
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument(
+        "--scenario", action="append", choices=scenario_names,
+        help="сценарий, можно указать несколько раз; по умолчанию все",
+    )
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.seed:
+        async def run_seed() -> None:
+            engine = create_async_engine(args.database_url)
+            await seed(engine, args.products, args.orders)
+            await engine.dispose()
+
+        asyncio.run(run_seed())
+
+    reports = asyncio.run(run(
+        args.base_url, args.scenario or scenario_names, args.requests, args.concurrency
+    ))
+    for report in reports:
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
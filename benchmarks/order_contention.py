@@ -0,0 +1,157 @@
+"""
+Конкурентное оформление заказов на один товар.
+
+N клиентов параллельно заказывают по одной единице одного товара,
+пока суммарно не будет сделано --attempts попыток. Отчёт содержит
+пропускную способность и проверку, что остаток не ушёл в минус
+и что число успешных заказов совпадает со списанным количеством.
+
+    python -m benchmarks.order_contention --clients 50 --stock 5000 --attempts 10000
+
+По умолчанию сравниваются два режима хранения остатка: atomic - в строке
+товара, sharded - в --shards счётчиках. Режим --mode можно указать несколько
+раз; --mode naive воспроизводит прежнюю схему "прочитать - проверить - записать".
+
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import settings
+from database import unit_of_work
+import migrate
+import models
+import schemas
+
+PRODUCT_NAME = "bench-contention-product"
+
+
+async def naive_add_order(db_async_session: AsyncSession, order_schema: schemas.Order) -> None:
+    product = await db_async_session.get(models.Product, order_schema.product_id)
+    await db_async_session.aclose()
+    if product.quantity < order_schema.quantity:
+        raise HTTPException(status_code=409)
+    async with db_async_session.begin():
+        db_async_session.add(
+            models.OrderItem(product_id=product.id, order=models.Order(), quantity=order_schema.quantity)
+        )
+        product.stored_quantity -= order_schema.quantity
+        await db_async_session.merge(product)
+
+
+async def atomic_add_order(db_async_session: AsyncSession, order_schema: schemas.Order) -> None:
+    async with unit_of_work(db_async_session):
+        await models.Order.add_order(db_async_session, order_schema)
+
+
+async def run(
+        database_url: str, mode: str, clients: int, stock: int, attempts: int, shards: int
+) -> dict:
+    engine = create_async_engine(database_url, pool_size=clients, max_overflow=0)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    await migrate.upgrade(engine)
+    async with unit_of_work(session_factory()) as db_async_session:
+        await db_async_session.execute(delete(models.Product).where(models.Product.name == PRODUCT_NAME))
+        product = await models.Product.add_product(
+            db_async_session,
+            schemas.Product(name=PRODUCT_NAME, description="", price=1, quantity=stock),
+        )
+        if mode == "sharded":
+            await models.StockShard.set_shards(
+                db_async_session, product.id, schemas.StockShardsUpdate(shards=shards)
+            )
+
+    add_order = naive_add_order if mode == "naive" else atomic_add_order
+    order_schema = schemas.Order(product_id=product.id, quantity=1)
+    remaining = attempts
+    succeeded = rejected = 0
+    min_quantity_seen = stock
+
+    async def client() -> None:
+        nonlocal remaining, succeeded, rejected
+        while remaining > 0:
+            remaining -= 1
+            async with session_factory() as db_async_session:
+                try:
+                    await add_order(db_async_session, order_schema)
+                    succeeded += 1
+                except HTTPException:
+                    rejected += 1
+
+    async def watch_stock() -> None:
+        nonlocal min_quantity_seen
+        while remaining > 0:
+            async with session_factory() as db_async_session:
+                quantity = await db_async_session.scalar(
+                    select(models.Product.quantity).where(models.Product.id == product.id)
+                )
+            min_quantity_seen = min(min_quantity_seen, quantity)
+            await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    await asyncio.gather(watch_stock(), *(client() for _ in range(clients - 1)))
+    elapsed = time.perf_counter() - started
+
+    async with session_factory() as db_async_session:
+        final_quantity = await db_async_session.scalar(
+            select(models.Product.quantity).where(models.Product.id == product.id)
+        )
+        ordered = await db_async_session.scalar(
+            select(func.coalesce(func.sum(models.OrderItem.quantity), 0))
+            .where(models.OrderItem.product_id == product.id)
+        )
+        min_shard = await db_async_session.scalar(
+            select(func.min(models.StockShard.quantity))
+            .where(models.StockShard.product_id == product.id)
+        )
+    await engine.dispose()
+
+    return {
+        "mode": mode,
+        "shards": shards if mode == "sharded" else 0,
+        "clients": clients,
+        "attempts": attempts,
+        "succeeded": succeeded,
+        "rejected": rejected,
+        "orders_per_s": round(attempts / elapsed, 1),
+        "initial_stock": stock,
+        "final_stock": final_quantity,
+        "min_stock_seen": min(min_quantity_seen, final_quantity),
+        "ordered_units": ordered,
+        "consistent": (
+            final_quantity >= 0
+            and (min_shard is None or min_shard >= 0)
+            and stock - final_quantity == ordered == succeeded
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument(
+        "--mode", action="append", choices=["atomic", "sharded", "naive"],
+        help="режим резервирования, можно указать несколько раз",
+    )
+    parser.add_argument("--shards", type=int, default=16, help="число счётчиков в режиме sharded")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--stock", type=int, default=5000)
+    parser.add_argument("--attempts", type=int, default=10000)
+    args = parser.parse_args()
+
+    for mode in args.mode or ["atomic", "sharded"]:
+        report = asyncio.run(run(
+            args.database_url, mode, args.clients, args.stock, args.attempts, args.shards
+        ))
+        print(json.dumps(report), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Объём и время передачи списков товаров и заказов через API.
+
+Постранично читает --rows строк из GET /api/products и GET /api/orders
+(приложение вызывается в процессе через ASGI) целиком и с параметром fields,
+без сжатия, с gzip и с brotli (если установлен пакет brotli). Для каждого
+варианта выводит байты, переданные клиенту, и время чтения всех строк.
+
+    python -m benchmarks.payload_size --rows 10000 --seed
+
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Optional
+
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.seed import seed
+import compression
+from config import settings
+from database import make_session_factory, unit_of_work
+from main import app, get_db_read_session
+import pagination
+
+FIELDS = {
+    "/api/products": "id,quantity",
+    "/api/orders": "id,quantity,status",
+}
+
+
+async def read_rows(
+    client: httpx.AsyncClient, path: str, rows: int, limit: int,
+    fields: Optional[str], encoding: str,
+) -> tuple:
+    read, downloaded, cursor = 0, 0, None
+    while read < rows:
+        params = {"limit": limit}
+        if cursor is not None:
+            params["cursor"] = cursor
+        if fields is not None:
+            params["fields"] = fields
+        response = await client.get(path, params=params, headers={"Accept-Encoding": encoding})
+        response.raise_for_status()
+        read += len(response.json())
+        downloaded += response.num_bytes_downloaded
+        cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    return read, downloaded
+
+
+async def run(database_url: str, rows: int, limit: int, repeat: int, seed_data: bool) -> list:
+    engine = create_async_engine(database_url)
+    session_factory = make_session_factory(engine)
+    if seed_data:
+        await seed(engine, products=rows, orders=rows)
+
+    async def override_get_db():
+        async with unit_of_work(session_factory(), read_only=True) as db_async_session:
+            yield db_async_session
+
+    app.dependency_overrides[get_db_read_session] = override_get_db
+    # Both variants are served without ORM objects, so only the payload differs
+    settings.fast_list_serialization = True
+    encodings = ["identity", *reversed(compression.supported_encodings())]
+    reports = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path, path_fields in FIELDS.items():
+            for fields in (None, path_fields):
+                for encoding in encodings:
+                    await read_rows(client, path, limit, limit, fields, encoding)
+                    best = None
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        read, downloaded = await read_rows(
+                            client, path, rows, limit, fields, encoding
+                        )
+                        elapsed = time.perf_counter() - started
+                        best = elapsed if best is None else min(best, elapsed)
+                    reports.append({
+                        "path": path,
+                        "fields": fields or "all",
+                        "encoding": encoding,
+                        "rows": read,
+                        "page_size": limit,
+                        "bytes": downloaded,
+                        "ms": round(best * 1000, 1),
+                    })
+    await engine.dispose()
+
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", action="store_true", help="наполнить БД перед замером")
+    args = parser.parse_args()
+
+    for report in asyncio.run(run(args.database_url, args.rows, args.limit, args.repeat, args.seed)):
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Задержка поиска товаров (Product.search_products).
+
+Наполняет БД --products товарами из случайных слов и выполняет --queries
+запросов каждого вида: начало слова, слово целиком, слово с опечаткой
+и два слова из описания одного товара.
+
+    python -m benchmarks.product_search --products 1000000 --queries 300
+
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import string
+import time
+from typing import List
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from config import settings
+import migrate
+import models
+import schemas
+
+SEED_PRODUCTS = text(
+    """
+    INSERT INTO products (name, description, price, quantity)
+    SELECT words[1 + floor(random() * cardinality(words))::int] || ' '
+               || words[1 + floor(random() * cardinality(words))::int] || ' ' || g,
+           array_to_string(ARRAY(
+               SELECT words[1 + floor(random() * cardinality(words))::int]
+               FROM generate_series(1, 8)
+               WHERE g > 0
+           ), ' '),
+           round((random() * 1000)::numeric, 2),
+           100
+    FROM generate_series(CAST(:start AS int), CAST(:stop AS int)) AS g, (SELECT CAST(:words AS text[]) AS words) AS w
+    ON CONFLICT (name) DO NOTHING
+    """
+)
+
+
+def make_words(count: int) -> List[str]:
+    rng = random.Random(0)
+    syllables = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"]
+    return sorted({"".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(count)})
+
+
+def with_typo(word: str) -> str:
+    position = random.randrange(1, len(word) - 1)
+    return word[:position] + random.choice(string.ascii_lowercase) + word[position + 1:]
+
+
+async def seed_products(engine: AsyncEngine, products: int, words: List[str]) -> None:
+    await migrate.upgrade(engine)
+    async with engine.connect() as conn:
+        existing = await conn.scalar(select(func.count()).select_from(models.Product))
+    for start in range(existing + 1, products + 1, 100_000):
+        async with AsyncSession(engine) as db_async_session, db_async_session.begin():
+            last_id = await db_async_session.scalar(
+                select(func.coalesce(func.max(models.Product.id), 0))
+            )
+            await db_async_session.execute(
+                SEED_PRODUCTS,
+                {"start": start, "stop": min(start + 99_999, products), "words": words},
+            )
+            await models.ProductTerm.index_products(db_async_session, models.Product.id > last_id)
+    async with engine.connect() as conn:
+        for table in ("products", "product_terms", "search_terms"):
+            await conn.execute(text("ANALYZE %s" % table))
+
+
+async def sample_descriptions(engine: AsyncEngine, count: int) -> List[List[str]]:
+    async with engine.connect() as conn:
+        rows = await conn.execute(
+            select(models.Product.description)
+            .order_by(func.random())
+            .limit(count)
+        )
+        return [description.split() for description, in rows]
+
+
+async def run(database_url: str, products: int, queries: int) -> List[dict]:
+    engine = create_async_engine(database_url)
+    words = make_words(5000)
+    await seed_products(engine, products, words)
+    descriptions = await sample_descriptions(engine, queries)
+
+    kinds = {
+        "prefix": lambda: random.choice(words)[:4],
+        "word": lambda: random.choice(words),
+        "typo": lambda: with_typo(random.choice(words)),
+        "two_words": lambda: " ".join(random.sample(random.choice(descriptions), 2)),
+    }
+    reports = []
+    for kind, make_query in kinds.items():
+        latencies, found = [], 0
+        for _ in range(queries):
+            params = schemas.ProductSearchParams(q=make_query(), limit=20)
+            async with AsyncSession(engine) as db_async_session:
+                started = time.perf_counter()
+                page = await models.Product.search_products(db_async_session, params)
+                latencies.append((time.perf_counter() - started) * 1000)
+            found += bool(page.items)
+        percentiles = statistics.quantiles(latencies, n=100)
+        reports.append({
+            "query": kind,
+            "products": products,
+            "queries": queries,
+            "found_share": round(found / queries, 2),
+            "p50_ms": round(percentiles[49], 2),
+            "p95_ms": round(percentiles[94], 2),
+            "p99_ms": round(percentiles[98], 2),
+        })
+    await engine.dispose()
+
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    for report in asyncio.run(run(args.database_url, args.products, args.queries)):
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
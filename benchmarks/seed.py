@@ -0,0 +1,98 @@
+"""
+Наполнение БД синтетическими данными для бенчмарков.
+
+    python -m benchmarks.seed --products 10000 --orders 1000000
+
+"""
+import argparse
+import asyncio
+from datetime import date
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from config import settings
+from database import unit_of_work
+import migrate
+import models
+import partitions
+
+SEED_PRODUCTS = text(
+    """
+    INSERT INTO products (name, description, price, quantity)
+    SELECT 'bench-product-' || g,
+           'Benchmark product ' || g,
+           round((random() * 1000)::numeric, 2),
+           :quantity
+    FROM generate_series(1, :count) AS g
+    ON CONFLICT (name) DO NOTHING
+    """
+)
+
+SEED_ORDERS = text(
+    """
+    WITH new_orders AS (
+        INSERT INTO orders (created_at, status_id)
+        SELECT now() - random() * interval '365 days', 1 + g % 3
+        FROM generate_series(1, :count) AS g
+        RETURNING id, created_at
+    )
+    INSERT INTO order_items (product_id, order_id, created_at, quantity)
+    SELECT p.ids[1 + new_orders.id % cardinality(p.ids)], new_orders.id, new_orders.created_at,
+           1 + new_orders.id % 5
+    FROM new_orders, (SELECT array_agg(id) AS ids FROM products) AS p
+    """
+)
+
+
+async def seed(
+        engine: AsyncEngine,
+        products: int,
+        orders: int,
+        product_quantity: int = 1_000_000,
+        batch_size: int = 100_000,
+) -> None:
+    await migrate.upgrade(engine)
+
+    async with AsyncSession(engine) as db_async_session, db_async_session.begin():
+        last_id = await db_async_session.scalar(
+            select(func.coalesce(func.max(models.Product.id), 0))
+        )
+        await db_async_session.execute(
+            SEED_PRODUCTS, {"count": products, "quantity": product_quantity}
+        )
+        await models.ProductTerm.index_products(db_async_session, models.Product.id > last_id)
+
+    # Orders are spread over the last year: each month gets its partition
+    today = date.today()
+    async with AsyncSession(engine) as db_async_session, db_async_session.begin():
+        await partitions.create_partitions(
+            db_async_session, partitions.add_months(today, -12), partitions.add_months(today, 1)
+        )
+
+    for start in range(0, orders, batch_size):
+        async with engine.begin() as conn:
+            await conn.execute(SEED_ORDERS, {"count": min(batch_size, orders - start)})
+    if orders:
+        # Seeded orders bypass Order.add_order, so the summary is recounted once
+        async with unit_of_work(AsyncSession(engine)) as db_async_session:
+            await models.OrderStats.rebuild(db_async_session)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    args = parser.parse_args()
+
+    async def run() -> None:
+        engine = create_async_engine(args.database_url)
+        await seed(engine, args.products, args.orders)
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
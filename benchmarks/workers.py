@@ -0,0 +1,96 @@
+"""
+Масштабирование пропускной способности по числу воркеров.
+
+Для каждого значения --workers запускает `python server.py` с этим числом
+воркеров, выполняет нагрузочные сценарии из benchmarks.load через HTTP
+и останавливает сервер. Выводит строки JSON отчётов load с полем workers.
+
+    python -m benchmarks.workers --workers 1 --workers 2 --workers 4 --scenario list_products
+
+Клиент нагрузки работает в одном процессе: при большом числе воркеров
+он сам может стать узким местом, тогда увеличьте --concurrency.
+
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+import httpx
+
+from benchmarks.load import make_scenarios, run, Targets
+from config import settings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT = 60
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("Сервер завершился с кодом %s" % server.returncode)
+        try:
+            if httpx.get(base_url + "/metrics", timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit("Сервер не запустился за %s с" % STARTUP_TIMEOUT)
+
+
+def measure(
+        workers: int,
+        port: int,
+        database_url: str,
+        scenarios: List[str],
+        requests: int,
+        concurrency: int,
+) -> List[dict]:
+    base_url = "http://127.0.0.1:%s" % port
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers)],
+        cwd=ROOT,
+        env={**os.environ, "DATABASE_URL": database_url},
+    )
+    try:
+        wait_until_ready(base_url, server)
+        reports = asyncio.run(run(base_url, scenarios, requests, concurrency))
+    finally:
+        # SIGTERM: the graceful shutdown path of the production deployment
+        server.terminate()
+        server.wait()
+
+    return [{**report, "workers": workers} for report in reports]
+
+
+def main() -> None:
+    scenario_names = list(make_scenarios(Targets([0], [0])))
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers", type=int, action="append", help="число воркеров, можно указать несколько раз"
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--scenario", action="append", choices=scenario_names)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    for workers in args.workers or [1, 2, 4]:
+        for report in measure(
+                workers, args.port, args.database_url,
+                args.scenario or ["list_products", "product_detail", "create_order_cold"],
+                args.requests, args.concurrency,
+        ):
+            print(json.dumps(report), flush=True)
+
+
+if __name__ == "__main__":
+    main()
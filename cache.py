@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Protocol, Sequence, Set, Tuple, Type
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from config import settings
+import schemas
+
+# Channel of the NOTIFY that tells every process which products to drop
+INVALIDATION_CHANNEL = "product_cache"
+# Payload meaning "drop everything", also used when the IDs don't fit into one NOTIFY
+INVALIDATE_ALL = "*"
+# NOTIFY payloads are limited to 8000 bytes
+MAX_PAYLOAD = 7000
+# Pause before reconnecting a lost LISTEN connection, s
+LISTEN_RETRY_INTERVAL = 1
+
+logger = logging.getLogger("warehouse.cache")
+
+
+class LRUCache:
+    """
+    Кэш в памяти процесса с ограничением размера и временем жизни записей.
+    При переполнении вытесняется запись, к которой дольше всего не обращались.
+
+    """
+
+    def __init__(
+            self,
+            maxsize: int,
+            ttl: float,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (self._clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+def invalidation_payload(product_ids: Sequence[int]) -> str:
+    """Текст NOTIFY о сбросе товаров `product_ids`, без них - всего кэша."""
+    payload = ",".join(str(product_id) for product_id in sorted(set(product_ids)))
+    return payload if payload and len(payload) <= MAX_PAYLOAD else INVALIDATE_ALL
+
+
+class CacheBackend(Protocol):
+    """
+    Общий для всех процессов кэш, например Redis.
+
+    """
+
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    async def delete(self, *keys: str) -> None: ...
+
+    async def clear(self, prefix: str) -> None: ...
+
+
+class InMemoryBackend:
+    """
+    Замена общего кэша в памяти процесса для тестов и локального запуска.
+
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self._data: Dict[str, Tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= self._clock():
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._data[key] = (self._clock() + ttl, value)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def clear(self, prefix: str) -> None:
+        for key in [key for key in self._data if key.startswith(prefix)]:
+            del self._data[key]
+
+
+class RedisBackend:
+    """
+    Общий кэш в Redis. Требует установленного пакета redis.
+
+    """
+
+    def __init__(self, url: str) -> None:
+        try:
+            from redis import asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("Shared cache backend requires the 'redis' package") from exc
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._redis.set(key, value, px=int(ttl * 1000))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._redis.delete(*keys)
+
+    async def clear(self, prefix: str) -> None:
+        async for key in self._redis.scan_iter(match=prefix + "*"):
+            await self._redis.delete(key)
+
+
+class ProductCache:
+    """
+    Кэш ответов GET /api/products/{id}: LRU в памяти процесса
+    и, при наличии, общий кэш за ним.
+
+    Решения об остатках на складе кэш не принимает: он используется
+    только для чтения карточки товара.
+
+    Изменения товара сбрасывают запись в этом процессе и в общем кэше
+    после фиксации транзакции, а в остальных процессах - по уведомлению
+    NOTIFY из той же транзакции (Product.invalidate_cached, InvalidationListener). Записи кэша
+    читаются только с основной БД: реплика могла ещё не получить изменение.
+
+    `schema` задаёт модель, в которую читаются записи общего кэша.
+
+    """
+
+    prefix = "product:"
+
+    def __init__(
+            self,
+            local: LRUCache,
+            shared: Optional[CacheBackend] = None,
+            shared_ttl: float = 300,
+            schema: Type[schemas.ProductResponse] = schemas.ProductResponse,
+    ) -> None:
+        self.local = local
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.schema = schema
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Off while the process can't receive invalidations from other processes
+        self.local_enabled = True
+        # Bumped on every invalidation. A value read from the DB is cached only
+        # if no invalidation happened in between, so a slow reader cannot put
+        # back a product that was changed while it was being read.
+        self.generation = 0
+
+    async def get(self, product_id: int) -> Optional[schemas.ProductResponse]:
+        product = self.local.get(product_id) if self.local_enabled else None
+        if product is not None:
+            self.hits += 1
+            return product
+
+        if self.shared is not None:
+            raw = await self.shared.get(self.prefix + str(product_id))
+            if raw is not None:
+                product = self.schema.model_validate_json(raw)
+                if self.local_enabled:
+                    self.local.set(product_id, product)
+                self.hits += 1
+                self.shared_hits += 1
+                return product
+
+        self.misses += 1
+        return None
+
+    async def set(self, product: schemas.ProductResponse, generation: int) -> None:
+        if generation != self.generation:
+            return
+        if self.local_enabled:
+            self.local.set(product.id, product)
+        if self.shared is not None:
+            key = self.prefix + str(product.id)
+            await self.shared.set(key, product.model_dump_json().encode(), self.shared_ttl)
+            # An invalidation that arrived while writing may have deleted the key
+            # before this value landed: the value may be stale, so it goes too
+            if generation != self.generation:
+                await self.shared.delete(key)
+
+    async def invalidate(self, *product_ids: int) -> None:
+        self.generation += 1
+        self.invalidations += len(product_ids)
+        for product_id in product_ids:
+            self.local.delete(product_id)
+        if self.shared is not None:
+            await self.shared.delete(*(self.prefix + str(product_id) for product_id in product_ids))
+
+    async def clear(self) -> None:
+        self.generation += 1
+        self.local.clear()
+        if self.shared is not None:
+            await self.shared.clear(self.prefix)
+
+    def evict(self, *product_ids: int) -> None:
+        """Сбрасывает записи только в этом процессе, без `product_ids` - все."""
+        self.generation += 1
+        if not product_ids:
+            self.local.clear()
+        for product_id in product_ids:
+            self.local.delete(product_id)
+
+    async def evict_shared(self, *product_ids: int) -> None:
+        """
+        Сбрасывает записи в общем кэше, без `product_ids` - все. Процесс,
+        который изменил товары, уже сбросил их, но другой процесс мог успеть
+        записать туда товар, прочитанный до изменения.
+
+        """
+        if self.shared is None:
+            return
+        if product_ids:
+            await self.shared.delete(*(self.prefix + str(product_id) for product_id in product_ids))
+        else:
+            await self.shared.clear(self.prefix)
+
+    def stats(self) -> schemas.CacheStats:
+        return schemas.CacheStats(
+            hits=self.hits,
+            shared_hits=self.shared_hits,
+            misses=self.misses,
+            evictions=self.local.evictions,
+            invalidations=self.invalidations,
+            size=len(self.local),
+        )
+
+
+class InvalidationListener:
+    """
+    Соединение LISTEN на процесс, через которое до `cache` доходят сбросы,
+    зафиксированные другими процессами: записи удаляются из локального уровня
+    и ещё раз из общего кэша. Пока соединения нет, уведомления теряются,
+    поэтому локальный уровень отключается и очищается, а соединение
+    переустанавливается.
+
+    """
+
+    def __init__(self, cache: ProductCache, database_url: str, connect_timeout: float = 5) -> None:
+        self.cache = cache
+        self.database_url = database_url
+        self.connect_timeout = connect_timeout
+        self._task: Optional[asyncio.Task] = None
+        self._connected: Optional[asyncio.Event] = None
+        self._evictions: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        """
+        Запускает прослушивание и ждёт первого подключения не дольше
+        `connect_timeout` секунд. Если БД недоступна, процесс работает
+        без локального уровня, пока соединение не будет установлено.
+
+        """
+        self.cache.local_enabled = False
+        self._connected = asyncio.Event()
+        self._task = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._connected.wait(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Product cache invalidation listener is not connected, local cache is off"
+            )
+
+    async def _listen(self) -> None:
+        engine = create_async_engine(self.database_url, poolclass=NullPool)
+        try:
+            while True:
+                lost = asyncio.Event()
+                try:
+                    async with engine.connect() as connection:
+                        driver_connection = (await connection.get_raw_connection()).driver_connection
+                        await driver_connection.add_listener(INVALIDATION_CHANNEL, self._on_notify)
+                        driver_connection.add_termination_listener(lambda _: lost.set())
+                        # Changes made while nobody listened are unknown
+                        self.cache.evict()
+                        self.cache.local_enabled = True
+                        self._connected.set()
+                        await lost.wait()
+                except Exception:
+                    logger.exception("Product cache invalidation listener failed")
+                self.cache.local_enabled = False
+                self.cache.evict()
+                logger.warning("Product cache invalidation listener disconnected, local cache is off")
+                await asyncio.sleep(LISTEN_RETRY_INTERVAL)
+        finally:
+            await engine.dispose()
+
+    def _on_notify(self, driver_connection, pid, channel, payload: str) -> None:
+        product_ids = (
+            () if payload == INVALIDATE_ALL
+            else tuple(int(product_id) for product_id in payload.split(","))
+        )
+        self.cache.evict(*product_ids)
+        if self.cache.shared is not None:
+            task = asyncio.create_task(self.cache.evict_shared(*product_ids))
+            self._evictions.add(task)
+            task.add_done_callback(self._evictions.discard)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+product_cache = ProductCache(
+    LRUCache(settings.product_cache_maxsize, settings.product_cache_ttl),
+    shared=(
+        RedisBackend(settings.product_cache_shared_url)
+        if settings.product_cache_shared_url else None
+    ),
+    shared_ttl=settings.product_cache_shared_ttl,
+    schema=schemas.ProductSnapshot,
+)
+invalidation_listener = InvalidationListener(
+    product_cache, settings.database_url, settings.product_cache_listen_timeout
+)
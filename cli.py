@@ -0,0 +1,173 @@
+"""
+Служебные команды сервиса.
+
+    python cli.py import-products catalog.csv
+    python cli.py migrate upgrade
+    python cli.py rebuild-stats --since 2024-01-01
+    python cli.py purge-idempotency-keys
+    python cli.py purge-events
+    python cli.py create-order-partitions
+    python cli.py archive-orders --older-than-months 12
+
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+import logging
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import make_engine, unit_of_work
+import migrate
+import models
+import partitions
+import product_import
+import schemas
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+async def read_file(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as file:
+        while chunk := await asyncio.to_thread(file.read, READ_CHUNK_SIZE):
+            yield chunk
+
+
+async def import_products(args: argparse.Namespace) -> None:
+    import_format = schemas.DataFormat(
+        args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    )
+    engine = make_engine(settings.model_copy(update={"database_url": args.database_url}))
+    async with unit_of_work(AsyncSession(engine, expire_on_commit=False)) as db_async_session:
+        result = await product_import.import_products(
+            db_async_session, read_file(args.path), import_format
+        )
+    await engine.dispose()
+    print(result.model_dump_json(indent=2))
+
+
+async def migrate_schema(args: argparse.Namespace) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Index builds on large tables may run longer than the request statement timeout
+    engine = make_engine(settings.model_copy(
+        update={"database_url": args.database_url, "db_statement_timeout_ms": 0}
+    ))
+    if args.action == "upgrade":
+        await migrate.upgrade(engine, args.revision)
+    elif args.action == "downgrade":
+        await migrate.downgrade(engine, args.revision)
+    else:
+        current = await migrate.current_revision(engine)
+        print("current: %s, head: %s" % (current or "base", migrate.head_revision()))
+    await engine.dispose()
+
+
+async def rebuild_stats(args: argparse.Namespace) -> None:
+    engine = make_engine(settings.model_copy(
+        update={"database_url": args.database_url, "db_statement_timeout_ms": 0}
+    ))
+    async with unit_of_work(AsyncSession(engine, expire_on_commit=False)) as db_async_session:
+        rows = await models.OrderStats.rebuild(db_async_session, args.since)
+    await engine.dispose()
+    print("order_stats rows: %s" % rows)
+
+
+async def purge_idempotency_keys(args: argparse.Namespace) -> None:
+    engine = make_engine(settings.model_copy(update={"database_url": args.database_url}))
+    async with unit_of_work(AsyncSession(engine)) as db_async_session:
+        rows = await models.IdempotencyKey.purge_expired(db_async_session)
+    await engine.dispose()
+    print("expired idempotency keys deleted: %s" % rows)
+
+
+async def purge_events(args: argparse.Namespace) -> None:
+    before = datetime.now(timezone.utc) - timedelta(days=args.days)
+    engine = make_engine(settings.model_copy(update={"database_url": args.database_url}))
+    async with unit_of_work(AsyncSession(engine)) as db_async_session:
+        rows = await models.ChangeEvent.purge(db_async_session, before)
+    await engine.dispose()
+    print("change events deleted: %s" % rows)
+
+
+async def create_order_partitions(args: argparse.Namespace) -> None:
+    today = date.today()
+    engine = make_engine(settings.model_copy(update={"database_url": args.database_url}))
+    async with unit_of_work(AsyncSession(engine)) as db_async_session:
+        created = await partitions.create_partitions(
+            db_async_session, today, partitions.add_months(today, args.months_ahead)
+        )
+    await engine.dispose()
+    print("order partitions created: %s" % (", ".join(created) or "none"))
+
+
+async def archive_orders(args: argparse.Namespace) -> None:
+    before = partitions.add_months(date.today(), 1 - args.older_than_months)
+    engine = make_engine(settings.model_copy(update={"database_url": args.database_url}))
+    async with unit_of_work(AsyncSession(engine)) as db_async_session:
+        months = await partitions.archive_partitions(db_async_session, before)
+    await engine.dispose()
+    print("months archived: %s" % (", ".join(month.strftime("%Y-%m") for month in months) or "none"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=settings.database_url)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import-products", help="загрузить каталог товаров")
+    import_parser.add_argument("path", help="файл CSV или NDJSON")
+    import_parser.add_argument("--format", choices=[f.value for f in schemas.DataFormat])
+    import_parser.set_defaults(handler=import_products)
+
+    migrate_parser = commands.add_parser("migrate", help="миграции схемы БД")
+    migrate_actions = migrate_parser.add_subparsers(dest="action", required=True)
+    upgrade_parser = migrate_actions.add_parser("upgrade", help="обновить схему")
+    upgrade_parser.add_argument("revision", nargs="?", default="head")
+    downgrade_parser = migrate_actions.add_parser("downgrade", help="откатить схему")
+    downgrade_parser.add_argument("revision", help="целевая версия, например 0001 или -1")
+    migrate_actions.add_parser("current", help="показать текущую версию схемы")
+    migrate_parser.set_defaults(handler=migrate_schema)
+
+    stats_parser = commands.add_parser("rebuild-stats", help="пересчитать сводку заказов")
+    stats_parser.add_argument(
+        "--since", type=date.fromisoformat, help="первый пересчитываемый день, YYYY-MM-DD"
+    )
+    stats_parser.set_defaults(handler=rebuild_stats)
+
+    purge_parser = commands.add_parser(
+        "purge-idempotency-keys", help="удалить ключи Idempotency-Key с истёкшим сроком"
+    )
+    purge_parser.set_defaults(handler=purge_idempotency_keys)
+
+    events_parser = commands.add_parser("purge-events", help="удалить старые события ленты изменений")
+    events_parser.add_argument(
+        "--days", type=int, default=settings.events_retention_days, help="сколько дней хранить события"
+    )
+    events_parser.set_defaults(handler=purge_events)
+
+    partitions_parser = commands.add_parser(
+        "create-order-partitions", help="создать партиции заказов на следующие месяцы"
+    )
+    partitions_parser.add_argument(
+        "--months-ahead", type=int, default=settings.orders_partitions_ahead,
+        help="на сколько месяцев вперёд",
+    )
+    partitions_parser.set_defaults(handler=create_order_partitions)
+
+    archive_parser = commands.add_parser(
+        "archive-orders", help="перенести старые месяцы заказов в архивные таблицы"
+    )
+    archive_parser.add_argument(
+        "--older-than-months", type=int, default=settings.orders_hot_months,
+        help="сколько последних месяцев, включая текущий, оставить в оперативных таблицах",
+    )
+    archive_parser.set_defaults(handler=archive_orders)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
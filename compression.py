@@ -0,0 +1,142 @@
+"""
+Сжатие ответов API по заголовку Accept-Encoding.
+
+Сжимаются ответы, тело которых отдаётся одним куском (списки, карточки) и
+не меньше `compression_min_size` байт. Потоковые ответы (выгрузки, лента
+событий) передаются как есть: их части должны доходить до клиента сразу.
+У сжатого ответа свой ETag: к ETag добавляется кодировка (`"5-br"`), условные
+запросы сравнивают его без неё. Пакет brotli есть в requirements.txt;
+без него ответы сжимаются только gzip.
+
+"""
+import gzip
+from typing import List, Optional
+
+import conditional
+from config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Levels trade a little compression ratio for latency of large list responses
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+COMPRESSIBLE_TYPES = (b"application/json", b"text/")
+
+
+def supported_encodings() -> List[str]:
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Кодировка с наибольшим весом q из Accept-Encoding среди поддерживаемых;
+    при равных весах brotli предпочтительнее gzip. None - не сжимать.
+
+    """
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    candidates = [
+        (weights.get(encoding, weights.get("*", 0.0)), -index, encoding)
+        for index, encoding in enumerate(supported_encodings())
+    ]
+    weight, _, encoding = max(candidates)
+    return encoding if weight > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    ASGI-middleware: сжимает ответ кодировкой, выбранной по Accept-Encoding,
+    если тело пришло одним сообщением и не меньше `compression_min_size` байт.
+
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not settings.compression_min_size:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding, if_none_match = b"", b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding += (b"," if accept_encoding else b"") + value
+            elif name == b"if-none-match":
+                if_none_match += value
+        encoding = choose_encoding(accept_encoding.decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_compressed(message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Headers are held back until it's known whether the body is compressed
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = [(name, value) for name, value in start.get("headers", []) if name != b"vary"]
+            # The client revalidates the variant it holds, so 304 keeps its ETag
+            compressed = (
+                start["status"] == 304
+                and ('-%s"' % encoding).encode() in if_none_match
+            )
+            vary = [value for name, value in start.get("headers", []) if name == b"vary"]
+            content_type = dict(headers).get(b"content-type", b"")
+            body = message.get("body", b"")
+            if (
+                not message.get("more_body", False)
+                and len(body) >= settings.compression_min_size
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+                and b"content-encoding" not in dict(headers)
+            ):
+                body = compress(body, encoding)
+                message = {**message, "body": body}
+                headers = [(name, value) for name, value in headers if name != b"content-length"]
+                headers += [
+                    (b"content-encoding", encoding.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                ]
+                compressed = True
+            if compressed:
+                headers = [
+                    (
+                        name,
+                        conditional.encoding_etag(value.decode("latin-1"), encoding).encode("latin-1")
+                        if name == b"etag" else value,
+                    )
+                    for name, value in headers
+                ]
+            # Caches must keep compressed and plain variants apart
+            headers.append((b"vary", b", ".join([*vary, b"Accept-Encoding"])))
+            await send({**start, "headers": headers})
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,104 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, List, NamedTuple, Optional, Sequence
+
+from fastapi import Request, Response, status
+
+
+# Compressed variants of a response get their own ETag with the encoding appended
+CONTENT_ENCODINGS = ("gzip", "br")
+
+
+class Validators(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+
+def make_etag(*parts: Any) -> str:
+    return '"%s"' % ".".join(str(part) for part in parts)
+
+
+def digest_etag(rows: Iterable[Sequence[Any]]) -> str:
+    """
+    ETag набора строк: хэш от их ID и версий в порядке выдачи.
+
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest.update(repr(tuple(row)).encode())
+    return make_etag(digest.hexdigest())
+
+
+def parse_etags(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def encoding_etag(etag: str, encoding: str) -> str:
+    """ETag варианта ответа, сжатого кодировкой `encoding`."""
+    return etag[:-1] + '-%s"' % encoding if etag.endswith('"') else etag
+
+
+def strip_encoding(tag: str) -> str:
+    """ETag ответа без сжатия по ETag его сжатого варианта."""
+    for encoding in CONTENT_ENCODINGS:
+        suffix = '-%s"' % encoding
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def is_not_modified(request: Request, validators: Validators) -> bool:
+    """
+    Проверяет If-None-Match (слабое сравнение) или, если его нет, If-Modified-Since.
+
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [strip_encoding(tag.removeprefix("W/")) for tag in parse_etags(if_none_match)]
+        return "*" in tags or validators.etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or validators.last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    # Last-Modified has a one-second resolution
+    return validators.last_modified.replace(microsecond=0) <= since
+
+
+def if_match_versions(request: Request) -> Optional[List[int]]:
+    """
+    Версии из If-Match (строгое сравнение). None, если заголовка нет или он равен "*".
+    Неразборчивые и слабые ETag не совпадают ни с одной версией.
+
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is None:
+        return None
+
+    tags = [strip_encoding(tag) for tag in parse_etags(if_match)]
+    if "*" in tags:
+        return None
+    return [
+        int(tag[1:-1]) for tag in tags
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit()
+    ]
+
+
+def set_validators(response: Response, validators: Validators) -> None:
+    response.headers["ETag"] = validators.etag
+    if validators.last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(
+            validators.last_modified.astimezone(timezone.utc), usegmt=True
+        )
+
+
+def not_modified(validators: Validators) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, validators)
+    return response
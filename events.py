@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from config import settings
+from database import unit_of_work
+import models
+import schemas
+
+REPLAY_BATCH_SIZE = 1000
+# Tells EventSource clients how long to wait before reconnecting, ms
+RETRY_MS = 1000
+
+logger = logging.getLogger("warehouse.events")
+
+
+class Subscription:
+    """
+    Очередь событий одного подписчика. Если подписчик не успевает их
+    забирать и очередь переполнена, подписка закрывается: клиент
+    переподключается с Last-Event-ID и дочитывает пропущенное из БД,
+    а остальные подписчики и память процесса от него не страдают.
+
+    """
+
+    def __init__(self, event_filter: schemas.EventFilter, maxsize: int) -> None:
+        self.filter = event_filter
+        self.closed = False
+        self._queue: "asyncio.Queue[Optional[schemas.ChangeEvent]]" = asyncio.Queue(maxsize)
+
+    def publish(self, event: schemas.ChangeEvent) -> None:
+        if self.closed or not self.filter.matches(event):
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        # Pending events are dropped: the client reads them again after reconnecting
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def get(self) -> Optional[schemas.ChangeEvent]:
+        """Следующее событие или None, если подписка закрыта."""
+        return await self._queue.get()
+
+
+class EventBroker:
+    """
+    Одно соединение LISTEN на процесс, события из которого раздаются
+    всем подписчикам процесса. Соединение открывается при первой подписке.
+    Уведомление содержит только ID событий, сами события читаются
+    из таблицы change_events тем же соединением.
+
+    """
+
+    def __init__(self, database_url: str, queue_size: int) -> None:
+        self.database_url = database_url
+        self.queue_size = queue_size
+        self.subscriptions: Set[Subscription] = set()
+        self._engine: Optional[AsyncEngine] = None
+        self._connection: Optional[AsyncConnection] = None
+        self._pending: "Optional[asyncio.Queue[List[int]]]" = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def subscribe(self, event_filter: schemas.EventFilter) -> Subscription:
+        await self._ensure_listening()
+        subscription = Subscription(event_filter, self.queue_size)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscriptions.discard(subscription)
+
+    async def _ensure_listening(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._connection is not None:
+                return
+            if self._engine is None:
+                self._engine = create_async_engine(self.database_url, poolclass=NullPool)
+            connection = await self._engine.connect()
+            driver_connection = (await connection.get_raw_connection()).driver_connection
+            self._pending = asyncio.Queue()
+            await driver_connection.add_listener(models.change_event.CHANNEL, self._on_notify)
+            driver_connection.add_termination_listener(self._on_terminate)
+            self._connection = connection
+            self._dispatcher = asyncio.create_task(self._dispatch(connection, self._pending))
+
+    def _on_notify(self, driver_connection, pid, channel, payload: str) -> None:
+        # A notification may arrive after the connection was reset
+        if self._pending is None:
+            return
+        # Events are read by one task, so that they are published in notification order
+        self._pending.put_nowait([int(event_id) for event_id in payload.split(",")])
+
+    def _on_terminate(self, driver_connection) -> None:
+        if self._connection is None:
+            return
+        logger.warning("Event listener connection lost, closing %s subscriptions",
+                       len(self.subscriptions))
+        self._reset()
+
+    def _reset(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        self._connection = self._dispatcher = self._pending = None
+        # Subscribers reconnect with Last-Event-ID and catch up from the table
+        for subscription in self.subscriptions:
+            subscription.close()
+        self.subscriptions.clear()
+
+    async def _dispatch(self, connection: AsyncConnection, pending: "asyncio.Queue[List[int]]") -> None:
+        while True:
+            event_ids = await pending.get()
+            try:
+                rows = (await connection.execute(
+                    models.ChangeEvent.select_by_ids(event_ids)
+                )).all()
+                # Notifications are not delivered while the connection is in a transaction
+                await connection.rollback()
+            except Exception:
+                logger.exception("Failed to read change events %s", event_ids)
+                self._reset()
+                return
+            for row in rows:
+                event = schemas.ChangeEvent.model_validate(row)
+                for subscription in list(self.subscriptions):
+                    subscription.publish(event)
+
+    async def close(self) -> None:
+        connection = self._connection
+        self._reset()
+        if connection is not None:
+            await connection.close()
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+
+def format_event(event: schemas.ChangeEvent, cursor: Optional[int] = None) -> str:
+    """
+    Событие в формате Server-Sent Events. `cursor` - ID для Last-Event-ID,
+    если он больше ID события: событие с меньшим ID могло быть зафиксировано
+    позже уже отданных, и переподключение с его ID повторило бы их.
+
+    """
+    return "id: %s\nevent: %s.%s\ndata: %s\n\n" % (
+        max(event.id, cursor or 0), event.entity.value, event.action.value,
+        event.model_dump_json(),
+    )
+
+
+async def stream_events(
+        broker: EventBroker,
+        db_session_factory: sessionmaker,
+        event_filter: schemas.EventFilter,
+        last_event_id: Optional[int] = None,
+        heartbeat: float = 15,
+) -> AsyncIterator[str]:
+    """
+    Поток событий в формате Server-Sent Events. С `last_event_id` сначала
+    отдаются сохранённые события после него, затем новые. Подписка оформляется
+    до чтения сохранённых событий, поэтому между ними ничего не теряется.
+    Поток заканчивается, когда подписка закрыта из-за медленного чтения.
+    События, зафиксированные позже событий с большим ID, отдаются и при
+    повторе, поэтому после переподключения событие может прийти повторно.
+
+    """
+    subscription = await broker.subscribe(event_filter)
+    try:
+        yield "retry: %s\n\n" % RETRY_MS
+
+        replayed: Set[int] = set()
+        cursor = last_event_id
+        while cursor is not None:
+            async with unit_of_work(db_session_factory(), read_only=True) as db_async_session:
+                batch = await models.ChangeEvent.read_after(
+                    db_async_session, cursor, event_filter, REPLAY_BATCH_SIZE
+                )
+            # Late events are read again with every batch
+            new = [event for event in batch if event.id not in replayed]
+            for event in new:
+                replayed.add(event.id)
+                last_event_id = max(last_event_id, event.id)
+                yield format_event(event, last_event_id)
+            if len(batch) < REPLAY_BATCH_SIZE or not new:
+                break
+            cursor = last_event_id
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                return
+            if event.id not in replayed:
+                last_event_id = max(last_event_id or 0, event.id)
+                yield format_event(event, last_event_id)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+broker = EventBroker(settings.database_url, settings.events_queue_size)
@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Sequence
+
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import unit_of_work
+import schemas
+
+EXPORT_BATCH_SIZE = 5000
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+
+def _encode_ndjson(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default) + "\n"
+        for row in rows
+    )
+
+
+def _encode_csv(rows: Sequence[Sequence[Any]]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+async def stream_rows(
+        open_session: Callable[[], Awaitable[AsyncSession]],
+        stmt: Select,
+        export_format: schemas.DataFormat,
+        batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[str]:
+    """
+    Построчно выгружает результат запроса через серверный курсор.
+    В памяти одновременно находится не больше `batch_size` строк.
+
+    Сессия открывается внутри генератора: StreamingResponse читает его
+    уже после завершения зависимостей запроса. `open_session` проверяет
+    соединение до первой строки, например ReplicaRouter.open_session
+    переходит на основную БД, если реплика недоступна.
+
+    """
+    async with unit_of_work(await open_session(), read_only=True) as db_async_session:
+        result = await db_async_session.stream(
+            stmt.execution_options(yield_per=batch_size)
+        )
+        columns = list(result.keys())
+
+        if export_format is schemas.DataFormat.csv:
+            yield _encode_csv([columns])
+
+        async for rows in result.partitions():
+            if export_format is schemas.DataFormat.csv:
+                yield _encode_csv(rows)
+            else:
+                yield _encode_ndjson(columns, rows)
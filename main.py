@@ -1,24 +1,50 @@
+import logging
 from contextlib import asynccontextmanager
-from typing import Annotated, List, Sequence, Optional
+from typing import Annotated, Awaitable, Callable, List, Sequence, Optional
 
-from fastapi import Depends, FastAPI, status, Request
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response, status, Request
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
-
-from database import AsyncSessionLocal, Base, engine
+from sqlalchemy.orm import sessionmaker
+
+from cache import invalidation_listener, product_cache
+import compression
+import conditional
+from config import settings
+from database import AsyncSessionLocal, engine, read_router, replica_engines, unit_of_work
+import events
+import metrics
+import migrate
 import models
+import pagination
+import product_import
+import profiler
 import schemas
 
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+logging.basicConfig(format="%(levelname)s:     %(name)s - %(message)s")
+logger = logging.getLogger("warehouse")
+logger.setLevel(settings.log_level)
+
 
 @asynccontextmanager
 async def lifespan(app_: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    db_async_session: AsyncSession = AsyncSessionLocal()
-    await models.Status.create_statuses(db_async_session)
+    logger.info("Effective settings: %s", settings.safe_dump())
+    # DDL is applied by 'python cli.py migrate upgrade' before the workers start
+    await migrate.check_schema(engine)
+    async with unit_of_work(AsyncSessionLocal(), read_only=True) as db_async_session:
+        await models.Status.load_statuses(db_async_session)
+    # Invalidations committed by other workers reach this worker's product cache
+    await invalidation_listener.start()
     yield
+    await invalidation_listener.close()
+    await events.broker.close()
     await engine.dispose()
+    for replica_engine in replica_engines:
+        await replica_engine.dispose()
 
 
 app = FastAPI(
@@ -35,15 +61,58 @@ app = FastAPI(
         "email": "israpal@bk.ru",
     },
 )
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(profiler.ProfilerMiddleware)
+app.add_middleware(compression.CompressionMiddleware)
 
 
-# Database dependency
+# Database dependency: the request's unit of work, committed once after the handler
 async def get_db_async_session():
-    db_async_session: AsyncSession = AsyncSessionLocal()
-    try:
+    async with unit_of_work(AsyncSessionLocal()) as db_async_session:
+        yield db_async_session
+
+
+# Read-only database dependency: a READ ONLY transaction, on a replica when replicas
+# are configured. Writes and reads that must see the request's own writes use
+# get_db_async_session
+async def get_db_read_session():
+    async with unit_of_work(await read_router.open_session(), read_only=True) as db_async_session:
         yield db_async_session
-    finally:
-        await db_async_session.aclose()
+
+
+# Read-only database dependency on the primary database for reads that fill the
+# product cache: a lagging replica would put back a product that was just changed
+async def get_db_primary_read_session():
+    async with unit_of_work(AsyncSessionLocal(), read_only=True) as db_async_session:
+        yield db_async_session
+
+
+# Opens read-only sessions for streaming responses, which are read after the
+# request-scoped session is closed. The replica connection is checked before the
+# first row, so an unavailable replica falls back to the primary
+def get_db_session_opener() -> Callable[[], Awaitable[AsyncSession]]:
+    return read_router.open_session
+
+
+# Session factory of the primary database for streams that must not lag behind commits
+def get_db_primary_session_factory() -> sessionmaker:
+    return AsyncSessionLocal
+
+
+def get_event_broker() -> events.EventBroker:
+    return events.broker
+
+
+def page_response(page: pagination.Page) -> Response:
+    """
+    Готовый JSON-ответ со страницей словарей: без повторной валидации
+    через response_model и без jsonable_encoder.
+
+    """
+    response = Response(orjson.dumps(page.items), media_type="application/json")
+    if page.next_cursor is not None:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = page.next_cursor
+    return response
 
 
 @app.post(
@@ -55,13 +124,20 @@ async def get_db_async_session():
 )
 async def add_product(
     product: schemas.Product,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER, max_length=255),
     db_async_session: AsyncSession = Depends(get_db_async_session),
 ) -> schemas.ProductResponse:
     """
-    Добавление нового товара в БД
+    Добавление нового товара в БД.
+    Повтор запроса с тем же заголовком Idempotency-Key возвращает уже созданный товар.
 
     """
-    return await models.Product.add_product(db_async_session, product)
+    idempotency = None
+    if idempotency_key is not None:
+        idempotency = schemas.IdempotencyRequest.for_payload(
+            "POST /api/products", idempotency_key, product
+        )
+    return await models.Product.add_product(db_async_session, product, idempotency)
 
 
 @app.get(
@@ -72,13 +148,116 @@ async def add_product(
     tags=["Товары"],
 )
 async def get_products(
-    db_async_session: AsyncSession = Depends(get_db_async_session),
+    params: Annotated[schemas.ProductListParams, Query()],
+    request: Request,
+    response: Response,
+    db_async_session: AsyncSession = Depends(get_db_read_session),
 ) -> Sequence[schemas.ProductResponse]:
     """
-    Возвращает список всех товаров
+    Возвращает страницу списка товаров с фильтрацией и сортировкой.
+    Параметр fields оставляет в ответе только указанные поля, например fields=id,quantity.
+    Если есть следующая страница, её курсор передаётся в заголовке X-Next-Cursor.
+    Поддерживает If-None-Match и If-Modified-Since: если страница не изменилась,
+    возвращается 304 без загрузки товаров.
 
     """
-    return await models.Product.get_products(db_async_session)
+    validators = await models.Product.get_products_page_validators(db_async_session, params)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+
+    # Selected fields are read as rows: the other columns are not loaded at all
+    if settings.fast_list_serialization or params.fields is not None:
+        fast_response = page_response(
+            await models.Product.get_products_page(db_async_session, params, as_rows=True)
+        )
+        conditional.set_validators(fast_response, validators)
+        return fast_response
+
+    page = await models.Product.get_products_page(db_async_session, params)
+    conditional.set_validators(response, validators)
+    if page.next_cursor is not None:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = page.next_cursor
+    return page.items
+
+
+@app.post(
+    "/api/products/import",
+    summary="загрузить каталог товаров",
+    response_description="Количество добавленных, обновлённых и отклонённых строк",
+    status_code=status.HTTP_200_OK,
+    tags=["Товары"],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                schemas.DataFormat.ndjson.media_type: {"schema": {"type": "string"}},
+                schemas.DataFormat.csv.media_type: {"schema": {"type": "string"}},
+            },
+        },
+    },
+)
+async def import_products(
+    request: Request,
+    import_format: schemas.DataFormat = Query(schemas.DataFormat.ndjson, alias="format"),
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> schemas.ProductImportResult:
+    """
+    Массовое добавление и обновление товаров из CSV или NDJSON.
+    Товары сопоставляются по названию: существующие обновляются, новые добавляются.
+    CSV должен содержать заголовок с полями name, description, price, quantity.
+
+    """
+    return await product_import.import_products(
+        db_async_session, request.stream(), import_format
+    )
+
+
+@app.get(
+    "/api/products/export",
+    summary="выгрузить все товары",
+    response_description="Потоковая выгрузка товаров в формате NDJSON или CSV",
+    status_code=status.HTTP_200_OK,
+    tags=["Товары"],
+)
+async def export_products(
+    export_format: schemas.DataFormat = Query(schemas.DataFormat.ndjson, alias="format"),
+    open_session: Callable[[], Awaitable[AsyncSession]] = Depends(get_db_session_opener),
+) -> StreamingResponse:
+    """
+    Потоково выгружает все товары, не загружая их в память целиком
+
+    """
+    return StreamingResponse(
+        models.Product.export_products(open_session, export_format),
+        media_type=export_format.media_type,
+        headers={
+            "Content-Disposition": "attachment; filename=products.%s" % export_format.value
+        },
+    )
+
+
+@app.get(
+    "/api/products/search",
+    summary="поиск товаров",
+    response_description="Найденные товары по убыванию релевантности",
+    status_code=status.HTTP_200_OK,
+    tags=["Товары"],
+)
+async def search_products(
+    params: Annotated[schemas.ProductSearchParams, Query()],
+    response: Response,
+    db_async_session: AsyncSession = Depends(get_db_read_session),
+) -> List[schemas.ProductSearchResult]:
+    """
+    Ищет товары, в названии или описании которых есть все слова запроса:
+    целиком, как начало слова или с опечаткой.
+    Если есть следующая страница, её курсор передаётся в заголовке X-Next-Cursor.
+
+    """
+    page = await models.Product.search_products(db_async_session, params)
+    if page.next_cursor is not None:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = page.next_cursor
+    return page.items
 
 
 @app.get(
@@ -90,13 +269,34 @@ async def get_products(
 )
 async def get_product(
     product_id: int,
-    db_async_session: AsyncSession = Depends(get_db_async_session),
+    params: Annotated[schemas.ProductFieldsParams, Query()],
+    request: Request,
+    response: Response,
+    db_async_session: AsyncSession = Depends(get_db_primary_read_session),
 ) -> schemas.ProductResponse:
     """
-    Возвращает информацию о товаре по ID
+    Возвращает информацию о товаре по ID.
+    Параметр fields оставляет в ответе только указанные поля.
+    Поддерживает If-None-Match и If-Modified-Since.
 
     """
-    return await models.Product.get_product(db_async_session, product_id)
+    product = await models.Product.get_product_cached(db_async_session, product_id)
+    validators = conditional.Validators(conditional.make_etag(product.version), product.updated_at)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+
+    # The card comes from the product cache, so the fields are taken from it
+    # instead of a narrower query
+    if params.fields is not None:
+        fields_response = Response(
+            orjson.dumps(product.model_dump(include={field.value for field in params.fields})),
+            media_type="application/json",
+        )
+        conditional.set_validators(fields_response, validators)
+        return fields_response
+
+    conditional.set_validators(response, validators)
+    return product
 
 
 @app.put(
@@ -109,13 +309,62 @@ async def get_product(
 async def update_product(
     product_id: int,
     product: schemas.Product,
+    request: Request,
+    response: Response,
     db_async_session: AsyncSession = Depends(get_db_async_session),
 ) -> Optional[schemas.ProductResponse]:
     """
-    Обновляет информацию о товаре по ID
+    Обновляет информацию о товаре по ID.
+    Если передан If-Match, товар обновляется, только если его ETag не изменился,
+    иначе возвращается 412.
+
+    """
+    updated_product = await models.Product.update_product(
+        db_async_session, product_id, product, conditional.if_match_versions(request)
+    )
+    conditional.set_validators(response, conditional.Validators(
+        conditional.make_etag(updated_product.version), updated_product.updated_at
+    ))
+    return updated_product
+
+
+@app.get(
+    "/api/products/{product_id}/stock-shards",
+    summary="счётчики остатка товара",
+    response_description="Успешное получение счётчиков остатка товара",
+    status_code=status.HTTP_200_OK,
+    tags=["Товары"],
+)
+async def get_stock_shards(
+    product_id: int,
+    db_async_session: AsyncSession = Depends(get_db_read_session),
+) -> schemas.StockShards:
+    """
+    Возвращает остаток товара по счётчикам шардированного режима.
 
     """
-    return await models.Product.update_product(db_async_session, product_id, product)
+    return await models.StockShard.get_shards(db_async_session, product_id)
+
+
+@app.put(
+    "/api/products/{product_id}/stock-shards",
+    summary="режим хранения остатка товара",
+    response_description="Успешное переключение режима хранения остатка",
+    status_code=status.HTTP_200_OK,
+    tags=["Товары"],
+)
+async def set_stock_shards(
+    product_id: int,
+    shards: schemas.StockShardsUpdate,
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> schemas.StockShards:
+    """
+    Делит остаток товара между `shards` счётчиками, чтобы заказы популярного
+    товара не ждали друг друга на одной строке, или при `shards` = 0
+    возвращает его в строку товара. Количество товара на складе не меняется.
+
+    """
+    return await models.StockShard.set_shards(db_async_session, product_id, shards)
 
 
 @app.delete(
@@ -145,14 +394,46 @@ async def delete_tweet(
 )
 async def add_order(
     order: schemas.Order,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER, max_length=255),
     db_async_session: AsyncSession = Depends(get_db_async_session),
 ) -> schemas.OrderResponse:
     """
     Добавление нового заказа в БД.
     В теле запроса необходимо указать ID товара и его количество.
+    Повтор запроса с тем же заголовком Idempotency-Key возвращает уже созданный заказ
+    и не резервирует товар повторно.
 
     """
-    return await models.Order.add_order(db_async_session, order)
+    idempotency = None
+    if idempotency_key is not None:
+        idempotency = schemas.IdempotencyRequest.for_payload(
+            "POST /api/orders", idempotency_key, order
+        )
+    return await models.Order.add_order(db_async_session, order, idempotency)
+
+
+@app.post(
+    "/api/orders/batch",
+    summary="добавить несколько заказов",
+    response_description="Результат добавления по каждому заказу",
+    status_code=status.HTTP_200_OK,
+    tags=["Заказы"],
+)
+async def add_orders(
+    order_batch: schemas.OrderBatch,
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> schemas.OrderBatchResponse:
+    """
+    Добавление нескольких заказов одной транзакцией.
+    Заказы, для которых не хватает товара или товар не найден, пропускаются,
+    остальные создаются. Результат возвращается для каждого заказа в порядке запроса.
+
+    """
+    results = await models.Order.add_orders(db_async_session, order_batch.orders)
+    created = sum(result.order is not None for result in results)
+    return schemas.OrderBatchResponse(
+        created=created, failed=len(results) - created, results=results
+    )
 
 
 @app.get(
@@ -163,13 +444,49 @@ async def add_order(
     tags=["Заказы"],
 )
 async def get_orders(
-    db_async_session: AsyncSession = Depends(get_db_async_session),
+    params: Annotated[schemas.OrderListParams, Query()],
+    response: Response,
+    db_async_session: AsyncSession = Depends(get_db_read_session),
 ) -> Sequence[schemas.OrderResponse]:
     """
-    Возвращает список всех заказов
+    Возвращает страницу списка заказов с фильтрацией и сортировкой.
+    Параметр fields задаёт поля ответа, например fields=id,quantity,status.
+    Если есть следующая страница, её курсор передаётся в заголовке X-Next-Cursor.
 
     """
-    return await models.Order.get_orders(db_async_session)
+    if settings.fast_list_serialization or params.fields is not None:
+        return page_response(
+            await models.Order.get_orders_page(db_async_session, params, as_rows=True)
+        )
+
+    page = await models.Order.get_orders_page(db_async_session, params)
+    if page.next_cursor is not None:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = page.next_cursor
+    return page.items
+
+
+@app.get(
+    "/api/orders/export",
+    summary="выгрузить все заказы",
+    response_description="Потоковая выгрузка заказов в формате NDJSON или CSV",
+    status_code=status.HTTP_200_OK,
+    tags=["Заказы"],
+)
+async def export_orders(
+    export_format: schemas.DataFormat = Query(schemas.DataFormat.ndjson, alias="format"),
+    open_session: Callable[[], Awaitable[AsyncSession]] = Depends(get_db_session_opener),
+) -> StreamingResponse:
+    """
+    Потоково выгружает всю историю заказов, не загружая её в память целиком
+
+    """
+    return StreamingResponse(
+        models.Order.export_orders(open_session, export_format),
+        media_type=export_format.media_type,
+        headers={
+            "Content-Disposition": "attachment; filename=orders.%s" % export_format.value
+        },
+    )
 
 
 @app.get(
@@ -181,22 +498,67 @@ async def get_orders(
 )
 async def get_order(
     order_id: int,
-    db_async_session: AsyncSession = Depends(get_db_async_session),
+    params: Annotated[schemas.OrderDetailsParams, Query()],
+    request: Request,
+    response: Response,
+    db_async_session: AsyncSession = Depends(get_db_read_session),
 ) -> schemas.OrderDetails:
     """
-    Возвращает информацию о заказе по ID
+    Возвращает информацию о заказе по ID.
+    Параметр fields оставляет в ответе только указанные поля, например fields=id,quantity,status:
+    товар без поля product не читается.
+    Поддерживает If-None-Match и If-Modified-Since.
 
     """
+    if params.fields is not None:
+        details, validators = await models.Order.get_order_fields(
+            db_async_session, order_id, params.fields
+        )
+        if conditional.is_not_modified(request, validators):
+            return conditional.not_modified(validators)
+        fields_response = Response(orjson.dumps(details), media_type="application/json")
+        conditional.set_validators(fields_response, validators)
+        return fields_response
+
+    validators = await models.Order.get_order_validators(db_async_session, order_id)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+
     order_item = await models.Order.get_order(db_async_session, order_id)
+    # Validators are taken from the loaded rows, so that they always describe the body
+    conditional.set_validators(response, conditional.Validators(
+        conditional.make_etag(order_item.order.version, order_item.product.version),
+        max(order_item.order.updated_at, order_item.product.updated_at),
+    ))
     return schemas.OrderDetails(
             id=order_item.id,
             quantity=order_item.quantity,
-            status=order_item.order.status.description,
+            status=models.Status.describe(order_item.order.status_id),
             created_at=order_item.order.created_at,
             product=order_item.product
         )
 
 
+@app.patch(
+    "/api/orders/status",
+    summary="массовое обновление статуса",
+    response_description="Количество обновлённых заказов и ненайденные ID",
+    status_code=status.HTTP_200_OK,
+    tags=["Заказы"],
+)
+async def update_statuses(
+    update_schema: schemas.OrderStatusBulkUpdate,
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> schemas.OrderStatusBulkResult:
+    """
+    Переводит заказы в новый статус одним запросом.
+    Заказы выбираются по списку ID, по товару и/или по текущему статусу,
+    условия объединяются через "и".
+
+    """
+    return await models.Order.update_statuses(db_async_session, update_schema)
+
+
 @app.patch(
     "/api/orders/{order_id}",
     summary="обновление статуса",
@@ -216,18 +578,134 @@ async def update_status(
         2 - отправлен,
         3 - доставлен.
     """
-    order_item = await models.Order.update_status(
+    return await models.Order.update_status(
         db_async_session, order_id, status_schema
     )
-    return schemas.OrderDetails(
-        id=order_item.id,
-        quantity=order_item.quantity,
-        status=order_item.order.status.description,
-        created_at=order_item.order.created_at,
-        product=order_item.product
+
+
+@app.get(
+    "/api/events",
+    summary="лента изменений",
+    response_description="Поток событий о заказах и товарах в формате Server-Sent Events",
+    status_code=status.HTTP_200_OK,
+    tags=["События"],
+)
+async def stream_events(
+    event_filter: Annotated[schemas.EventFilter, Query()],
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+    broker: events.EventBroker = Depends(get_event_broker),
+    db_session_factory: sessionmaker = Depends(get_db_primary_session_factory),
+) -> StreamingResponse:
+    """
+    Отдаёт события о новых заказах, смене статусов, изменении остатков, обновлении
+    и удалении товаров по мере их фиксации в БД. События фильтруются по сущности
+    и товару. После переподключения с заголовком Last-Event-ID сначала отдаются
+    пропущенные события. Если клиент не успевает читать поток, поток закрывается,
+    и клиент дочитывает пропущенное после переподключения.
+
+    """
+    return StreamingResponse(
+        events.stream_events(
+            broker, db_session_factory, event_filter, last_event_id, settings.events_heartbeat
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@app.get(
+    "/api/analytics/products",
+    summary="продажи по товарам",
+    response_description="Товары с наибольшими продажами за период",
+    status_code=status.HTTP_200_OK,
+    tags=["Аналитика"],
+)
+async def get_product_sales(
+    params: Annotated[schemas.ProductSalesParams, Query()],
+    db_async_session: AsyncSession = Depends(get_db_read_session),
+) -> List[schemas.ProductSales]:
+    """
+    Возвращает товары, отсортированные по убыванию выручки, проданных единиц
+    или количества заказов за период, вместе с текущим остатком.
+    Считается по сводке заказов, а не по самим заказам.
+
+    """
+    return await models.OrderStats.get_product_sales(db_async_session, params)
+
+
+@app.get(
+    "/api/analytics/daily",
+    summary="продажи по дням",
+    response_description="Заказы, единицы товара и выручка по дням и статусам",
+    status_code=status.HTTP_200_OK,
+    tags=["Аналитика"],
+)
+async def get_daily_sales(
+    params: Annotated[schemas.DailySalesParams, Query()],
+    db_async_session: AsyncSession = Depends(get_db_read_session),
+) -> List[schemas.DailySales]:
+    """
+    Возвращает количество заказов, проданных единиц и выручку
+    по дням создания заказов и их текущим статусам
+
+    """
+    return await models.OrderStats.get_daily_sales(db_async_session, params)
+
+
+@app.get(
+    "/api/cache/stats",
+    summary="статистика кэша товаров",
+    response_description="Счётчики кэша товаров текущего процесса",
+    status_code=status.HTTP_200_OK,
+    tags=["Служебное"],
+)
+async def get_cache_stats() -> schemas.CacheStats:
+    """
+    Возвращает счётчики попаданий, промахов и вытеснений кэша товаров
+
+    """
+    return product_cache.stats()
+
+
+@app.get(
+    "/metrics",
+    summary="метрики сервиса",
+    response_description="Метрики процесса в текстовом формате Prometheus",
+    status_code=status.HTTP_200_OK,
+    tags=["Служебное"],
+)
+async def get_metrics() -> Response:
+    """
+    Возвращает задержки и коды ответов по маршрутам, число и время запросов к БД
+    и состояние пулов соединений текущего процесса
+
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get(
+    "/api/profiles/{profile_id}",
+    summary="профиль запроса",
+    response_description="Запросы к БД, выполненные при обработке HTTP-запроса",
+    status_code=status.HTTP_200_OK,
+    tags=["Служебное"],
+)
+async def get_profile(profile_id: str) -> schemas.RequestProfile:
+    """
+    Возвращает профиль HTTP-запроса по ID из заголовка X-Profile-Id:
+    каждый запрос к БД с временем, числом строк и местом в коде,
+    а также запросы, повторявшиеся несколько раз
+
+    """
+    profile = profiler.profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile '%s' does not exist" % profile_id
+        )
+    return profile
+
+
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     """
@@ -0,0 +1,329 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Requests that did not match any route share one label, so that
+# scanners probing random paths cannot grow the number of series
+UNMATCHED_ROUTE = "unmatched"
+
+Labels = Tuple[str, ...]
+
+
+def format_labels(names: Sequence[str], values: Labels) -> str:
+    if not names:
+        return ""
+    pairs = (
+        '%s="%s"' % (name, value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in zip(names, values)
+    )
+    return "{%s}" % ",".join(pairs)
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s counter" % self.name]
+        for labels, value in sorted(self._values.items()):
+            lines.append("%s%s %s" % (
+                self.name, format_labels(self.labelnames, labels), format_value(value)
+            ))
+        return lines
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин. Наблюдение - поиск
+    корзины и два сложения, поэтому её можно обновлять на каждый запрос.
+
+    """
+
+    def __init__(
+            self,
+            name: str,
+            help_: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Count per bucket, not cumulative; the last bucket is +Inf
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def count(self, labels: Labels = ()) -> int:
+        return sum(self._counts.get(labels, ()))
+
+    def sum(self, labels: Labels = ()) -> float:
+        return self._sums.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s histogram" % self.name]
+        bucket_labels = self.labelnames + ("le",)
+        for labels, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append("%s_bucket%s %s" % (
+                    self.name,
+                    format_labels(bucket_labels, labels + (format_value(bound),)),
+                    cumulative,
+                ))
+            label_text = format_labels(self.labelnames, labels)
+            lines.append("%s_sum%s %s" % (self.name, label_text, format_value(self._sums[labels])))
+            lines.append("%s_count%s %s" % (self.name, label_text, cumulative))
+        return lines
+
+
+class Gauge:
+    """
+    Значения считываются функцией `collect` в момент запроса метрик.
+
+    """
+
+    def __init__(
+            self,
+            name: str,
+            help_: str,
+            labelnames: Sequence[str],
+            collect: Callable[[], Iterable[Tuple[Labels, float]]],
+    ) -> None:
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s gauge" % self.name]
+        for labels, value in self.collect():
+            lines.append("%s%s %s" % (
+                self.name, format_labels(self.labelnames, labels), format_value(value)
+            ))
+        return lines
+
+
+class QueryStats:
+    """Запросы к БД, выполненные в рамках одного HTTP-запроса."""
+
+    __slots__ = ("queries", "seconds", "checkouts")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.seconds = 0.0
+        self.checkouts = 0
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+# Engine name -> pool, for the pool gauges
+pools: Dict[str, QueuePool] = {}
+
+
+def collect_pools(measure: Callable[[QueuePool], float]) -> Callable[[], List[Tuple[Labels, float]]]:
+    return lambda: [((name,), measure(pool)) for name, pool in sorted(pools.items())]
+
+
+requests_total = Counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")
+)
+request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+request_db_queries = Histogram(
+    "http_request_db_queries",
+    "Database queries issued per HTTP request",
+    ("method", "route"),
+    QUERY_COUNT_BUCKETS,
+)
+request_db_checkouts = Histogram(
+    "http_request_db_checkouts",
+    "Connections checked out of the pool per HTTP request",
+    ("method", "route"),
+    QUERY_COUNT_BUCKETS,
+)
+request_db_duration = Histogram(
+    "http_request_db_duration_seconds",
+    "Total database query time per HTTP request",
+    ("method", "route"),
+)
+query_duration = Histogram(
+    "db_query_duration_seconds", "Database query latency", ("db",), QUERY_BUCKETS
+)
+pool_wait = Histogram(
+    "db_pool_wait_seconds", "Time spent obtaining a connection from the pool", ("db",), QUERY_BUCKETS
+)
+pool_timeouts = Counter(
+    "db_pool_timeouts_total", "Connection requests that timed out waiting for the pool", ("db",)
+)
+
+registry = [
+    requests_total,
+    request_duration,
+    request_db_queries,
+    request_db_checkouts,
+    request_db_duration,
+    query_duration,
+    Gauge("db_pool_size", "Configured pool size", ("db",), collect_pools(QueuePool.size)),
+    Gauge(
+        "db_pool_checked_out",
+        "Connections currently checked out of the pool",
+        ("db",),
+        collect_pools(QueuePool.checkedout),
+    ),
+    Gauge(
+        "db_pool_overflow",
+        "Connections open above the pool size (negative while the pool is not filled)",
+        ("db",),
+        collect_pools(QueuePool.overflow),
+    ),
+    pool_wait,
+    pool_timeouts,
+]
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который замеряет ожидание свободного соединения.
+    Имя для меток задаёт instrument_engine.
+
+    """
+
+    metrics_name: Optional[str] = None
+
+    def _do_get(self):
+        if self.metrics_name is None:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_timeouts.inc((self.metrics_name,))
+            raise
+        finally:
+            pool_wait.observe((self.metrics_name,), time.perf_counter() - started)
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """
+    Замеряет запросы движка: общая гистограмма по БД и счётчики запросов
+    и выдач соединений из пула для текущего HTTP-запроса, если он есть.
+
+    """
+    pool = engine.sync_engine.pool
+    if isinstance(pool, QueuePool):
+        pools[name] = pool
+    if isinstance(pool, InstrumentedQueuePool):
+        pool.metrics_name = name
+    labels = (name,)
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        query_duration.observe(labels, elapsed)
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.checkouts += 1
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: задержка и код ответа каждого HTTP-запроса
+    и число и время его запросов к БД. Маршрут берётся из шаблона
+    пути (/api/products/{product_id}), а не из самого пути.
+    Метрики хранятся в памяти процесса.
+
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_query_stats.reset(token)
+            # The router stores the matched route in the shared scope
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            labels = (scope["method"], route)
+            requests_total.inc(labels + (str(status_code),))
+            request_duration.observe(labels, elapsed)
+            request_db_queries.observe(labels, stats.queries)
+            request_db_checkouts.observe(labels, stats.checkouts)
+            request_db_duration.observe(labels, stats.seconds)
@@ -0,0 +1,101 @@
+"""
+Версии схемы БД. Миграции лежат в migrations/versions
+и применяются командой `python cli.py migrate upgrade`.
+
+"""
+import os
+from typing import Any, Callable, Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import partitions
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+# Key of the advisory lock that serializes schema changes between processes
+MIGRATION_LOCK_KEY = 7_270_001
+
+
+def alembic_config(connection: Optional[Connection] = None) -> Config:
+    config = Config(ALEMBIC_INI)
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def include_name(name: Optional[str], type_: str, parent_names: Any) -> bool:
+    """
+    Фильтр autogenerate: партиций заказов и архивных таблиц
+    нет в моделях, поэтому они не сравниваются с ними.
+
+    """
+    return not (type_ == "table" and name is not None and partitions.is_managed_table(name))
+
+
+async def run_command(
+        engine: AsyncEngine,
+        alembic_command: Callable[..., Any],
+        *args: Any,
+) -> None:
+    """
+    Выполняет команду alembic под advisory lock: если миграции запускают
+    одновременно несколько процессов, они выполняются по очереди, и
+    следующий процесс видит схему уже обновлённой. Блокировка сеансовая:
+    миграции с autocommit_block фиксируют транзакцию посреди команды.
+
+    """
+    async with engine.connect() as connection:
+        await connection.execute(
+            text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+        )
+        # Alembic has to start its own transaction to leave it for autocommit blocks
+        await connection.commit()
+        try:
+            await connection.run_sync(
+                lambda sync_connection: alembic_command(alembic_config(sync_connection), *args)
+            )
+            await connection.commit()
+        finally:
+            await connection.rollback()
+            await connection.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY}
+            )
+            await connection.commit()
+
+
+async def upgrade(engine: AsyncEngine, revision: str = "head") -> None:
+    await run_command(engine, command.upgrade, revision)
+
+
+async def downgrade(engine: AsyncEngine, revision: str) -> None:
+    await run_command(engine, command.downgrade, revision)
+
+
+async def current_revision(engine: AsyncEngine) -> Optional[str]:
+    async with engine.connect() as connection:
+        return await connection.run_sync(
+            lambda sync_connection: MigrationContext.configure(sync_connection).get_current_revision()
+        )
+
+
+def head_revision() -> Optional[str]:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+async def check_schema(engine: AsyncEngine) -> None:
+    """
+    Проверяет, что схема БД на последней версии. DDL не выполняет:
+    миграции применяются отдельно, до запуска воркеров.
+
+    """
+    current, head = await current_revision(engine), head_revision()
+    if current != head:
+        raise RuntimeError(
+            "Database schema is at revision %s, expected %s: "
+            "run 'python cli.py migrate upgrade'" % (current, head)
+        )
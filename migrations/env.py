@@ -0,0 +1,48 @@
+import asyncio
+
+from alembic import context
+from sqlalchemy.engine import Connection
+
+from config import settings
+from database import Base, make_engine
+import migrate
+import models  # noqa: F401  registers the tables in Base.metadata
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=settings.database_url,
+        target_metadata=target_metadata,
+        include_name=migrate.include_name,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection, target_metadata=target_metadata, include_name=migrate.include_name
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    engine = make_engine(settings.model_copy(update={"db_statement_timeout_ms": 0}))
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+# migrate.py passes an open connection; the alembic CLI doesn't
+connection = context.config.attributes.get("connection")
+if context.is_offline_mode():
+    run_migrations_offline()
+elif connection is not None:
+    do_run_migrations(connection)
+else:
+    asyncio.run(run_async_migrations())
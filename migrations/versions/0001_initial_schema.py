@@ -0,0 +1,80 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 10:00:00
+
+Tables as they were created by Base.metadata.create_all. Databases created
+that way are upgraded in place: existing tables and statuses are kept.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "statuses",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("description", sa.String(), nullable=False, unique=True),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "products",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=100), nullable=False, unique=True),
+        sa.Column("description", sa.String(length=500), server_default="", nullable=False),
+        sa.Column("price", sa.Float(), server_default="0", nullable=False),
+        sa.Column("quantity", sa.Integer(), server_default="0", nullable=False),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "orders",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column(
+            "status_id",
+            sa.Integer(),
+            sa.ForeignKey("statuses.id", onupdate="CASCADE", ondelete="SET NULL"),
+            nullable=True,
+        ),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "order_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "product_id",
+            sa.Integer(),
+            sa.ForeignKey("products.id", onupdate="CASCADE", ondelete="CASCADE"),
+            nullable=True,
+        ),
+        sa.Column(
+            "order_id",
+            sa.Integer(),
+            sa.ForeignKey("orders.id", onupdate="CASCADE", ondelete="CASCADE"),
+            nullable=True,
+        ),
+        sa.Column("quantity", sa.Integer(), server_default="0", nullable=False),
+        if_not_exists=True,
+    )
+    op.execute(
+        "INSERT INTO statuses (id, description) "
+        "VALUES (1, 'в процессе'), (2, 'отправлен'), (3, 'доставлен') "
+        "ON CONFLICT DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("order_items")
+    op.drop_table("orders")
+    op.drop_table("products")
+    op.drop_table("statuses")
@@ -0,0 +1,48 @@
+"""indexes for order lookups, product filters and sorting
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 10:05:00
+
+Indexes are built CONCURRENTLY, so writes to large tables are not blocked.
+A build that failed halfway leaves an INVALID index behind, which
+IF NOT EXISTS would skip: drop it before running the upgrade again.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_order_items_product_id", "order_items", ["product_id"], {}),
+    ("ix_order_items_order_id", "order_items", ["order_id"], {}),
+    ("ix_orders_status_id", "orders", ["status_id"], {}),
+    ("ix_orders_created_at", "orders", ["created_at"], {}),
+    (
+        "ix_products_name_pattern", "products", ["name"],
+        {"postgresql_ops": {"name": "text_pattern_ops"}},
+    ),
+    ("ix_products_price_id", "products", ["price", "id"], {}),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_concurrently=True, if_not_exists=True, **options
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table, postgresql_concurrently=True, if_exists=True)
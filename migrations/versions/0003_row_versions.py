@@ -0,0 +1,34 @@
+"""row versions for conditional requests
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 10:10:00
+
+Adding a column with a constant or now() default doesn't rewrite the table.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table in ("products", "orders"):
+        op.execute(
+            "ALTER TABLE %s "
+            "ADD COLUMN IF NOT EXISTS version INTEGER DEFAULT 1 NOT NULL, "
+            "ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE "
+            "DEFAULT now() NOT NULL" % table
+        )
+
+
+def downgrade() -> None:
+    for table in ("orders", "products"):
+        op.drop_column(table, "updated_at")
+        op.drop_column(table, "version")
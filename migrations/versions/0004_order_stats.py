@@ -0,0 +1,44 @@
+"""order summary for analytics and order item prices
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 12:00:00
+
+The summary is created empty: fill it for existing orders with
+'python cli.py rebuild-stats'.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("order_items", sa.Column("price", sa.Float(), nullable=True))
+    op.create_table(
+        "order_stats",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column(
+            "product_id",
+            sa.Integer(),
+            sa.ForeignKey("products.id", onupdate="CASCADE", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("status_id", sa.Integer(), primary_key=True),
+        sa.Column("orders", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("units", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("revenue", sa.Float(), server_default="0", nullable=False),
+    )
+    op.create_index("ix_order_stats_product_id", "order_stats", ["product_id"])
+
+
+def downgrade() -> None:
+    op.drop_table("order_stats")
+    op.drop_column("order_items", "price")
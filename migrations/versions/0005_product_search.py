@@ -0,0 +1,72 @@
+"""search index for products
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16 14:00:00
+
+pg_trgm is a trusted extension, so the database owner can create it
+without superuser rights. Downgrade keeps the extension installed.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_table(
+        "search_terms",
+        sa.Column("term", sa.String(collation="C"), primary_key=True),
+    )
+    op.create_index(
+        "ix_search_terms_term_trgm",
+        "search_terms",
+        ["term"],
+        postgresql_using="gin",
+        postgresql_ops={"term": "gin_trgm_ops"},
+    )
+    op.create_table(
+        "product_terms",
+        sa.Column(
+            "product_id",
+            sa.Integer(),
+            sa.ForeignKey("products.id", onupdate="CASCADE", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("term", sa.String(collation="C"), primary_key=True),
+        sa.Column("field", sa.SmallInteger(), nullable=False),
+    )
+    op.create_index(
+        "ix_product_terms_term", "product_terms", ["term", "field", "product_id"]
+    )
+
+    op.execute(
+        """
+        INSERT INTO product_terms (product_id, term, field)
+        SELECT id, term, min(field)
+        FROM (
+            SELECT id, unnest(tsvector_to_array(to_tsvector('simple', name))) AS term, 0 AS field
+            FROM products
+            UNION ALL
+            SELECT id, unnest(tsvector_to_array(to_tsvector('simple', description))), 1
+            FROM products
+        ) AS terms
+        GROUP BY id, term
+        """
+    )
+    op.execute(
+        "INSERT INTO search_terms (term) SELECT DISTINCT term FROM product_terms"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("product_terms")
+    op.drop_table("search_terms")
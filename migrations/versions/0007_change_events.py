@@ -0,0 +1,71 @@
+"""change events for the event feed
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16 16:00:00
+
+A statement-level trigger notifies listeners of the IDs of inserted
+events, 500 per message to stay under the 8000 byte NOTIFY payload limit.
+Notifications are delivered on commit, so listeners only see committed events.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "change_events",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False
+        ),
+        sa.Column("entity", sa.String(length=20), nullable=False),
+        sa.Column("action", sa.String(length=20), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("order_id", sa.Integer(), nullable=True),
+        sa.Column("data", postgresql.JSONB(), nullable=False),
+    )
+    op.create_index(
+        "ix_change_events_product_id_id", "change_events", ["product_id", "id"]
+    )
+    op.create_index(
+        "ix_change_events_created_at", "change_events", ["created_at"], postgresql_using="brin"
+    )
+    op.execute(
+        """
+        CREATE FUNCTION notify_change_events() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('change_events', ids)
+            FROM (
+                SELECT string_agg(id::text, ',' ORDER BY id) AS ids
+                FROM (SELECT id, (row_number() OVER (ORDER BY id) - 1) / 500 AS chunk FROM new_events) AS numbered
+                GROUP BY chunk
+            ) AS chunks;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER change_events_notify
+        AFTER INSERT ON change_events
+        REFERENCING NEW TABLE AS new_events
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_change_events()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("change_events")
+    op.execute("DROP FUNCTION notify_change_events()")
@@ -0,0 +1,60 @@
+"""stock counters for the sharded stock mode
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16 18:00:00
+
+Counters are updated several times a second for hot products, so their
+pages keep free space for HOT updates, which don't touch the primary key index.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "products",
+        sa.Column("stock_shards", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.create_table(
+        "stock_shards",
+        sa.Column(
+            "product_id",
+            sa.Integer(),
+            sa.ForeignKey("products.id", onupdate="CASCADE", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("shard", sa.Integer(), primary_key=True),
+        sa.Column("quantity", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("version", sa.Integer(), server_default="0", nullable=False),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False
+        ),
+    )
+    op.execute("ALTER TABLE stock_shards SET (fillfactor = 50)")
+
+
+def downgrade() -> None:
+    # Stock of sharded products goes back to their rows
+    op.execute(
+        """
+        UPDATE products
+        SET quantity = totals.quantity, version = products.version + totals.version
+        FROM (
+            SELECT product_id, sum(quantity) AS quantity, sum(version) AS version
+            FROM stock_shards GROUP BY product_id
+        ) AS totals
+        WHERE products.id = totals.product_id
+        """
+    )
+    op.drop_table("stock_shards")
+    op.drop_column("products", "stock_shards")
@@ -0,0 +1,231 @@
+"""orders and order items partitioned by month, archive tables
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-16 20:00:00
+
+orders and order_items are recreated as tables partitioned by created_at
+and existing rows are copied into them, so the upgrade takes time and
+blocks order writes on large databases. order_items gets the creation time
+of its order and loses the foreign key to orders: partitions of both
+tables are detached and archived together. Partitions are created for the
+months of existing orders and three months ahead, later months are added
+by `python cli.py create-order-partitions`. orders_archive and
+order_items_archive receive old partitions from `python cli.py archive-orders`.
+
+"""
+from datetime import date
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def order_columns(id_default: Optional[str] = None) -> list:
+    return [
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text(id_default) if id_default else None,
+            nullable=False,
+        ),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column(
+            "status_id",
+            sa.Integer(),
+            sa.ForeignKey("statuses.id", onupdate="CASCADE", ondelete="SET NULL"),
+            nullable=True,
+        ),
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False
+        ),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+    ]
+
+
+def order_item_columns(id_default: Optional[str] = None) -> list:
+    return [
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text(id_default) if id_default else None,
+            nullable=False,
+        ),
+        sa.Column(
+            "product_id",
+            sa.Integer(),
+            sa.ForeignKey("products.id", onupdate="CASCADE", ondelete="CASCADE"),
+            nullable=True,
+        ),
+        sa.Column("order_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column("quantity", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("price", sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+    ]
+
+
+def create_indexes(orders: str, order_items: str) -> None:
+    op.create_index("ix_%s_status_id" % orders, orders, ["status_id"])
+    op.create_index("ix_%s_created_at" % orders, orders, ["created_at"])
+    op.create_index("ix_%s_product_id" % order_items, order_items, ["product_id"])
+    op.create_index("ix_%s_order_id" % order_items, order_items, ["order_id"])
+
+
+def drop_indexes() -> None:
+    for name in (
+        "ix_orders_status_id", "ix_orders_created_at",
+        "ix_order_items_product_id", "ix_order_items_order_id",
+    ):
+        op.execute("DROP INDEX IF EXISTS %s" % name)
+
+
+def upgrade() -> None:
+    for table in ("orders", "order_items"):
+        op.rename_table(table, "%s_unpartitioned" % table)
+        op.execute(
+            "ALTER TABLE %s_unpartitioned RENAME CONSTRAINT %s_pkey TO %s_unpartitioned_pkey"
+            % (table, table, table)
+        )
+        op.execute("ALTER SEQUENCE %s_id_seq OWNED BY NONE" % table)
+    drop_indexes()
+
+    op.create_table(
+        "orders",
+        *order_columns("nextval('orders_id_seq')"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    op.create_table(
+        "order_items",
+        *order_item_columns("nextval('order_items_id_seq')"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    create_indexes("orders", "order_items")
+    # Archived orders are not created, only moved in with their partitions
+    op.create_table(
+        "orders_archive", *order_columns(), postgresql_partition_by="RANGE (created_at)"
+    )
+    op.create_table(
+        "order_items_archive", *order_item_columns(), postgresql_partition_by="RANGE (created_at)"
+    )
+    create_indexes("orders_archive", "order_items_archive")
+
+    first = op.get_bind().scalar(sa.text(
+        "SELECT CAST(date_trunc('month', min(created_at)) AS date) FROM orders_unpartitioned"
+    ))
+    last = add_months(date.today(), MONTHS_AHEAD)
+    month = first or add_months(date.today(), 0)
+    while month <= last:
+        for table in ("orders", "order_items"):
+            op.execute(
+                "CREATE TABLE %s_p%04d_%02d PARTITION OF %s FOR VALUES FROM ('%s') TO ('%s')"
+                % (table, month.year, month.month, table, month, add_months(month, 1))
+            )
+        month = add_months(month, 1)
+    for table in ("orders", "order_items"):
+        op.execute("CREATE TABLE %s_default PARTITION OF %s DEFAULT" % (table, table))
+
+    op.execute(
+        "INSERT INTO orders (id, created_at, status_id, version, updated_at) "
+        "SELECT id, created_at, status_id, version, updated_at FROM orders_unpartitioned"
+    )
+    op.execute(
+        "INSERT INTO order_items (id, product_id, order_id, created_at, quantity, price) "
+        "SELECT items.id, items.product_id, items.order_id, "
+        "coalesce(orders.created_at, now()), items.quantity, items.price "
+        "FROM order_items_unpartitioned AS items "
+        "LEFT JOIN orders_unpartitioned AS orders ON orders.id = items.order_id"
+    )
+    op.drop_table("order_items_unpartitioned")
+    op.drop_table("orders_unpartitioned")
+    for table in ("orders", "order_items"):
+        op.execute("ALTER SEQUENCE %s_id_seq OWNED BY %s.id" % (table, table))
+
+
+def downgrade() -> None:
+    for table in ("orders", "order_items"):
+        op.rename_table(table, "%s_partitioned" % table)
+        op.execute(
+            "ALTER TABLE %s_partitioned RENAME CONSTRAINT %s_pkey TO %s_partitioned_pkey"
+            % (table, table, table)
+        )
+        op.execute("ALTER SEQUENCE %s_id_seq OWNED BY NONE" % table)
+    drop_indexes()
+
+    op.create_table(
+        "orders",
+        sa.Column(
+            "id", sa.Integer(), server_default=sa.text("nextval('orders_id_seq')"), primary_key=True
+        ),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column(
+            "status_id",
+            sa.Integer(),
+            sa.ForeignKey("statuses.id", onupdate="CASCADE", ondelete="SET NULL"),
+            nullable=True,
+        ),
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False
+        ),
+    )
+    op.create_table(
+        "order_items",
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('order_items_id_seq')"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "product_id",
+            sa.Integer(),
+            sa.ForeignKey("products.id", onupdate="CASCADE", ondelete="CASCADE"),
+            nullable=True,
+        ),
+        sa.Column(
+            "order_id",
+            sa.Integer(),
+            sa.ForeignKey("orders.id", onupdate="CASCADE", ondelete="CASCADE"),
+            nullable=True,
+        ),
+        sa.Column("quantity", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("price", sa.Float(), nullable=True),
+    )
+
+    # Archived orders go back too
+    op.execute(
+        "INSERT INTO orders (id, created_at, status_id, version, updated_at) "
+        "SELECT id, created_at, status_id, version, updated_at FROM orders_partitioned "
+        "UNION ALL "
+        "SELECT id, created_at, status_id, version, updated_at FROM orders_archive"
+    )
+    op.execute(
+        "INSERT INTO order_items (id, product_id, order_id, quantity, price) "
+        "SELECT id, product_id, order_id, quantity, price FROM order_items_partitioned "
+        "UNION ALL "
+        "SELECT id, product_id, order_id, quantity, price FROM order_items_archive"
+    )
+    create_indexes("orders", "order_items")
+
+    # Dropping a partitioned table drops its partitions
+    for table in (
+        "order_items_archive", "orders_archive", "order_items_partitioned", "orders_partitioned",
+    ):
+        op.drop_table(table)
+    for table in ("orders", "order_items"):
+        op.execute("ALTER SEQUENCE %s_id_seq OWNED BY %s.id" % (table, table))
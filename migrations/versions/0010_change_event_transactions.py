@@ -0,0 +1,48 @@
+"""transaction IDs of change events
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-16 21:00:00
+
+Event IDs are taken before commit, so an event can become visible after
+events with greater IDs. Each event now records the ID of the transaction
+that wrote it and the oldest transaction still running at the time, so
+that a replay after Last-Event-ID also returns such late events.
+The defaults apply to new rows only; existing events keep NULL.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Added without defaults, so existing rows are not rewritten
+    op.add_column("change_events", sa.Column("xact_id", sa.BigInteger(), nullable=True))
+    op.add_column("change_events", sa.Column("xact_horizon", sa.BigInteger(), nullable=True))
+    op.alter_column(
+        "change_events", "xact_id",
+        server_default=sa.text("CAST(CAST(pg_current_xact_id() AS text) AS bigint)"),
+    )
+    op.alter_column(
+        "change_events", "xact_horizon",
+        server_default=sa.text(
+            "CAST(CAST(pg_snapshot_xmin(pg_current_snapshot()) AS text) AS bigint)"
+        ),
+    )
+    op.create_index(
+        "ix_change_events_xact_id", "change_events", ["xact_id"], postgresql_using="brin"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_change_events_xact_id", table_name="change_events")
+    op.drop_column("change_events", "xact_horizon")
+    op.drop_column("change_events", "xact_id")
@@ -2,3 +2,9 @@ from models.product import Product
 from models.status import Status
 from models.order import Order
 from models.order_item import OrderItem
+from models.order_stats import OrderStats
+from models.search_term import SearchTerm
+from models.product_term import ProductTerm
+from models.idempotency_key import IdempotencyKey
+from models.change_event import ChangeEvent
+from models.stock_shard import StockShard
@@ -0,0 +1,125 @@
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from sqlalchemy import (
+    and_, BigInteger, DateTime, delete, func, Index, Insert, Integer, or_, Select, select, String, text
+)
+from sqlalchemy.dialects.postgresql import insert, JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, Mapped, mapped_column
+
+from database import Base
+import schemas
+
+# The trigger in migration 0007 sends the IDs of new events to this channel
+CHANNEL = "change_events"
+EVENT_COLUMNS = ["entity", "action", "product_id", "order_id", "data"]
+
+
+class ChangeEvent(Base):
+    """
+    Журнал изменений заказов и товаров для ленты событий.
+    Пишется в транзакции, которая вносит изменение, поэтому событие
+    появляется, только если изменение зафиксировано. После каждой вставки
+    триггер отправляет ID новых событий через NOTIFY.
+
+    """
+    __tablename__ = "change_events"
+    __table_args__ = (
+        # Replay of one product's events after Last-Event-ID
+        Index("ix_change_events_product_id_id", "product_id", "id"),
+        # Rows are appended in time order, so a BRIN index is enough for purging
+        Index("ix_change_events_created_at", "created_at", postgresql_using="brin"),
+        # Transaction IDs grow with event IDs, so a BRIN index is enough for late events
+        Index("ix_change_events_xact_id", "xact_id", postgresql_using="brin"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    entity: Mapped[str] = mapped_column(String(length=20))
+    action: Mapped[str] = mapped_column(String(length=20))
+    # No foreign keys: events outlive deleted products
+    product_id: Mapped[int] = mapped_column(Integer)
+    order_id: Mapped[Optional[int]] = mapped_column(Integer)
+    data: Mapped[dict] = mapped_column(JSONB)
+    # The writing transaction and the oldest transaction running when the event
+    # was written: events with smaller IDs may still be committed by the latter
+    xact_id: Mapped[Optional[int]] = mapped_column(
+        BigInteger, server_default=text("CAST(CAST(pg_current_xact_id() AS text) AS bigint)")
+    )
+    xact_horizon: Mapped[Optional[int]] = mapped_column(
+        BigInteger,
+        server_default=text("CAST(CAST(pg_snapshot_xmin(pg_current_snapshot()) AS text) AS bigint)"),
+    )
+
+    @classmethod
+    def insert_from(cls, events: Select) -> Insert:
+        """
+        Вставка событий из запроса с колонками EVENT_COLUMNS, например
+        как CTE в запросе, который вносит изменение.
+
+        """
+        return insert(ChangeEvent).from_select(EVENT_COLUMNS, events)
+
+    @classmethod
+    async def emit(cls, db_async_session: AsyncSession, events: Sequence[dict]) -> None:
+        """Добавляет события в текущую транзакцию одним запросом."""
+        if events:
+            await db_async_session.execute(insert(ChangeEvent).values(list(events)))
+
+    @classmethod
+    def _select(cls) -> Select:
+        return select(
+            ChangeEvent.id,
+            ChangeEvent.entity,
+            ChangeEvent.action,
+            ChangeEvent.product_id,
+            ChangeEvent.order_id,
+            ChangeEvent.data,
+            ChangeEvent.created_at,
+        )
+
+    @classmethod
+    def select_by_ids(cls, ids: Sequence[int]) -> Select:
+        return cls._select().where(ChangeEvent.id.in_(ids)).order_by(ChangeEvent.id)
+
+    @classmethod
+    async def read_after(
+            cls,
+            db_async_session: AsyncSession,
+            after_id: int,
+            event_filter: schemas.EventFilter,
+            limit: int,
+    ) -> List[schemas.ChangeEvent]:
+        """
+        События после `after_id` по возрастанию ID. ID выдаются до фиксации,
+        поэтому событие с меньшим ID может появиться уже после `after_id`:
+        такие события тоже возвращаются - из транзакций, которые ещё шли, когда
+        было записано событие `after_id`. Они могли быть отданы раньше, поэтому
+        повторы возможны, а пропусков нет.
+
+        """
+        last = aliased(ChangeEvent)
+        horizon = select(last.xact_horizon).where(last.id == after_id).scalar_subquery()
+        stmt = cls._select().where(or_(
+            ChangeEvent.id > after_id,
+            and_(ChangeEvent.id < after_id, ChangeEvent.xact_id >= horizon),
+        ))
+        if event_filter.entity is not None:
+            stmt = stmt.where(ChangeEvent.entity.in_([entity.value for entity in event_filter.entity]))
+        if event_filter.product_id is not None:
+            stmt = stmt.where(ChangeEvent.product_id == event_filter.product_id)
+        rows = (await db_async_session.execute(stmt.order_by(ChangeEvent.id).limit(limit))).all()
+
+        return [schemas.ChangeEvent.model_validate(row) for row in rows]
+
+    @classmethod
+    async def purge(cls, db_async_session: AsyncSession, before: datetime) -> int:
+        """Удаляет события старше `before`, возвращает их число."""
+        result = await db_async_session.execute(
+            delete(ChangeEvent).where(ChangeEvent.created_at < before)
+        )
+
+        return result.rowcount
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, delete, func, Index, select, String, update
+from sqlalchemy.dialects.postgresql import insert, JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from config import settings
+from database import Base
+import schemas
+
+
+class IdempotencyKey(Base):
+    """
+    Ответы на повторяемые запросы создания по заголовку Idempotency-Key.
+    Ключ занимается и ответ сохраняется в транзакции, которая выполняет запись,
+    поэтому сохранённый ответ есть у ключа, только если запись состоялась.
+
+    """
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    scope: Mapped[str] = mapped_column(String(length=100), primary_key=True)
+    key: Mapped[str] = mapped_column(String(length=255), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(length=64))
+    # Empty only inside the transaction that claimed the key
+    response: Mapped[Optional[dict]] = mapped_column(JSONB)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    @classmethod
+    async def claim(
+            cls,
+            db_async_session: AsyncSession,
+            request: schemas.IdempotencyRequest,
+    ) -> Optional[dict]:
+        """
+        Занимает ключ в текущей транзакции и возвращает None, либо возвращает
+        сохранённый ответ, если запрос с этим ключом уже выполнен.
+        Повтор, пришедший во время выполнения первого запроса, ждёт окончания
+        его транзакции: после фиксации получает его ответ, после отката
+        занимает ключ сам.
+
+        """
+        expires_at = func.now() + timedelta(seconds=settings.idempotency_key_ttl)
+        stmt = insert(IdempotencyKey).values(
+            scope=request.scope,
+            key=request.key,
+            fingerprint=request.fingerprint,
+            expires_at=expires_at,
+        )
+        # An expired key is taken over as if it did not exist
+        claimed = await db_async_session.scalar(
+            stmt.on_conflict_do_update(
+                index_elements=[IdempotencyKey.scope, IdempotencyKey.key],
+                set_={
+                    "fingerprint": stmt.excluded.fingerprint,
+                    "response": None,
+                    "expires_at": stmt.excluded.expires_at,
+                },
+                where=IdempotencyKey.expires_at <= func.now(),
+            ).returning(IdempotencyKey.key)
+        )
+        if claimed is not None:
+            return None
+
+        stored = (await db_async_session.execute(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.response)
+            .where(IdempotencyKey.scope == request.scope, IdempotencyKey.key == request.key)
+        )).one()
+        if stored.fingerprint != request.fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key '%s' was used with a different request body" % request.key
+            )
+        return stored.response
+
+    @classmethod
+    async def store(
+            cls,
+            db_async_session: AsyncSession,
+            request: schemas.IdempotencyRequest,
+            response: dict,
+    ) -> None:
+        """Сохраняет ответ для ключа, занятого в текущей транзакции."""
+        await db_async_session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.scope == request.scope, IdempotencyKey.key == request.key)
+            .values(response=response)
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    async def purge_expired(cls, db_async_session: AsyncSession) -> int:
+        """Удаляет ключи с истёкшим сроком хранения, возвращает их число."""
+        result = await db_async_session.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.expires_at <= func.now())
+        )
+
+        return result.rowcount
@@ -1,38 +1,99 @@
 from datetime import datetime
-from typing import Sequence
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple, Union
 
 from fastapi import HTTPException, status
-from sqlalchemy import ForeignKey, select
+from sqlalchemy import (
+    and_, cast, column, ColumnElement, CTE, Date, DateTime, ForeignKey, func, insert, Integer,
+    literal, Row, select, union_all, update, values
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped, mapped_column, relationship, joinedload
+from sqlalchemy.orm import aliased, Mapped, mapped_column, contains_eager, lazyload, noload
+from sqlalchemy.orm.attributes import set_committed_value
 
+import conditional
 from database import Base
+import export
 import models
+import pagination
+import partitions
 import schemas
 
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+    __mapper_args__ = {"eager_defaults": True}
 
-    id: Mapped[int] = mapped_column(primary_key=True)
-    created_at: Mapped[datetime] = mapped_column(default=datetime.now())
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    # Orders are partitioned by month of creation, so the key is part of the primary key
+    created_at: Mapped[datetime] = mapped_column(
+        server_default=func.now(), primary_key=True, index=True
+    )
     status_id: Mapped[int] = mapped_column(
         ForeignKey("statuses.id", onupdate="CASCADE", ondelete="SET NULL"),
         default=1,
         nullable=True,
+        index=True,
+    )
+    version: Mapped[int] = mapped_column(server_default="1")
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
     )
-
-    status: Mapped[models.Status] = relationship(lazy='joined')
 
     @classmethod
     async def add_order(
             cls,
             db_async_session: AsyncSession,
-            order_schema: schemas.Order
-    ) -> "models.OrderItem":
-        product = await models.Product.get_product(db_async_session, order_schema.product_id)
+            order_schema: schemas.Order,
+            idempotency: Optional[schemas.IdempotencyRequest] = None,
+    ) -> Union["models.OrderItem", schemas.OrderResponse]:
+        """
+        Оформляет заказ. С `idempotency` повтор запроса с тем же ключом
+        возвращает сохранённый ответ первого запроса, не резервируя товар снова.
+
+        """
+        if idempotency is not None:
+            replay = await models.IdempotencyKey.claim(db_async_session, idempotency)
+            if replay is not None:
+                return schemas.OrderResponse.model_validate(replay)
+
+        # Stock is checked and reserved by a single conditional UPDATE,
+        # so concurrent orders for the same product cannot oversell it
+        reserved = (await db_async_session.execute(
+            update(models.Product)
+            .where(
+                models.Product.id == order_schema.product_id,
+                models.Product.stock_shards == 0,
+                models.Product.stored_quantity >= order_schema.quantity,
+            )
+            .values(
+                stored_quantity=models.Product.stored_quantity - order_schema.quantity,
+                stored_version=models.Product.stored_version + 1,
+                stored_updated_at=func.now(),
+            )
+            .returning(
+                models.Product.id, models.Product.price,
+                models.Product.stored_quantity.label("quantity"),
+            )
+            .execution_options(synchronize_session=False)
+        )).one_or_none()
 
-        if product.quantity < order_schema.quantity:
+        if reserved is None:
+            product = (await db_async_session.execute(
+                select(models.Product.name, models.Product.stock_shards)
+                .where(models.Product.id == order_schema.product_id)
+            )).one_or_none()
+            if product is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Product with ID '%s' does not exist" % order_schema.product_id
+                )
+            # Hot products keep their stock in counters and don't lock the product row
+            if product.stock_shards:
+                reserved = await models.StockShard.reserve(
+                    db_async_session, order_schema.product_id, order_schema.quantity
+                )
+        if reserved is None:
             error_message = "Количество товара {product!r} на складе "\
                             "меньше запрашиваемого {quantity} шт."
             raise HTTPException(
@@ -41,26 +102,307 @@ class Order(Base):
                     product=product.name, quantity=order_schema.quantity
                 )
             )
-        async with db_async_session.begin():
-            new_order_item = models.OrderItem(
-                product=product,
-                order=Order(),
-                quantity=order_schema.quantity
+
+        new_order_item = models.OrderItem(
+            product_id=reserved.id,
+            order=Order(),
+            quantity=order_schema.quantity,
+            price=reserved.price,
+        )
+        db_async_session.add(new_order_item)
+        await db_async_session.flush()
+        await models.OrderStats.record(db_async_session, [(
+            new_order_item.order.created_at, reserved.id, new_order_item.order.status_id,
+            new_order_item.quantity, new_order_item.price,
+        )])
+        await models.ChangeEvent.emit(db_async_session, [
+            cls._created_event(
+                new_order_item.id, reserved.id, new_order_item.quantity,
+                new_order_item.order.status_id,
+            ),
+            models.Product.stock_event(reserved.id, reserved.quantity),
+        ])
+        if idempotency is not None:
+            await models.IdempotencyKey.store(
+                db_async_session,
+                idempotency,
+                schemas.OrderResponse.model_validate(new_order_item).model_dump(mode="json"),
             )
-            db_async_session.add(new_order_item)
-            product.quantity -= order_schema.quantity
+        await models.Product.invalidate_cached(db_async_session, reserved.id)
 
         return new_order_item
 
     @classmethod
-    async def get_orders(
-            cls, db_async_session: AsyncSession
-    ) -> Sequence["models.Order"]:
+    def _created_event(cls, order_id: int, product_id: int, quantity: int, status_id: int) -> dict:
+        return {
+            "entity": schemas.EventEntity.order.value,
+            "action": schemas.EventAction.created.value,
+            "product_id": product_id,
+            "order_id": order_id,
+            "data": {"quantity": quantity, "status_id": status_id},
+        }
+
+    @classmethod
+    async def add_orders(
+            cls,
+            db_async_session: AsyncSession,
+            order_schemas: Sequence[schemas.Order],
+    ) -> List[schemas.OrderBatchResult]:
+        results = [schemas.OrderBatchResult(index=index) for index in range(len(order_schemas))]
+
+        # Rows are locked in ID order so that concurrent batches cannot deadlock
+        products = (await db_async_session.execute(
+            select(
+                models.Product.id, models.Product.name, models.Product.stored_quantity,
+                models.Product.price, models.Product.stock_shards,
+            )
+            .where(models.Product.id.in_({order.product_id for order in order_schemas}))
+            .order_by(models.Product.id)
+            .with_for_update()
+        )).all()
+        stock = {product.id: product.stored_quantity for product in products}
+        shards = {product.id: product.stock_shards for product in products if product.stock_shards}
+        if shards:
+            # Counters are locked after the product rows, in the same order
+            stock.update(await models.StockShard.lock(db_async_session, list(shards)))
+        names = {product.id: product.name for product in products}
+        prices = {product.id: product.price for product in products}
+
+        accepted, reserved = [], {}
+        for result, order_schema in zip(results, order_schemas):
+            product_id = order_schema.product_id
+            if product_id not in stock:
+                result.error = "Product with ID '%s' does not exist" % product_id
+            elif stock[product_id] < order_schema.quantity:
+                error_message = "Количество товара {product!r} на складе "\
+                                "меньше запрашиваемого {quantity} шт."
+                result.error = error_message.format(
+                    product=names[product_id], quantity=order_schema.quantity
+                )
+            else:
+                stock[product_id] -= order_schema.quantity
+                reserved[product_id] = reserved.get(product_id, 0) + order_schema.quantity
+                accepted.append((result, order_schema))
+
+        if not accepted:
+            return results
+
+        remaining = []
+        for product_id in sorted(reserved.keys() & shards.keys()):
+            await models.StockShard.rebalance(
+                db_async_session, product_id, stock[product_id], shards[product_id]
+            )
+            remaining.append((product_id, stock[product_id]))
+        row_reserved = [item for item in reserved.items() if item[0] not in shards]
+        if row_reserved:
+            reservations = values(
+                column("id", Integer), column("quantity", Integer), name="reservations"
+            ).data(row_reserved)
+            remaining += (await db_async_session.execute(
+                update(models.Product)
+                .where(models.Product.id == reservations.c.id)
+                .values(
+                    stored_quantity=models.Product.stored_quantity - reservations.c.quantity,
+                    stored_version=models.Product.stored_version + 1,
+                    stored_updated_at=func.now(),
+                )
+                .returning(models.Product.id, models.Product.stored_quantity)
+                .execution_options(synchronize_session=False)
+            )).all()
+
+        new_orders = (await db_async_session.execute(
+            insert(Order).returning(
+                Order.id, Order.status_id, Order.created_at, sort_by_parameter_order=True
+            ),
+            [{"status_id": 1} for _ in accepted],
+        )).all()
+        order_items = (await db_async_session.execute(
+            insert(models.OrderItem).returning(
+                models.OrderItem.id, models.OrderItem.product_id, models.OrderItem.quantity,
+                sort_by_parameter_order=True,
+            ),
+            [
+                {
+                    "product_id": order_schema.product_id,
+                    "order_id": new_order.id,
+                    "created_at": new_order.created_at,
+                    "quantity": order_schema.quantity,
+                    "price": prices[order_schema.product_id],
+                }
+                for (_, order_schema), new_order in zip(accepted, new_orders)
+            ],
+        )).all()
+        await models.OrderStats.record(db_async_session, [
+            (
+                new_order.created_at, order_schema.product_id, new_order.status_id,
+                order_schema.quantity, prices[order_schema.product_id],
+            )
+            for (_, order_schema), new_order in zip(accepted, new_orders)
+        ])
+        await models.ChangeEvent.emit(db_async_session, [
+            *(
+                cls._created_event(
+                    order_item.id, order_item.product_id, order_item.quantity,
+                    new_order.status_id,
+                )
+                for order_item, new_order in zip(order_items, new_orders)
+            ),
+            *(
+                models.Product.stock_event(product_id, quantity)
+                for product_id, quantity in remaining
+            ),
+        ])
+        await models.Product.invalidate_cached(db_async_session, *reserved)
+
+        for (result, _), order_item in zip(accepted, order_items):
+            result.order = schemas.OrderResponse.model_validate(order_item)
+
+        return results
+
+    @classmethod
+    async def get_orders_page(
+            cls,
+            db_async_session: AsyncSession,
+            params: schemas.OrderListParams,
+            as_rows: bool = False,
+    ) -> pagination.Page:
+        """
+        Страница заказов. При `as_rows` вместо ORM-объектов возвращаются
+        словари с полями OrderResponse без загрузки объектов в сессию,
+        а если заданы `params.fields` - только с этими полями: остальные
+        столбцы не читаются из БД.
+
+        """
+        keys = {
+            schemas.OrderSort.id: (models.OrderItem.id,),
+            schemas.OrderSort.created_at: (Order.created_at, models.OrderItem.id),
+        }[params.sort]
+        fields = [
+            field.value for field in params.fields
+            or (schemas.OrderField.product_id, schemas.OrderField.quantity, schemas.OrderField.id)
+        ]
+
+        # OrderResponse doesn't need the product,
+        # so only the order row used for filtering and sorting is joined
+        if as_rows:
+            columns = {
+                "product_id": models.OrderItem.product_id,
+                "quantity": models.OrderItem.quantity,
+                "id": models.OrderItem.id,
+                "status": Order.status_id,
+                "created_at": Order.created_at,
+            }
+            columns = {name: columns[name] for name in fields}
+            for key in keys:
+                columns.setdefault(key.key, key)
+            stmt = select(*(column.label(name) for name, column in columns.items()))
+            uses_order = (
+                params.status_id is not None
+                or params.created_from is not None
+                or params.created_to is not None
+                or any(column.class_ is Order for column in columns.values())
+            )
+            stmt = (
+                stmt.join(models.OrderItem.order) if uses_order
+                else stmt.select_from(models.OrderItem)
+            )
+        else:
+            stmt = (
+                select(models.OrderItem)
+                .join(models.OrderItem.order)
+                .options(
+                    contains_eager(models.OrderItem.order),
+                    lazyload(models.OrderItem.product),
+                )
+            )
+        if params.status_id is not None:
+            stmt = stmt.where(Order.status_id == params.status_id)
+        if params.product_id is not None:
+            stmt = stmt.where(models.OrderItem.product_id == params.product_id)
+        # The period is applied to both tables, so each scans only the partitions of its months
+        if params.created_from is not None:
+            stmt = stmt.where(
+                Order.created_at >= params.created_from,
+                models.OrderItem.created_at >= params.created_from,
+            )
+        if params.created_to is not None:
+            stmt = stmt.where(
+                Order.created_at < params.created_to,
+                models.OrderItem.created_at < params.created_to,
+            )
+
         result = await db_async_session.execute(
-            select(models.OrderItem)
+            pagination.paginate(stmt, keys, params)
+        )
+        order_items = result.all() if as_rows else result.unique().scalars().all()
+
+        if params.sort is schemas.OrderSort.id:
+            page = pagination.make_page(order_items, params, lambda order_item: [order_item.id])
+        elif as_rows:
+            page = pagination.make_page(
+                order_items, params, lambda order_item: [order_item.created_at, order_item.id]
+            )
+        else:
+            page = pagination.make_page(
+                order_items, params, lambda order_item: [order_item.order.created_at, order_item.id]
+            )
+
+        if as_rows:
+            return pagination.Page(
+                [
+                    {
+                        name: models.Status.describe(row.status) if name == "status"
+                        else getattr(row, name)
+                        for name in fields
+                    }
+                    for row in page.items
+                ],
+                page.next_cursor,
+            )
+        return page
+
+    @classmethod
+    async def get_orders(
+            cls,
+            db_async_session: AsyncSession,
+            params: Optional[schemas.OrderListParams] = None,
+    ) -> Sequence["models.OrderItem"]:
+        page = await cls.get_orders_page(
+            db_async_session, params or schemas.OrderListParams()
+        )
+        return page.items
+
+    @classmethod
+    def export_orders(
+            cls,
+            open_session: Callable[[], Awaitable[AsyncSession]],
+            export_format: schemas.DataFormat,
+    ) -> AsyncIterator[str]:
+        return export.stream_rows(
+            open_session,
+            select(
+                models.OrderItem.id,
+                models.OrderItem.product_id,
+                models.OrderItem.quantity,
+                Order.status_id,
+                Order.created_at,
+            )
+            .join(models.OrderItem.order)
+            .order_by(models.OrderItem.id),
+            export_format,
+        )
+
+    @classmethod
+    def _archive_entities(cls) -> Tuple[Any, Any]:
+        """OrderItem и Order, читающие архивные таблицы вместо оперативных."""
+        return (
+            aliased(
+                models.OrderItem,
+                partitions.archive_table(models.OrderItem.__table__).alias(),
+                adapt_on_names=True,
+            ),
+            aliased(Order, partitions.archive_table(Order.__table__).alias(), adapt_on_names=True),
         )
-        await db_async_session.aclose()
-        return result.unique().scalars().all()
 
     @classmethod
     async def get_order(
@@ -68,12 +410,38 @@ class Order(Base):
             db_async_session: AsyncSession,
             order_id: int
     ) -> "models.Order":
+        """
+        Заказ по ID. Если среди оперативных заказов его нет,
+        он ищется в архиве.
+
+        """
         result = await db_async_session.execute(
             select(models.OrderItem).where(models.OrderItem.id == order_id)
         )
-        await db_async_session.aclose()
         order_item = result.unique().scalars().one_or_none()
 
+        if order_item is None:
+            # Relationships of the models read the live tables,
+            # so the archived order and product are joined explicitly
+            archived_item, archived_order = cls._archive_entities()
+            row = (await db_async_session.execute(
+                select(archived_item, archived_order, models.Product)
+                .join(
+                    archived_order,
+                    and_(
+                        archived_order.id == archived_item.order_id,
+                        archived_order.created_at == archived_item.created_at,
+                    ),
+                )
+                .outerjoin(models.Product, models.Product.id == archived_item.product_id)
+                .options(noload(archived_item.order), noload(archived_item.product))
+                .where(archived_item.id == order_id)
+            )).one_or_none()
+            if row is not None:
+                order_item = row[0]
+                set_committed_value(order_item, "order", row[1])
+                set_committed_value(order_item, "product", row[2])
+
         if order_item is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -82,18 +450,277 @@ class Order(Base):
 
         return order_item
 
+    @classmethod
+    async def _get_order_row(
+            cls,
+            db_async_session: AsyncSession,
+            order_id: int,
+            columns: Callable[[Any, Any], Sequence[Any]] = lambda order_item, order: (),
+    ) -> Row:
+        """
+        Версии заказа и товара и столбцы `columns(order_item, order)` заказа
+        с ID `order_id`, из оперативных или архивных таблиц.
+
+        """
+        for order_item, order in ((models.OrderItem, Order), cls._archive_entities()):
+            row = (await db_async_session.execute(
+                select(
+                    order.version,
+                    order.updated_at,
+                    models.Product.version.label("product_version"),
+                    models.Product.updated_at.label("product_updated_at"),
+                    *columns(order_item, order),
+                )
+                .select_from(order_item)
+                .join(
+                    order,
+                    and_(order.id == order_item.order_id, order.created_at == order_item.created_at),
+                )
+                .join(models.Product, models.Product.id == order_item.product_id)
+                .where(order_item.id == order_id)
+            )).one_or_none()
+            if row is not None:
+                return row
+
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Order with ID '%s' does not exist" % order_id
+        )
+
+    @classmethod
+    def _validators(cls, row: Row) -> conditional.Validators:
+        return conditional.Validators(
+            conditional.make_etag(row.version, row.product_version),
+            max(row.updated_at, row.product_updated_at),
+        )
+
+    @classmethod
+    async def get_order_validators(
+            cls,
+            db_async_session: AsyncSession,
+            order_id: int,
+    ) -> conditional.Validators:
+        """
+        ETag и Last-Modified заказа по версиям заказа и товара,
+        которые входят в ответ GET /api/orders/{id}.
+
+        """
+        return cls._validators(await cls._get_order_row(db_async_session, order_id))
+
+    @classmethod
+    async def get_order_fields(
+            cls,
+            db_async_session: AsyncSession,
+            order_id: int,
+            fields: Sequence[schemas.OrderDetailsField],
+    ) -> Tuple[dict, conditional.Validators]:
+        """
+        Поля `fields` ответа GET /api/orders/{id} и его ETag и Last-Modified.
+        Читаются только столбцы выбранных полей.
+
+        """
+        product_fields = ("name", "description", "price", "quantity")
+
+        def columns(order_item: Any, order: Any) -> List[Any]:
+            available = {
+                schemas.OrderDetailsField.id: [order_item.id],
+                schemas.OrderDetailsField.quantity: [order_item.quantity],
+                schemas.OrderDetailsField.status: [order.status_id.label("status")],
+                schemas.OrderDetailsField.created_at: [order.created_at],
+                schemas.OrderDetailsField.product: [
+                    getattr(models.Product, name).label("product_" + name)
+                    for name in product_fields
+                ],
+            }
+            return [column for field in fields for column in available[field]]
+
+        row = await cls._get_order_row(db_async_session, order_id, columns)
+        values = row._mapping
+        details = {}
+        for field in fields:
+            if field is schemas.OrderDetailsField.status:
+                details[field.value] = models.Status.describe(row.status)
+            elif field is schemas.OrderDetailsField.product:
+                details[field.value] = {name: values["product_" + name] for name in product_fields}
+            else:
+                details[field.value] = values[field.value]
+
+        return details, cls._validators(row)
+
+    @classmethod
+    def _move_statuses(
+            cls,
+            filters: Sequence[ColumnElement[bool]],
+            status_id: int,
+            *columns: Any,
+    ) -> Tuple[CTE, CTE, CTE]:
+        """
+        CTE, которые одним запросом переводят выбранные заказы в статус `status_id`,
+        переносят их между статусами в сводке OrderStats и добавляют события
+        о смене статуса.
+        `moved` возвращает по строке на заказ: ID, товар, количество,
+        старый и новый статус, дату создания и `columns`.
+
+        """
+        # The previous status is read under the row lock, so that concurrent
+        # updates of the same order move it out of the right summary row
+        previous = (
+            select(Order.id, Order.created_at, Order.status_id)
+            .join(
+                models.OrderItem,
+                and_(
+                    models.OrderItem.order_id == Order.id,
+                    models.OrderItem.created_at == Order.created_at,
+                ),
+            )
+            .where(*filters)
+            .with_for_update(of=Order)
+            .subquery("previous")
+        )
+        moved = (
+            update(Order.__table__)
+            .where(
+                Order.id == previous.c.id,
+                Order.created_at == previous.c.created_at,
+                models.OrderItem.order_id == Order.id,
+                models.OrderItem.created_at == Order.created_at,
+                models.Product.id == models.OrderItem.product_id,
+            )
+            .values(
+                status_id=status_id,
+                version=Order.version + 1,
+                updated_at=func.now(),
+            )
+            .returning(
+                models.OrderItem.id,
+                models.OrderItem.product_id,
+                models.OrderItem.quantity,
+                Order.status_id,
+                Order.created_at,
+                previous.c.status_id.label("previous_status_id"),
+                (
+                    models.OrderItem.quantity
+                    * func.coalesce(models.OrderItem.price, models.Product.price)
+                ).label("revenue"),
+                *columns,
+            )
+            .cte("moved")
+        )
+
+        changed = (
+            select(moved)
+            .where(moved.c.status_id.is_distinct_from(moved.c.previous_status_id))
+            .subquery("changed")
+        )
+        day = cast(changed.c.created_at, Date).label("day")
+        deltas = union_all(
+            select(
+                day,
+                changed.c.product_id,
+                changed.c.status_id,
+                literal(1).label("orders"),
+                changed.c.quantity.label("units"),
+                changed.c.revenue,
+            ),
+            select(
+                day,
+                changed.c.product_id,
+                changed.c.previous_status_id,
+                literal(-1),
+                -changed.c.quantity,
+                -changed.c.revenue,
+            ).where(changed.c.previous_status_id.is_not(None)),
+        ).subquery("deltas")
+        stats = models.OrderStats.upsert(
+            select(
+                deltas.c.day,
+                deltas.c.product_id,
+                deltas.c.status_id,
+                func.sum(deltas.c.orders),
+                func.sum(deltas.c.units),
+                func.sum(deltas.c.revenue),
+            ).group_by(deltas.c.day, deltas.c.product_id, deltas.c.status_id)
+        ).cte("stats")
+        events = models.ChangeEvent.insert_from(
+            select(
+                literal(schemas.EventEntity.order.value),
+                literal(schemas.EventAction.status_changed.value),
+                changed.c.product_id,
+                changed.c.id,
+                func.jsonb_build_object(
+                    "status_id", changed.c.status_id,
+                    "previous_status_id", changed.c.previous_status_id,
+                ),
+            )
+        ).cte("events")
+
+        return moved, stats, events
+
     @classmethod
     async def update_status(
             cls,
             db_async_session: AsyncSession,
             order_id: int,
             status_schema: schemas.StatusUpdate,
-    ) -> "models.Order":
-        order_item = await cls.get_order(db_async_session, order_id)
-        order_item.order.status_id = status_schema.status_id
+    ) -> schemas.OrderDetails:
+        # One statement updates the order, moves it in the summary
+        # and returns everything OrderDetails needs
+        moved, stats, events = cls._move_statuses(
+            [models.OrderItem.id == order_id],
+            status_schema.status_id,
+            models.Product.name,
+            models.Product.description,
+            models.Product.price,
+            models.Product.quantity.label("product_quantity"),
+        )
+        result = await db_async_session.execute(select(moved).add_cte(stats, events))
+        row = result.one_or_none()
 
-        async with db_async_session.begin():
-            await db_async_session.merge(order_item)
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Order with ID '%s' does not exist" % order_id
+            )
 
-        return await cls.get_order(db_async_session, order_id)
+        return schemas.OrderDetails(
+            id=row.id,
+            quantity=row.quantity,
+            status=models.Status.describe(row.status_id),
+            created_at=row.created_at,
+            product=schemas.Product(
+                name=row.name,
+                description=row.description,
+                price=row.price,
+                quantity=row.product_quantity,
+            ),
+        )
 
+    @classmethod
+    async def update_statuses(
+            cls,
+            db_async_session: AsyncSession,
+            update_schema: schemas.OrderStatusBulkUpdate,
+    ) -> schemas.OrderStatusBulkResult:
+        filters = []
+        if update_schema.order_ids is not None:
+            filters.append(models.OrderItem.id.in_(update_schema.order_ids))
+        if update_schema.product_id is not None:
+            filters.append(models.OrderItem.product_id == update_schema.product_id)
+        if update_schema.current_status_id is not None:
+            filters.append(Order.status_id == update_schema.current_status_id)
+        moved, stats, events = cls._move_statuses(filters, update_schema.status_id)
+
+        if update_schema.order_ids is None:
+            updated = await db_async_session.scalar(
+                select(func.count()).select_from(moved).add_cte(stats, events)
+            )
+            return schemas.OrderStatusBulkResult(updated=updated, missing_ids=[])
+
+        updated_ids = set((await db_async_session.scalars(
+            select(moved.c.id).add_cte(stats, events)
+        )).all())
+
+        return schemas.OrderStatusBulkResult(
+            updated=len(updated_ids),
+            missing_ids=sorted(set(update_schema.order_ids) - updated_ids),
+        )
@@ -1,4 +1,6 @@
-from sqlalchemy import ForeignKey
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from database import Base
@@ -7,19 +9,27 @@ import models
 
 class OrderItem(Base):
     __tablename__ = "order_items"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     product_id: Mapped[int] = mapped_column(
         ForeignKey("products.id", onupdate="CASCADE", ondelete="CASCADE"),
         default=None,
         nullable=True,
+        index=True,
     )
-    order_id: Mapped[int] = mapped_column(
-        ForeignKey("orders.id", onupdate="CASCADE", ondelete="CASCADE"),
-        default=None,
-        nullable=True,
-    )
+    # Partitions of orders are detached and archived together with the partitions
+    # of order_items, so the order is referenced without a foreign key
+    order_id: Mapped[int] = mapped_column(default=None, nullable=True, index=True)
+    # Creation time of the order: the partition key, same as in orders
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now(), primary_key=True)
     quantity: Mapped[int] = mapped_column(server_default="0")
+    # Product price at the time of the order; NULL for orders created before it was stored
+    price: Mapped[float] = mapped_column(nullable=True)
 
     product: Mapped[models.Product] = relationship(lazy='joined')
-    order: Mapped[models.Order] = relationship(lazy='joined')
+    order: Mapped[models.Order] = relationship(
+        lazy='joined',
+        primaryjoin="and_(OrderItem.order_id == Order.id, OrderItem.created_at == Order.created_at)",
+        foreign_keys="[OrderItem.order_id, OrderItem.created_at]",
+    )
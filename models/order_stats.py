@@ -0,0 +1,231 @@
+from datetime import date, datetime, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    cast, column, Date, delete, Float, ForeignKey, func, Index, Insert, Integer, Select, select,
+    text, values
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from database import Base
+import models
+import partitions
+import schemas
+
+StatsKey = Tuple[date, int, int]
+
+
+class OrderStats(Base):
+    """
+    Сводка заказов по дням, товарам и статусам. Обновляется в той же транзакции,
+    что и заказы, поэтому отчёты не зависят от объёма истории заказов.
+
+    """
+    __tablename__ = "order_stats"
+    __table_args__ = (
+        Index("ix_order_stats_product_id", "product_id"),
+    )
+
+    day: Mapped[date] = mapped_column(primary_key=True)
+    product_id: Mapped[int] = mapped_column(
+        ForeignKey("products.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    status_id: Mapped[int] = mapped_column(primary_key=True)
+    orders: Mapped[int] = mapped_column(server_default="0")
+    units: Mapped[int] = mapped_column(server_default="0")
+    revenue: Mapped[float] = mapped_column(server_default="0")
+
+    @classmethod
+    def upsert(cls, deltas: Select) -> Insert:
+        """
+        Прибавляет к сводке строки `deltas` со столбцами
+        day, product_id, status_id, orders, units, revenue.
+        Ключи в `deltas` должны быть уникальными.
+
+        """
+        # Rows are locked in key order so that concurrent writers cannot deadlock
+        deltas = deltas.order_by(*list(deltas.selected_columns)[:3])
+        stmt = insert(OrderStats).from_select(
+            ["day", "product_id", "status_id", "orders", "units", "revenue"], deltas
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=[OrderStats.day, OrderStats.product_id, OrderStats.status_id],
+            set_={
+                "orders": OrderStats.orders + stmt.excluded.orders,
+                "units": OrderStats.units + stmt.excluded.units,
+                "revenue": OrderStats.revenue + stmt.excluded.revenue,
+            },
+        )
+
+    @classmethod
+    async def record(
+            cls,
+            db_async_session: AsyncSession,
+            order_items: Iterable[Tuple[datetime, int, int, int, float]],
+    ) -> None:
+        """
+        Учитывает новые заказы, заданные как
+        (created_at, product_id, status_id, quantity, price).
+        Выполняется в транзакции, которая создаёт заказы.
+
+        """
+        totals: Dict[StatsKey, List[float]] = {}
+        for created_at, product_id, status_id, quantity, price in order_items:
+            total = totals.setdefault((created_at.date(), product_id, status_id), [0, 0, 0.0])
+            total[0] += 1
+            total[1] += quantity
+            total[2] += quantity * price
+        if not totals:
+            return
+
+        deltas = values(
+            column("day", Date),
+            column("product_id", Integer),
+            column("status_id", Integer),
+            column("orders", Integer),
+            column("units", Integer),
+            column("revenue", Float),
+            name="deltas",
+        ).data([(*key, *total) for key, total in totals.items()])
+        await db_async_session.execute(cls.upsert(select(deltas)))
+
+    @classmethod
+    async def rebuild(
+            cls,
+            db_async_session: AsyncSession,
+            since: Optional[date] = None,
+    ) -> int:
+        """
+        Пересчитывает сводку по заказам, начиная с дня `since` или целиком.
+        Дни архивных месяцев не пересчитываются: их заказов в оперативных
+        таблицах уже нет, а сводка по ним не меняется.
+        Заказы во время пересчёта создаются, но ждут его окончания,
+        чтобы их изменения сводки не потерялись. Возвращает число строк сводки.
+
+        """
+        archived_until = await partitions.archived_until(db_async_session)
+        if archived_until is not None and (since is None or since < archived_until):
+            since = archived_until
+
+        day = cast(models.Order.created_at, Date)
+        totals = (
+            select(
+                day.label("day"),
+                models.OrderItem.product_id,
+                models.Order.status_id,
+                func.count().label("orders"),
+                func.sum(models.OrderItem.quantity).label("units"),
+                func.sum(
+                    models.OrderItem.quantity
+                    * func.coalesce(models.OrderItem.price, models.Product.price)
+                ).label("revenue"),
+            )
+            .join(models.OrderItem.order)
+            .join(models.OrderItem.product)
+            .where(models.Order.status_id.is_not(None))
+            .group_by(day, models.OrderItem.product_id, models.Order.status_id)
+        )
+        clear = delete(OrderStats)
+        if since is not None:
+            totals = totals.where(models.Order.created_at >= datetime.combine(since, time.min))
+            clear = clear.where(OrderStats.day >= since)
+
+        # Blocks writers (add_order, status updates) but not readers
+        await db_async_session.execute(
+            text("LOCK TABLE %s IN SHARE ROW EXCLUSIVE MODE" % cls.__tablename__)
+        )
+        await db_async_session.execute(clear)
+        result = await db_async_session.execute(
+            insert(OrderStats).from_select(
+                ["day", "product_id", "status_id", "orders", "units", "revenue"], totals
+            )
+        )
+
+        return result.rowcount
+
+    @classmethod
+    def _filter(cls, stmt: Select, params: schemas.SalesPeriodParams) -> Select:
+        if params.date_from is not None:
+            stmt = stmt.where(OrderStats.day >= params.date_from)
+        if params.date_to is not None:
+            stmt = stmt.where(OrderStats.day < params.date_to)
+        if params.status_id is not None:
+            stmt = stmt.where(OrderStats.status_id == params.status_id)
+        return stmt
+
+    @classmethod
+    async def get_product_sales(
+            cls,
+            db_async_session: AsyncSession,
+            params: schemas.ProductSalesParams,
+    ) -> List[schemas.ProductSales]:
+        sort_column = getattr(OrderStats, params.sort.value)
+        top = (
+            cls._filter(
+                select(
+                    OrderStats.product_id,
+                    func.sum(OrderStats.orders).label("orders"),
+                    func.sum(OrderStats.units).label("units"),
+                    func.sum(OrderStats.revenue).label("revenue"),
+                ),
+                params,
+            )
+            .group_by(OrderStats.product_id)
+            .having(func.sum(OrderStats.orders) > 0)
+            .order_by(func.sum(sort_column).desc(), OrderStats.product_id)
+            .limit(params.limit)
+            .subquery("top")
+        )
+        rows = (await db_async_session.execute(
+            select(
+                top.c.product_id,
+                models.Product.name,
+                models.Product.quantity.label("stock"),
+                top.c.orders,
+                top.c.units,
+                top.c.revenue,
+            )
+            .join(models.Product, models.Product.id == top.c.product_id)
+            .order_by(getattr(top.c, params.sort.value).desc(), top.c.product_id)
+        )).all()
+
+        return [schemas.ProductSales(**row._asdict()) for row in rows]
+
+    @classmethod
+    async def get_daily_sales(
+            cls,
+            db_async_session: AsyncSession,
+            params: schemas.DailySalesParams,
+    ) -> List[schemas.DailySales]:
+        stmt = cls._filter(
+            select(
+                OrderStats.day,
+                OrderStats.status_id,
+                func.sum(OrderStats.orders).label("orders"),
+                func.sum(OrderStats.units).label("units"),
+                func.sum(OrderStats.revenue).label("revenue"),
+            ),
+            params,
+        )
+        if params.product_id is not None:
+            stmt = stmt.where(OrderStats.product_id == params.product_id)
+        rows = (await db_async_session.execute(
+            stmt
+            .group_by(OrderStats.day, OrderStats.status_id)
+            .having(func.sum(OrderStats.orders) > 0)
+            .order_by(OrderStats.day, OrderStats.status_id)
+        )).all()
+
+        return [
+            schemas.DailySales(
+                day=row.day,
+                status=models.Status.describe(row.status_id),
+                orders=row.orders,
+                units=row.units,
+                revenue=row.revenue,
+            )
+            for row in rows
+        ]
@@ -1,55 +1,464 @@
-from typing import Sequence
+from datetime import datetime
+from functools import partial
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Optional, Sequence, Tuple, Union
 
 from fastapi import HTTPException, status
-from sqlalchemy import delete, String, select
+from sqlalchemy import (
+    case, Column, ColumnElement, DateTime, delete, exists, Float, func, Index, Integer, literal,
+    literal_column, MetaData, null, Select, select, String, Table, tuple_, union_all, update
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import aliased, column_property, Mapped, mapped_column
+from sqlalchemy.orm.attributes import set_committed_value
 
 import models
-from database import Base
+from cache import invalidation_payload, INVALIDATION_CHANNEL, product_cache
+import conditional
+from database import Base, on_commit
+import export
+from models.stock_shard import StockShard
+import pagination
 import schemas
 
 
+IMPORT_BATCH_SIZE = 10000
+SEARCH_CURSOR_SORT = "relevance"
+
+products_import = Table(
+    "products_import",
+    MetaData(),
+    Column("position", Integer),
+    Column("name", String(length=100)),
+    Column("description", String(length=500)),
+    Column("price", Float),
+    Column("quantity", Integer),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_name_pattern", "name", postgresql_ops={"name": "text_pattern_ops"}),
+        Index("ix_products_price_id", "price", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(length=100), unique=True)
     description: Mapped[str] = mapped_column(String(length=500), server_default="")
     price: Mapped[float] = mapped_column(server_default="0")
-    quantity: Mapped[int] = mapped_column(server_default="0")
+    # Number of StockShard counters; 0 keeps the stock in the product row
+    stock_shards: Mapped[int] = mapped_column(server_default="0")
+    # With counters it is the stock as of their last even split
+    stored_quantity: Mapped[int] = mapped_column("quantity", server_default="0")
+    # Bumped by every statement that changes the row, including stock reservation
+    stored_version: Mapped[int] = mapped_column("version", server_default="1")
+    stored_updated_at: Mapped[datetime] = mapped_column(
+        "updated_at", DateTime(timezone=True), server_default=func.now()
+    )
+
+    # Stock, version and modification time of the product including its counters.
+    # CASE evaluates the subqueries only for products with counters
+    quantity: Mapped[int] = column_property(case(
+        (
+            stock_shards > 0,
+            select(func.coalesce(func.sum(StockShard.quantity), 0))
+            .where(StockShard.product_id == id)
+            .correlate_except(StockShard)
+            .scalar_subquery(),
+        ),
+        else_=stored_quantity,
+    ))
+    version: Mapped[int] = column_property(case(
+        (
+            stock_shards > 0,
+            stored_version + select(func.coalesce(func.sum(StockShard.version), 0))
+            .where(StockShard.product_id == id)
+            .correlate_except(StockShard)
+            .scalar_subquery(),
+        ),
+        else_=stored_version,
+    ))
+    updated_at: Mapped[datetime] = column_property(case(
+        (
+            stock_shards > 0,
+            func.greatest(
+                stored_updated_at,
+                select(func.max(StockShard.updated_at))
+                .where(StockShard.product_id == id)
+                .correlate_except(StockShard)
+                .scalar_subquery(),
+            ),
+        ),
+        else_=stored_updated_at,
+    ))
 
     @classmethod
     async def add_product(
             cls,
             db_async_session: AsyncSession,
-            product_schema: schemas.Product
-    ) -> "models.Product":
-        new_product = Product(**product_schema.model_dump())
+            product_schema: schemas.Product,
+            idempotency: Optional[schemas.IdempotencyRequest] = None,
+    ) -> Union["models.Product", schemas.ProductResponse]:
+        """
+        Создаёт товар. С `idempotency` повтор запроса с тем же ключом
+        возвращает созданный первым запросом товар вместо ошибки 409.
+
+        """
+        if idempotency is not None:
+            replay = await models.IdempotencyKey.claim(db_async_session, idempotency)
+            if replay is not None:
+                return schemas.ProductResponse.model_validate(replay)
+
+        fields = product_schema.model_dump()
+        new_product = Product(stored_quantity=fields.pop("quantity"), **fields)
 
         db_async_session.add(new_product)
         try:
-            await db_async_session.commit()
+            await db_async_session.flush()
         except IntegrityError as exc:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="Product '%s' already exists" % new_product.name
             )
+        # A new product has no counters, so its row holds everything
+        for key in ("quantity", "version", "updated_at"):
+            set_committed_value(new_product, key, getattr(new_product, "stored_" + key))
+        await models.ProductTerm.index_products(db_async_session, Product.id == new_product.id)
+        await models.ChangeEvent.emit(db_async_session, [{
+            "entity": schemas.EventEntity.product.value,
+            "action": schemas.EventAction.created.value,
+            "product_id": new_product.id,
+            "order_id": None,
+            "data": product_schema.model_dump(),
+        }])
+        if idempotency is not None:
+            await models.IdempotencyKey.store(
+                db_async_session,
+                idempotency,
+                schemas.ProductResponse.model_validate(new_product).model_dump(mode="json"),
+            )
 
         return new_product
 
+    @classmethod
+    def stock_event(cls, product_id: int, quantity: int) -> dict:
+        return {
+            "entity": schemas.EventEntity.product.value,
+            "action": schemas.EventAction.stock_changed.value,
+            "product_id": product_id,
+            "order_id": None,
+            "data": {"quantity": quantity},
+        }
+
+    @classmethod
+    async def upsert_products(
+            cls,
+            db_async_session: AsyncSession,
+            product_schemas: AsyncIterable[schemas.Product],
+    ) -> Tuple[int, int, int]:
+        """
+        Загружает товары во временную таблицу через COPY и добавляет
+        или обновляет их по названию одним запросом.
+        Если название встречается несколько раз, побеждает последняя строка.
+        Возвращает количество загруженных, добавленных и обновлённых строк.
+
+        """
+        columns = [column.name for column in products_import.columns]
+        staged = 0
+
+        connection = await db_async_session.connection()
+        await connection.run_sync(products_import.create)
+        raw_connection = await connection.get_raw_connection()
+
+        batch = []
+        async for product_schema in product_schemas:
+            batch.append((
+                staged, product_schema.name, product_schema.description,
+                product_schema.price, product_schema.quantity,
+            ))
+            staged += 1
+            if len(batch) == IMPORT_BATCH_SIZE:
+                await raw_connection.driver_connection.copy_records_to_table(
+                    products_import.name, records=batch, columns=columns
+                )
+                batch = []
+        if batch:
+            await raw_connection.driver_connection.copy_records_to_table(
+                products_import.name, records=batch, columns=columns
+            )
+
+        latest = (
+            select(
+                products_import.c.name, products_import.c.description,
+                products_import.c.price, products_import.c.quantity,
+            )
+            .distinct(products_import.c.name)
+            .order_by(products_import.c.name, products_import.c.position.desc())
+        )
+        upsert = insert(Product).from_select(
+            [Product.name, Product.description, Product.price, Product.stored_quantity], latest
+        )
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[Product.name],
+            set_={
+                Product.description: upsert.excluded.description,
+                Product.price: upsert.excluded.price,
+                Product.stored_quantity: upsert.excluded.quantity,
+                Product.stored_version: Product.stored_version + 1,
+                Product.stored_updated_at: func.now(),
+            },
+        )
+        # xmax is zero only for rows inserted by this statement
+        upserted = upsert.returning(
+            (literal_column("xmax") == 0).label("inserted"),
+            Product.id, Product.name, Product.description, Product.price,
+            Product.stored_quantity.label("quantity"),
+        ).cte("upserted")
+        events = models.ChangeEvent.insert_from(
+            select(
+                literal(schemas.EventEntity.product.value),
+                case(
+                    (upserted.c.inserted, schemas.EventAction.created.value),
+                    else_=schemas.EventAction.updated.value,
+                ),
+                upserted.c.id,
+                null(),
+                func.jsonb_build_object(
+                    "name", upserted.c.name,
+                    "description", upserted.c.description,
+                    "price", upserted.c.price,
+                    "quantity", upserted.c.quantity,
+                ),
+            )
+        ).cte("events")
+        inserted, updated = (await db_async_session.execute(
+            select(
+                func.count().filter(upserted.c.inserted),
+                func.count().filter(~upserted.c.inserted),
+            ).add_cte(events)
+        )).one()
+        imported = Product.name.in_(select(products_import.c.name))
+        await models.StockShard.spread(db_async_session, imported)
+        await models.ProductTerm.index_products(db_async_session, imported)
+        await cls.invalidate_cached(db_async_session)
+
+        return staged, inserted, updated
+
+    @classmethod
+    def _page_query(
+            cls,
+            stmt: Select,
+            params: schemas.ProductListParams,
+    ) -> Tuple[Select, Sequence]:
+        keys = {
+            schemas.ProductSort.id: (Product.id,),
+            schemas.ProductSort.name: (Product.name, Product.id),
+            schemas.ProductSort.price: (Product.price, Product.id),
+        }[params.sort]
+
+        if params.name_prefix is not None:
+            stmt = stmt.where(Product.name.startswith(params.name_prefix, autoescape=True))
+        if params.price_min is not None:
+            stmt = stmt.where(Product.price >= params.price_min)
+        if params.price_max is not None:
+            stmt = stmt.where(Product.price <= params.price_max)
+        if params.in_stock is not None:
+            stmt = stmt.where(Product.quantity > 0 if params.in_stock else Product.quantity == 0)
+
+        return pagination.paginate(stmt, keys, params), keys
+
+    @classmethod
+    async def get_products_page_validators(
+            cls,
+            db_async_session: AsyncSession,
+            params: schemas.ProductListParams,
+    ) -> conditional.Validators:
+        """
+        ETag и Last-Modified страницы товаров по ID и версиям её строк,
+        без загрузки самих товаров.
+
+        """
+        stmt, _ = cls._page_query(
+            select(Product.id, Product.version, Product.updated_at), params
+        )
+        rows = (await db_async_session.execute(stmt)).all()
+
+        return conditional.Validators(
+            conditional.digest_etag((row.id, row.version) for row in rows),
+            max((row.updated_at for row in rows), default=None),
+        )
+
+    @classmethod
+    async def get_products_page(
+            cls,
+            db_async_session: AsyncSession,
+            params: schemas.ProductListParams,
+            as_rows: bool = False,
+    ) -> pagination.Page:
+        """
+        Страница товаров. При `as_rows` вместо ORM-объектов возвращаются
+        словари с полями ProductResponse без загрузки объектов в сессию,
+        а если заданы `params.fields` - только с этими полями: остальные
+        столбцы не читаются из БД.
+
+        """
+        if not as_rows:
+            stmt, keys = cls._page_query(select(Product), params)
+            products = (await db_async_session.execute(stmt)).scalars().all()
+            return pagination.make_page(
+                products, params, lambda product: [getattr(product, key.key) for key in keys]
+            )
+
+        fields = [field.value for field in params.fields or schemas.ProductField]
+        # Sort keys are read for the cursor even when they are not in the response
+        columns = {name: getattr(Product, name) for name in fields}
+        stmt, keys = cls._page_query(select(), params)
+        for key in keys:
+            columns.setdefault(key.key, key)
+        stmt = stmt.add_columns(*(column.label(name) for name, column in columns.items()))
+
+        page = pagination.make_page(
+            (await db_async_session.execute(stmt)).all(),
+            params,
+            lambda product: [getattr(product, key.key) for key in keys],
+        )
+        return pagination.Page(
+            [{name: getattr(product, name) for name in fields} for product in page.items],
+            page.next_cursor,
+        )
+
     @classmethod
     async def get_products(
-            cls, db_async_session: AsyncSession
+            cls,
+            db_async_session: AsyncSession,
+            params: Optional[schemas.ProductListParams] = None,
     ) -> Sequence["models.Product"]:
-        result = await db_async_session.execute(
-            select(Product)
+        page = await cls.get_products_page(
+            db_async_session, params or schemas.ProductListParams()
         )
-        products = result.unique().scalars().all()
-        await db_async_session.aclose()
+        return page.items
+
+    @classmethod
+    async def search_products(
+            cls,
+            db_async_session: AsyncSession,
+            params: schemas.ProductSearchParams,
+    ) -> pagination.Page:
+        """
+        Поиск товаров, в названии или описании которых есть все слова запроса
+        (целиком, как начало слова или с опечаткой).
+        Товары сортируются по похожести самого длинного слова запроса на найденное
+        слово, затем сначала совпадения в названии, затем по ID.
+        Товары каждого слова читаются из индекса уже в порядке выдачи и не дальше
+        одной страницы, поэтому для запроса из одного слова время поиска не зависит
+        от числа подходящих товаров.
+
+        """
+        matches = await models.SearchTerm.match(db_async_session, params.q)
+        if not matches or not all(matches.values()):
+            return pagination.Page([], None)
 
-        return products
+        after = None
+        if params.cursor is not None:
+            after = pagination.decode_cursor(
+                params.cursor, SEARCH_CURSOR_SORT, schemas.SortOrder.asc.value, 3
+            )
+
+        def has_any(terms: Sequence[str]) -> ColumnElement[bool]:
+            other = aliased(models.ProductTerm)
+            return (
+                select(literal(1))
+                .where(other.product_id == models.ProductTerm.product_id, other.term.in_(terms))
+                .limit(1)
+                .scalar_subquery()
+            ).is_not(None)
+
+        # The longest word is usually the rarest one, so its terms drive the search
+        # and the other words only filter products
+        word = max(matches, key=len)
+        filters = [
+            has_any([term for term, _ in terms])
+            for other_word, terms in matches.items() if other_word != word
+        ]
+        branches = []
+        for position, (term, distance) in enumerate(matches[word]):
+            if after is not None and distance < after[0]:
+                continue
+            branch = (
+                select(
+                    literal(distance, Float).label("distance"),
+                    models.ProductTerm.field,
+                    models.ProductTerm.product_id,
+                )
+                .where(models.ProductTerm.term == term, *filters)
+                .order_by(models.ProductTerm.field, models.ProductTerm.product_id)
+                .limit(params.limit + 1)
+            )
+            # A product is found by the closest of its terms only
+            preceding = [term for term, _ in matches[word][:position]]
+            if preceding:
+                branch = branch.where(~has_any(preceding))
+            if after is not None and distance == after[0]:
+                branch = branch.where(
+                    tuple_(models.ProductTerm.field, models.ProductTerm.product_id)
+                    > tuple_(*after[1:])
+                )
+            branches.append(branch)
+        if not branches:
+            return pagination.Page([], None)
+
+        found = union_all(*branches).subquery("found")
+        rows = (await db_async_session.execute(
+            select(
+                Product.name, Product.description, Product.price, Product.quantity, Product.id,
+                found.c.distance, found.c.field,
+            )
+            .join(found, found.c.product_id == Product.id)
+            .order_by(found.c.distance, found.c.field, found.c.product_id)
+            .limit(params.limit + 1)
+        )).all()
+
+        next_cursor = None
+        if len(rows) > params.limit:
+            rows = rows[:params.limit]
+            next_cursor = pagination.encode_cursor(
+                SEARCH_CURSOR_SORT,
+                schemas.SortOrder.asc.value,
+                [rows[-1].distance, rows[-1].field, rows[-1].id],
+            )
+        return pagination.Page(
+            [
+                schemas.ProductSearchResult(
+                    name=row.name,
+                    description=row.description,
+                    price=row.price,
+                    quantity=row.quantity,
+                    id=row.id,
+                    rank=1 - row.distance,
+                )
+                for row in rows
+            ],
+            next_cursor,
+        )
+
+    @classmethod
+    def export_products(
+            cls,
+            open_session: Callable[[], Awaitable[AsyncSession]],
+            export_format: schemas.DataFormat,
+    ) -> AsyncIterator[str]:
+        return export.stream_rows(
+            open_session,
+            select(
+                Product.id, Product.name, Product.description, Product.price, Product.quantity
+            ).order_by(Product.id),
+            export_format,
+        )
 
     @classmethod
     async def get_product(
@@ -60,7 +469,6 @@ class Product(Base):
         result = await db_async_session.execute(
             select(Product).where(Product.id == product_id)
         )
-        await db_async_session.aclose()
         product = result.unique().scalars().one_or_none()
 
         if product is None:
@@ -71,26 +479,115 @@ class Product(Base):
 
         return product
 
+    @classmethod
+    async def invalidate_cached(cls, db_async_session: AsyncSession, *product_ids: int) -> None:
+        """
+        Сбрасывает кэш товаров `product_ids` (без них - весь кэш) после фиксации
+        транзакции: в этом процессе и в общем кэше - сразу после фиксации,
+        в остальных процессах - по NOTIFY, который доставляется только при фиксации.
+
+        """
+        await db_async_session.execute(
+            select(func.pg_notify(INVALIDATION_CHANNEL, invalidation_payload(product_ids)))
+        )
+        if product_ids:
+            on_commit(db_async_session, partial(product_cache.invalidate, *product_ids))
+        else:
+            on_commit(db_async_session, product_cache.clear)
+
+    @classmethod
+    async def get_product_cached(
+            cls,
+            db_async_session: AsyncSession,
+            product_id: int,
+    ) -> schemas.ProductSnapshot:
+        product = await product_cache.get(product_id)
+        if product is not None:
+            return product
+
+        generation = product_cache.generation
+        product = schemas.ProductSnapshot.model_validate(
+            await cls.get_product(db_async_session, product_id)
+        )
+        await product_cache.set(product, generation)
+
+        return product
+
     @classmethod
     async def update_product(
             cls,
             db_async_session: AsyncSession,
             product_id: int,
             product_schema: schemas.Product,
-    ) -> "models.Product":
-        product = await cls.get_product(db_async_session, product_id)
-        product.name, product.description = product_schema.name, product_schema.description
-        product.price, product.quantity = product_schema.price, product_schema.quantity
+            versions: Optional[Sequence[int]] = None,
+    ) -> schemas.ProductSnapshot:
+        """
+        Обновляет товар одним запросом. Если переданы `versions` (из If-Match),
+        товар обновляется, только если его текущая версия есть среди них.
+        У товара со счётчиками остаток затем делится между ними поровну.
+
+        """
+        stmt = (
+            update(Product)
+            .where(Product.id == product_id)
+            .values(
+                name=product_schema.name,
+                description=product_schema.description,
+                price=product_schema.price,
+                stored_quantity=product_schema.quantity,
+                stored_version=Product.stored_version + 1,
+                stored_updated_at=func.now(),
+            )
+            # The stock is returned as written: counters get it only after the split,
+            # which doesn't change their versions
+            .returning(
+                Product.id, Product.name, Product.description, Product.price,
+                Product.stored_quantity.label("quantity"), Product.version, Product.updated_at,
+                Product.stock_shards,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if versions is not None:
+            stmt = stmt.where(Product.version.in_(versions))
+
         try:
-            async with db_async_session.begin():
-                await db_async_session.merge(product)
+            product = (await db_async_session.execute(stmt)).one_or_none()
+            if product is None:
+                product_exists = await db_async_session.scalar(
+                    select(exists().where(Product.id == product_id))
+                )
+            else:
+                if product.stock_shards:
+                    await models.StockShard.spread(db_async_session, Product.id == product_id)
+                await models.ProductTerm.index_products(
+                    db_async_session, Product.id == product_id
+                )
+                await models.ChangeEvent.emit(db_async_session, [{
+                    "entity": schemas.EventEntity.product.value,
+                    "action": schemas.EventAction.updated.value,
+                    "product_id": product_id,
+                    "order_id": None,
+                    "data": product_schema.model_dump(),
+                }])
         except IntegrityError as exc:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
-                detail="Product '%s' already exists" % product.name
+                detail="Product '%s' already exists" % product_schema.name
             )
 
-        return product
+        if product is None and not product_exists:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product with ID '%s' does not exist" % product_id
+            )
+        if product is None:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Product with ID '%s' was modified by another request" % product_id
+            )
+        await cls.invalidate_cached(db_async_session, product_id)
+
+        return schemas.ProductSnapshot.model_validate(product)
 
     @classmethod
     async def delete_product(
@@ -98,8 +595,16 @@ class Product(Base):
             db_async_session: AsyncSession,
             product_id: int,
     ) -> None:
-        await db_async_session.execute(
-            delete(Product).where(Product.id == product_id)
+        deleted = await db_async_session.scalar(
+            delete(Product).where(Product.id == product_id).returning(Product.id)
         )
-        await db_async_session.commit()
+        if deleted is not None:
+            await models.ChangeEvent.emit(db_async_session, [{
+                "entity": schemas.EventEntity.product.value,
+                "action": schemas.EventAction.deleted.value,
+                "product_id": product_id,
+                "order_id": None,
+                "data": {},
+            }])
+        await cls.invalidate_cached(db_async_session, product_id)
 
@@ -0,0 +1,81 @@
+from sqlalchemy import (
+    ColumnElement, delete, ForeignKey, func, Index, literal, select, SmallInteger, String, union_all
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from database import Base
+import models
+
+FIELD_NAME = 0
+FIELD_DESCRIPTION = 1
+
+
+class ProductTerm(Base):
+    """
+    Поисковый индекс товаров: слово и товар, в названии или описании
+    которого оно встречается. Обновляется в той же транзакции, что и товары.
+
+    """
+    __tablename__ = "product_terms"
+    __table_args__ = (
+        # Products of one term in result order, read without touching the table
+        Index("ix_product_terms_term", "term", "field", "product_id"),
+    )
+
+    product_id: Mapped[int] = mapped_column(
+        ForeignKey("products.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    term: Mapped[str] = mapped_column(String(collation="C"), primary_key=True)
+    # FIELD_NAME if the term is in the product name, otherwise FIELD_DESCRIPTION
+    field: Mapped[int] = mapped_column(SmallInteger)
+
+    @classmethod
+    async def index_products(
+            cls,
+            db_async_session: AsyncSession,
+            products: ColumnElement[bool],
+    ) -> None:
+        """
+        Заново индексирует товары, подходящие под условие `products`,
+        и добавляет их новые слова в словарь.
+        Выполняется в транзакции, которая изменяет товары.
+
+        """
+        Product = models.Product
+        product_ids = select(Product.id).where(products)
+        terms = union_all(
+            select(
+                Product.id.label("product_id"),
+                models.SearchTerm.words(Product.name).label("term"),
+                literal(FIELD_NAME).label("field"),
+            ).where(products),
+            select(
+                Product.id,
+                models.SearchTerm.words(Product.description),
+                literal(FIELD_DESCRIPTION),
+            ).where(products),
+        ).subquery("terms")
+
+        await db_async_session.execute(
+            delete(ProductTerm).where(ProductTerm.product_id.in_(product_ids))
+        )
+        await db_async_session.execute(
+            insert(ProductTerm).from_select(
+                ["product_id", "term", "field"],
+                select(terms.c.product_id, terms.c.term, func.min(terms.c.field))
+                .group_by(terms.c.product_id, terms.c.term),
+            )
+        )
+        # Terms are inserted in order so that concurrent writers cannot deadlock
+        await db_async_session.execute(
+            insert(models.SearchTerm).from_select(
+                ["term"],
+                select(ProductTerm.term)
+                .where(ProductTerm.product_id.in_(product_ids))
+                .distinct()
+                .order_by(ProductTerm.term),
+            ).on_conflict_do_nothing()
+        )
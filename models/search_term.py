@@ -0,0 +1,98 @@
+from typing import Dict, List, Tuple
+
+from sqlalchemy import Float, func, Index, select, String, true, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql.functions import Function
+
+from config import settings
+from database import Base
+
+# Text search configuration without stemming and stop words, so that
+# words are only lowercased and can be matched by prefix
+SEARCH_CONFIG = "simple"
+TERMS_PER_WORD = 10
+# Sorts after any character, so that [word, word + MAX_CHAR) covers all terms starting with word
+MAX_CHAR = "\U0010ffff"
+
+
+class SearchTerm(Base):
+    """
+    Словарь слов из названий и описаний товаров. По нему слова запроса
+    дополняются до целых слов и исправляются, если в них опечатка.
+
+    """
+    __tablename__ = "search_terms"
+    __table_args__ = (
+        Index(
+            "ix_search_terms_term_trgm",
+            "term",
+            postgresql_using="gin",
+            postgresql_ops={"term": "gin_trgm_ops"},
+        ),
+    )
+
+    # Byte order makes prefix lookups a range scan of the primary key
+    term: Mapped[str] = mapped_column(String(collation="C"), primary_key=True)
+
+    @classmethod
+    def words(cls, text) -> Function:
+        """Слова текста в нижнем регистре, по одной строке на слово."""
+        return func.unnest(func.tsvector_to_array(func.to_tsvector(SEARCH_CONFIG, text)))
+
+    @classmethod
+    async def match(
+            cls,
+            db_async_session: AsyncSession,
+            query: str,
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Для каждого слова запроса - до TERMS_PER_WORD слов словаря с расстоянием
+        до него (0 - совпадение), по возрастанию расстояния. Сначала берутся слова,
+        которые начинаются со слова запроса, и только если их не хватает -
+        похожие на него не меньше чем на SEARCH_MIN_SIMILARITY.
+
+        """
+        words = select(cls.words(query).label("word")).subquery("words")
+        distance = words.c.word.op("<<->", return_type=Float)(SearchTerm.term)
+        starts_with = (SearchTerm.term >= words.c.word) & (
+            SearchTerm.term < words.c.word.concat(MAX_CHAR)
+        )
+        # The second branch only runs when the first one returns too few terms
+        candidates = (
+            union_all(
+                select(SearchTerm.term, distance.label("distance"))
+                .where(starts_with)
+                .order_by(SearchTerm.term)
+                .limit(TERMS_PER_WORD)
+                .correlate(words),
+                select(SearchTerm.term, distance.label("distance"))
+                .where(words.c.word.op("<%")(SearchTerm.term), ~starts_with)
+                .order_by(distance, SearchTerm.term)
+                .limit(TERMS_PER_WORD)
+                .correlate(words),
+            )
+            .subquery()
+            .select()
+            .limit(TERMS_PER_WORD)
+            .lateral("candidates")
+        )
+
+        await db_async_session.execute(select(func.set_config(
+            "pg_trgm.word_similarity_threshold", str(settings.search_min_similarity), True
+        )))
+        rows = (await db_async_session.execute(
+            select(words.c.word, candidates.c.term, candidates.c.distance)
+            .select_from(words)
+            .outerjoin(candidates, true())
+        )).all()
+
+        matches: Dict[str, List[Tuple[str, float]]] = {}
+        for word, term, term_distance in rows:
+            terms = matches.setdefault(word, [])
+            if term is not None:
+                terms.append((term, term_distance))
+        for terms in matches.values():
+            terms.sort(key=lambda term: (term[1], term[0]))
+
+        return matches
@@ -1,5 +1,8 @@
+from types import MappingProxyType
+from typing import ClassVar, Mapping, Optional
+
+from sqlalchemy import select
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import Base
@@ -11,21 +14,19 @@ class Status(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     description: Mapped[str] = mapped_column(unique=True)
 
+    # Read-only registry of status descriptions, loaded once at startup
+    # so that order queries don't need to join the statuses table
+    descriptions: ClassVar[Mapping[int, str]] = MappingProxyType({})
+
     @classmethod
-    async def create_statuses(cls, db_async_session: AsyncSession) -> None:
-        statuses_data = [
-            {"id": 1, "description": "в процессе"},
-            {"id": 2, "description": "отправлен"},
-            {"id": 3, "description": "доставлен"},
-        ]
-        statuses = [
-            Status(id=status["id"], description=status["description"])
-            for status in statuses_data
-        ]
-
-        try:
-            async with db_async_session.begin():
-                db_async_session.add_all(statuses)
-        except IntegrityError:
-            pass
+    async def load_statuses(cls, db_async_session: AsyncSession) -> Mapping[int, str]:
+        result = await db_async_session.execute(
+            select(Status.id, Status.description)
+        )
+        cls.descriptions = MappingProxyType(dict(result.all()))
 
+        return cls.descriptions
+
+    @classmethod
+    def describe(cls, status_id: Optional[int]) -> Optional[str]:
+        return cls.descriptions.get(status_id)
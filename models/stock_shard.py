@@ -0,0 +1,287 @@
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import (
+    case, ColumnElement, DateTime, delete, ForeignKey, func, insert, select, update
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, Mapped, mapped_column
+
+from database import Base
+import models
+import schemas
+
+
+class Reservation(NamedTuple):
+    id: int
+    price: float
+    # Remaining stock of the product after the reservation
+    quantity: int
+
+
+class StockShard(Base):
+    """
+    Счётчик остатка товара в режиме шардированного остатка.
+    Остаток товара делится между несколькими строками, и заказы одного
+    товара резервируют его в разных строках, не дожидаясь друг друга.
+    Количество товара на складе - сумма счётчиков.
+
+    """
+    __tablename__ = "stock_shards"
+
+    product_id: Mapped[int] = mapped_column(
+        ForeignKey("products.id", onupdate="CASCADE", ondelete="CASCADE"), primary_key=True
+    )
+    shard: Mapped[int] = mapped_column(primary_key=True)
+    quantity: Mapped[int] = mapped_column(server_default="0")
+    # Summed into the product version, so that ETags change with the stock
+    version: Mapped[int] = mapped_column(server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+    @classmethod
+    def _split(cls, total: int, shards: int) -> ColumnElement[int]:
+        # Even split: the first total % shards counters get one unit more
+        return total // shards + case((StockShard.shard < total % shards, 1), else_=0)
+
+    @classmethod
+    async def _take(
+            cls,
+            db_async_session: AsyncSession,
+            product_id: int,
+            quantity: int,
+            skip_locked: bool,
+    ) -> Optional[Reservation]:
+        other = aliased(StockShard)
+        picked = (
+            select(other.shard)
+            .where(other.product_id == product_id, other.quantity >= quantity)
+            # A random counter spreads concurrent orders over all of them
+            .order_by(func.random())
+            .limit(1)
+        )
+        if skip_locked:
+            picked = picked.with_for_update(skip_locked=True)
+        # Other counters may change concurrently, so the remaining total
+        # is as of the start of the statement
+        remaining = (
+            select(func.sum(other.quantity))
+            .where(other.product_id == StockShard.product_id)
+            .scalar_subquery()
+        ) - quantity
+        row = (await db_async_session.execute(
+            update(StockShard)
+            .where(
+                StockShard.product_id == product_id,
+                StockShard.shard == picked.scalar_subquery(),
+                # Rechecked after waiting for a concurrent reservation of the same counter
+                StockShard.quantity >= quantity,
+            )
+            .values(
+                quantity=StockShard.quantity - quantity,
+                version=StockShard.version + 1,
+                updated_at=func.now(),
+            )
+            .returning(
+                StockShard.product_id,
+                select(models.Product.price)
+                .where(models.Product.id == StockShard.product_id)
+                .scalar_subquery(),
+                remaining,
+            )
+            .execution_options(synchronize_session=False)
+        )).one_or_none()
+
+        return Reservation(*row) if row is not None else None
+
+    @classmethod
+    async def reserve(
+            cls,
+            db_async_session: AsyncSession,
+            product_id: int,
+            quantity: int,
+    ) -> Optional[Reservation]:
+        """
+        Резервирует `quantity` единиц товара в шардированном режиме.
+        Сначала в свободном счётчике, где хватает остатка; если все такие
+        счётчики заняты - в любом из них с ожиданием. Если ни в одном счётчике
+        не хватает остатка, но хватает в сумме, счётчики блокируются, заказ
+        списывается из общей суммы, а остаток заново делится поровну.
+        Возвращает None, если остатка не хватает.
+
+        """
+        for skip_locked in (True, False):
+            reservation = await cls._take(db_async_session, product_id, quantity, skip_locked)
+            if reservation is not None:
+                return reservation
+
+        # Counters are locked in one order, so concurrent rebalances cannot deadlock
+        rows = (await db_async_session.execute(
+            select(StockShard.quantity, models.Product.price)
+            .join(models.Product, models.Product.id == StockShard.product_id)
+            .where(StockShard.product_id == product_id)
+            .order_by(StockShard.shard)
+            .with_for_update(of=StockShard)
+        )).all()
+        total = sum(row.quantity for row in rows)
+        if not rows or total < quantity:
+            return None
+
+        await cls.rebalance(db_async_session, product_id, total - quantity, len(rows))
+        return Reservation(product_id, rows[0].price, total - quantity)
+
+    @classmethod
+    async def lock(
+            cls,
+            db_async_session: AsyncSession,
+            product_ids: Sequence[int],
+    ) -> Dict[int, int]:
+        """Блокирует счётчики товаров и возвращает их суммарный остаток по ID товара."""
+        rows = (await db_async_session.execute(
+            select(StockShard.product_id, StockShard.quantity)
+            .where(StockShard.product_id.in_(product_ids))
+            .order_by(StockShard.product_id, StockShard.shard)
+            .with_for_update()
+        )).all()
+        totals = dict.fromkeys(product_ids, 0)
+        for row in rows:
+            totals[row.product_id] += row.quantity
+
+        return totals
+
+    @classmethod
+    async def rebalance(
+            cls,
+            db_async_session: AsyncSession,
+            product_id: int,
+            total: int,
+            shards: int,
+    ) -> None:
+        """Делит остаток `total` поровну между счётчиками товара."""
+        await db_async_session.execute(
+            update(StockShard)
+            .where(StockShard.product_id == product_id)
+            .values(
+                quantity=cls._split(total, shards),
+                version=StockShard.version + 1,
+                updated_at=func.now(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    async def spread(
+            cls,
+            db_async_session: AsyncSession,
+            *filters: ColumnElement[bool],
+    ) -> None:
+        """
+        Делит поровну между счётчиками остаток, только что записанный в строки
+        отобранных `filters` шардированных товаров. Версию меняет запись товара.
+
+        """
+        product = models.Product
+        await db_async_session.execute(
+            update(StockShard)
+            .where(
+                StockShard.product_id == product.id,
+                product.stock_shards > 0,
+                *filters,
+            )
+            .values(
+                quantity=product.stored_quantity // product.stock_shards + case(
+                    (StockShard.shard < product.stored_quantity % product.stock_shards, 1),
+                    else_=0,
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    async def get_shards(
+            cls,
+            db_async_session: AsyncSession,
+            product_id: int,
+    ) -> schemas.StockShards:
+        quantity = await db_async_session.scalar(
+            select(models.Product.quantity).where(models.Product.id == product_id)
+        )
+        if quantity is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product with ID '%s' does not exist" % product_id
+            )
+        shards = (await db_async_session.scalars(
+            select(StockShard).where(StockShard.product_id == product_id).order_by(StockShard.shard)
+        )).all()
+
+        return schemas.StockShards(
+            product_id=product_id,
+            quantity=quantity,
+            shards=[schemas.StockShard.model_validate(shard) for shard in shards],
+        )
+
+    @classmethod
+    async def set_shards(
+            cls,
+            db_async_session: AsyncSession,
+            product_id: int,
+            shards_schema: schemas.StockShardsUpdate,
+    ) -> schemas.StockShards:
+        """
+        Переключает режим хранения остатка товара: 0 - в строке товара,
+        иначе - в `shards` счётчиках. Текущий остаток делится между новыми
+        счётчиками поровну, количество товара на складе не меняется.
+
+        """
+        product = models.Product
+        # The product row is locked before its counters, like in the batch of orders
+        current = (await db_async_session.execute(
+            select(product.stock_shards, product.stored_quantity)
+            .where(product.id == product_id)
+            .with_for_update()
+        )).one_or_none()
+        if current is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product with ID '%s' does not exist" % product_id
+            )
+
+        removed = (await db_async_session.execute(
+            delete(StockShard)
+            .where(StockShard.product_id == product_id)
+            .returning(StockShard.quantity, StockShard.version)
+        )).all()
+        total = sum(row.quantity for row in removed) if current.stock_shards else current.stored_quantity
+        # Versions of the removed counters move to the product row,
+        # so that the product version never goes back
+        await db_async_session.execute(
+            update(product)
+            .where(product.id == product_id)
+            .values(
+                stock_shards=shards_schema.shards,
+                stored_quantity=total,
+                stored_version=product.stored_version + sum(row.version for row in removed) + 1,
+                stored_updated_at=func.now(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if shards_schema.shards:
+            await db_async_session.execute(
+                insert(StockShard),
+                [
+                    {
+                        "product_id": product_id,
+                        "shard": shard,
+                        "quantity": (
+                            total // shards_schema.shards + int(shard < total % shards_schema.shards)
+                        ),
+                    }
+                    for shard in range(shards_schema.shards)
+                ],
+            )
+        await models.Product.invalidate_cached(db_async_session, product_id)
+
+        return await cls.get_shards(db_async_session, product_id)
@@ -0,0 +1,96 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Callable, NamedTuple, Optional, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+import schemas
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page(NamedTuple):
+    items: Sequence[Any]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(sort: str, order: str, values: Sequence[Any]) -> str:
+    payload = {
+        "s": sort,
+        "o": order,
+        "k": [v.isoformat() if isinstance(v, datetime) else v for v in values],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = payload["k"]
+        valid = (
+            payload["s"] == sort and payload["o"] == order
+            and isinstance(values, list) and len(values) == size
+        )
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        valid = False
+
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor for sort '%s' (%s)" % (sort, order)
+        )
+
+    return values
+
+
+def paginate(
+        stmt: Select,
+        keys: Sequence[InstrumentedAttribute],
+        params: schemas.PageParams,
+) -> Select:
+    """
+    Добавляет к запросу keyset-условие, сортировку и лимит страницы.
+    Последний столбец в `keys` должен быть уникальным (обычно ID).
+    Запрашивается на одну строку больше лимита, чтобы понять,
+    есть ли следующая страница.
+
+    """
+    descending = params.order is schemas.SortOrder.desc
+
+    if params.cursor is not None:
+        values = decode_cursor(
+            params.cursor, params.sort.value, params.order.value, len(keys)
+        )
+        values = [
+            datetime.fromisoformat(value) if column.type.python_type is datetime else value
+            for column, value in zip(keys, values)
+        ]
+        left, right = (keys[0], values[0]) if len(keys) == 1 else (tuple_(*keys), tuple_(*values))
+        stmt = stmt.where(left < right if descending else left > right)
+
+    return stmt.order_by(
+        *(column.desc() if descending else column.asc() for column in keys)
+    ).limit(params.limit + 1)
+
+
+def make_page(
+        rows: Sequence[Any],
+        params: schemas.PageParams,
+        key: Callable[[Any], Sequence[Any]],
+) -> Page:
+    """
+    Обрезает лишнюю строку и формирует курсор по последнему элементу страницы.
+    `key` возвращает значения столбцов сортировки для строки.
+
+    """
+    if len(rows) <= params.limit:
+        return Page(rows, None)
+
+    rows = rows[:params.limit]
+    return Page(rows, encode_cursor(params.sort.value, params.order.value, key(rows[-1])))
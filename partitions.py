@@ -0,0 +1,168 @@
+"""
+Помесячные партиции таблиц заказов.
+
+Таблицы orders и order_items секционированы по created_at: у каждой по
+партиции на месяц и партиция по умолчанию для строк месяцев, партиции которых
+ещё не созданы. Партиции создаются заранее (`python cli.py create-order-partitions`,
+при запуске server.py), старые месяцы переносятся в таблицы orders_archive
+и order_items_archive (`python cli.py archive-orders`). Перенос меняет только
+принадлежность партиции, строки не копируются. Запросы к orders и order_items
+читают только оперативные месяцы, архивные заказы доступны по ID.
+
+"""
+from datetime import date
+from functools import lru_cache
+import re
+from typing import List, Optional
+
+from sqlalchemy import Column, MetaData, Table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+TABLES = ("orders", "order_items")
+ARCHIVE_SUFFIX = "_archive"
+DEFAULT_SUFFIX = "_default"
+PARTITION_NAME = re.compile(r"_p(\d{4})_(\d{2})$")
+# Detaching takes an exclusive lock on the parent table: give up instead of
+# queueing all order queries behind a long transaction
+ARCHIVE_LOCK_TIMEOUT = "5s"
+# Key of the advisory lock that serializes partition changes between processes
+PARTITIONS_LOCK_KEY = 7_270_002
+
+archive_metadata = MetaData()
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return "%s_p%04d_%02d" % (table, month.year, month.month)
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME.search(name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+@lru_cache(maxsize=None)
+def archive_table(table: Table) -> Table:
+    """Архивная таблица с колонками `table`, чтобы читать из неё теми же моделями."""
+    return Table(
+        table.name + ARCHIVE_SUFFIX,
+        archive_metadata,
+        *(
+            Column(column.name, column.type, primary_key=column.primary_key)
+            for column in table.columns
+        ),
+    )
+
+
+def is_managed_table(name: str) -> bool:
+    """Партиции и архивные таблицы: их нет в моделях, ими управляет этот модуль."""
+    return any(
+        name == table + ARCHIVE_SUFFIX
+        or name == table + DEFAULT_SUFFIX
+        or (name.startswith(table) and partition_month(name[len(table):]) is not None)
+        for table in TABLES
+    )
+
+
+async def partition_names(db_async_session: AsyncSession, parent: str) -> List[str]:
+    result = await db_async_session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = CAST(:parent AS regclass) "
+            "ORDER BY child.relname"
+        ),
+        {"parent": parent},
+    )
+    return list(result.scalars())
+
+
+async def lock_partitions(db_async_session: AsyncSession) -> None:
+    await db_async_session.execute(
+        text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITIONS_LOCK_KEY}
+    )
+
+
+async def create_partitions(db_async_session: AsyncSession, first: date, last: date) -> List[str]:
+    """
+    Создаёт недостающие партиции месяцев с `first` по `last` включительно.
+    Строки этих месяцев, попавшие в партицию по умолчанию, переносятся в новую
+    партицию. Месяцы, уже перенесённые в архив, пропускаются.
+    Возвращает имена созданных партиций.
+
+    """
+    await lock_partitions(db_async_session)
+    existing = set()
+    for table in TABLES:
+        existing.update(await partition_names(db_async_session, table))
+        existing.update(await partition_names(db_async_session, table + ARCHIVE_SUFFIX))
+
+    created = []
+    month = add_months(first, 0)
+    while month <= last:
+        start, end = month.isoformat(), add_months(month, 1).isoformat()
+        for table in TABLES:
+            name = partition_name(table, month)
+            if name in existing:
+                continue
+            # The partition is filled before it is attached: a new partition
+            # can't be attached while the default one holds rows of its range
+            await db_async_session.execute(text(
+                "CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS)" % (name, table)
+            ))
+            await db_async_session.execute(
+                text(
+                    "WITH moved AS ("
+                    "DELETE FROM %s%s WHERE created_at >= :start AND created_at < :end RETURNING *"
+                    ") INSERT INTO %s SELECT * FROM moved" % (table, DEFAULT_SUFFIX, name)
+                ),
+                {"start": month, "end": add_months(month, 1)},
+            )
+            await db_async_session.execute(text(
+                "ALTER TABLE %s ATTACH PARTITION %s FOR VALUES FROM ('%s') TO ('%s')"
+                % (table, name, start, end)
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+
+    return created
+
+
+async def archive_partitions(db_async_session: AsyncSession, before: date) -> List[date]:
+    """
+    Переносит в архив партиции месяцев, закончившихся до `before`.
+    Заказы этих месяцев перестают попадать в списки, выгрузку и массовую
+    смену статуса, но доступны по ID. Возвращает перенесённые месяцы.
+
+    """
+    await lock_partitions(db_async_session)
+    await db_async_session.execute(text("SET LOCAL lock_timeout = '%s'" % ARCHIVE_LOCK_TIMEOUT))
+    names = await partition_names(db_async_session, TABLES[0])
+    months = sorted(
+        month for month in map(partition_month, names)
+        if month is not None and add_months(month, 1) <= before
+    )
+    for month in months:
+        start, end = month.isoformat(), add_months(month, 1).isoformat()
+        for table in TABLES:
+            name = partition_name(table, month)
+            await db_async_session.execute(text(
+                "ALTER TABLE %s DETACH PARTITION %s" % (table, name)
+            ))
+            await db_async_session.execute(text(
+                "ALTER TABLE %s%s ATTACH PARTITION %s FOR VALUES FROM ('%s') TO ('%s')"
+                % (table, ARCHIVE_SUFFIX, name, start, end)
+            ))
+
+    return months
+
+
+async def archived_until(db_async_session: AsyncSession) -> Optional[date]:
+    """Первый день после последнего архивного месяца или None, если архив пуст."""
+    names = await partition_names(db_async_session, TABLES[0] + ARCHIVE_SUFFIX)
+    months = [month for month in map(partition_month, names) if month is not None]
+    return add_months(max(months), 1) if months else None
@@ -0,0 +1,102 @@
+import codecs
+import csv
+from typing import AsyncIterable, AsyncIterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+
+MAX_REPORTED_ERRORS = 100
+
+
+async def _iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def _iter_csv_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, dict]]:
+    header, record, record_line = None, "", 0
+    line_number = 0
+    async for line in _iter_lines(chunks):
+        line_number += 1
+        if record:
+            record += "\n" + line
+        else:
+            record, record_line = line, line_number
+        # A quoted field may span several lines: wait for the closing quote
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not values:
+            continue
+        if header is None:
+            header = values
+            continue
+        yield record_line, dict(zip(header, values))
+
+
+async def _iter_ndjson_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    line_number = 0
+    async for line in _iter_lines(chunks):
+        line_number += 1
+        if line.strip():
+            yield line_number, line
+
+
+async def import_products(
+        db_async_session: AsyncSession,
+        chunks: AsyncIterable[bytes],
+        import_format: schemas.DataFormat,
+) -> schemas.ProductImportResult:
+    """
+    Импортирует товары из потока CSV или NDJSON.
+    Некорректные строки отклоняются, остальные добавляются
+    или обновляются по названию товара одной транзакцией.
+
+    """
+    errors: List[schemas.ProductImportError] = []
+    rejected = 0
+
+    async def valid_products() -> AsyncIterator[schemas.Product]:
+        nonlocal rejected
+        if import_format is schemas.DataFormat.csv:
+            records, validate = _iter_csv_records(chunks), schemas.Product.model_validate
+        else:
+            records, validate = _iter_ndjson_records(chunks), schemas.Product.model_validate_json
+
+        async for line, record in records:
+            try:
+                product = validate(record)
+            except ValidationError as exc:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    detail = "; ".join(
+                        "%s: %s" % (".".join(map(str, error["loc"])), error["msg"])
+                        if error["loc"] else error["msg"]
+                        for error in exc.errors()
+                    )
+                    errors.append(schemas.ProductImportError(line=line, detail=detail))
+                continue
+            yield product
+
+    staged, inserted, updated = await models.Product.upsert_products(
+        db_async_session, valid_products()
+    )
+    return schemas.ProductImportResult(
+        inserted=inserted,
+        updated=updated,
+        rejected=rejected,
+        duplicates=staged - inserted - updated,
+        errors=errors,
+    )
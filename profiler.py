@@ -0,0 +1,197 @@
+import logging
+import os
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import greenlet
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from cache import LRUCache
+from config import settings
+import schemas
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+THIS_FILE = os.path.abspath(__file__)
+PROJECT_ROOT = os.path.dirname(THIS_FILE)
+# Expanded IN lists render one placeholder per value, so they are collapsed
+# to keep "WHERE id IN ($1, $2)" and "WHERE id IN ($1, $2, $3)" the same shape
+PLACEHOLDERS = re.compile(r"\$\d+(?:\s*,\s*\$\d+)*")
+WHITESPACE = re.compile(r"\s+")
+
+logger = logging.getLogger("warehouse.profiler")
+
+
+def statement_shape(statement: str) -> str:
+    return PLACEHOLDERS.sub("?", WHITESPACE.sub(" ", statement).strip())
+
+
+def code_location() -> str:
+    """
+    Ближайший к запросу кадр стека из кода сервиса, а не из библиотек.
+    Синхронный код SQLAlchemy выполняется в отдельном greenlet, поэтому
+    после его стека просматривается стек родительского greenlet, где
+    ждёт вызвавшая запрос корутина.
+
+    """
+    frame = sys._getframe(2)
+    current = greenlet.getcurrent()
+    while True:
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if (
+                    filename.startswith(PROJECT_ROOT)
+                    and "site-packages" not in filename
+                    and filename != THIS_FILE
+            ):
+                return "%s:%s in %s" % (
+                    os.path.relpath(filename, PROJECT_ROOT), frame.f_lineno, frame.f_code.co_name
+                )
+            frame = frame.f_back
+        current = current.parent
+        if current is None:
+            return "unknown"
+        frame = current.gr_frame
+
+
+class Profile:
+    """Запросы к БД одного HTTP-запроса."""
+
+    def __init__(self) -> None:
+        self.id = uuid.uuid4().hex
+        self.queries: List[schemas.QueryProfile] = []
+        self.checkouts = 0
+
+    def add(self, statement: str, seconds: float, rows: Optional[int], location: str) -> None:
+        self.queries.append(schemas.QueryProfile(
+            statement=statement,
+            duration_ms=round(seconds * 1000, 3),
+            rows=rows,
+            location=location,
+        ))
+
+    @property
+    def db_duration_ms(self) -> float:
+        return round(sum(query.duration_ms for query in self.queries), 3)
+
+    def repeated(self, threshold: int) -> List[schemas.RepeatedQuery]:
+        shapes: Dict[str, List[schemas.QueryProfile]] = {}
+        for query in self.queries:
+            shapes.setdefault(statement_shape(query.statement), []).append(query)
+        return [
+            schemas.RepeatedQuery(
+                statement=shape,
+                count=len(queries),
+                locations=sorted({query.location for query in queries}),
+            )
+            for shape, queries in shapes.items() if len(queries) >= threshold
+        ]
+
+    def server_timing(self, duration_ms: float) -> str:
+        return 'db;dur=%s;desc="%s queries", total;dur=%s' % (
+            self.db_duration_ms, len(self.queries), round(duration_ms, 3)
+        )
+
+
+current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+profiles = LRUCache(settings.profiling_history, ttl=float("inf"))
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Записывает запросы движка в профиль текущего HTTP-запроса.
+    Без профиля обработчики событий только читают переменную контекста.
+
+    """
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if current_profile.get() is not None:
+            context._profile_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = current_profile.get()
+        started = getattr(context, "_profile_started", None)
+        if profile is None or started is None:
+            return
+        rows = cursor.rowcount if cursor.rowcount >= 0 else None
+        profile.add(statement, time.perf_counter() - started, rows, code_location())
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.checkouts += 1
+
+
+def is_enabled(scope) -> bool:
+    if settings.profiling == "on":
+        return True
+    return settings.profiling == "header" and any(
+        name == PROFILE_HEADER for name, _ in scope["headers"]
+    )
+
+
+class ProfilerMiddleware:
+    """
+    ASGI-middleware: профилирует HTTP-запрос, если профилирование включено
+    настройкой `profiling` или запрос пришёл с заголовком X-Profile.
+    Ответ получает заголовки Server-Timing и X-Profile-Id, а сам профиль
+    доступен по GET /api/profiles/{profile_id}. Повторяющиеся запросы
+    одного вида попадают в профиль и в лог как возможный N+1.
+
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not is_enabled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile()
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                duration_ms = (time.perf_counter() - started) * 1000
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", profile.server_timing(duration_ms).encode()),
+                    (PROFILE_ID_HEADER.lower().encode(), profile.id.encode()),
+                ]
+            await send(message)
+
+        token = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_profile.reset(token)
+            route = getattr(scope.get("route"), "path", scope["path"])
+            repeated = profile.repeated(settings.profiling_repeat_threshold)
+            for query in repeated:
+                logger.warning(
+                    "%s %s ran the same query %s times (%s): %s",
+                    scope["method"], route, query.count, ", ".join(query.locations), query.statement,
+                )
+            profiles.set(profile.id, schemas.RequestProfile(
+                id=profile.id,
+                method=scope["method"],
+                path=scope["path"],
+                route=route,
+                status=status_code,
+                duration_ms=round((time.perf_counter() - started) * 1000, 3),
+                db_duration_ms=profile.db_duration_ms,
+                connection_checkouts=profile.checkouts,
+                queries=profile.queries,
+                repeated=repeated,
+            ))
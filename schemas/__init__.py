@@ -1,2 +1,21 @@
-from schemas.product import Product, ProductResponse
-from schemas.order import Order, OrderResponse, OrderDetails, StatusUpdate
+from schemas.pagination import CursorParams, PageParams, SortOrder
+from schemas.data_format import DataFormat
+from schemas.cache import CacheStats
+from schemas.event import EventEntity, EventAction, ChangeEvent, EventFilter
+from schemas.idempotency import IdempotencyRequest
+from schemas.profile import QueryProfile, RepeatedQuery, RequestProfile
+from schemas.product import (
+    Product, ProductResponse, ProductSnapshot, ProductSort, ProductField, ProductFieldsParams,
+    ProductListParams,
+    ProductSearchParams, ProductSearchResult, StockShardsUpdate, StockShard, StockShards,
+    ProductImportError, ProductImportResult,
+)
+from schemas.order import (
+    Order, OrderResponse, OrderDetails, OrderDetailsField, OrderDetailsParams, StatusUpdate,
+    OrderSort, OrderField, OrderListParams,
+    OrderBatch, OrderBatchResult, OrderBatchResponse,
+    OrderStatusBulkUpdate, OrderStatusBulkResult,
+)
+from schemas.analytics import (
+    SalesSort, SalesPeriodParams, ProductSalesParams, DailySalesParams, ProductSales, DailySales,
+)
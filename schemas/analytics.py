@@ -0,0 +1,68 @@
+from datetime import date
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from schemas.pagination import MAX_PAGE_LIMIT
+
+
+class SalesSort(str, Enum):
+    revenue = "revenue"
+    units = "units"
+    orders = "orders"
+
+
+class SalesPeriodParams(BaseModel):
+    date_from: Optional[date] = Field(
+        None,
+        description="Первый день периода (включительно)",
+    )
+    date_to: Optional[date] = Field(
+        None,
+        description="День, следующий за последним днём периода",
+    )
+    status_id: Optional[int] = Field(
+        None,
+        description="Только заказы в указанном статусе",
+        ge=1,
+        le=3,
+    )
+
+
+class ProductSalesParams(SalesPeriodParams):
+    sort: SalesSort = Field(
+        SalesSort.revenue,
+        description="Показатель, по убыванию которого сортируются товары",
+    )
+    limit: int = Field(
+        50,
+        description="Количество товаров",
+        ge=1,
+        le=MAX_PAGE_LIMIT,
+    )
+
+
+class DailySalesParams(SalesPeriodParams):
+    product_id: Optional[int] = Field(
+        None,
+        description="Только заказы товара с указанным ID",
+        gt=0,
+    )
+
+
+class ProductSales(BaseModel):
+    product_id: int = Field(..., description="Идентификатор (ID) товара")
+    name: str = Field(..., description="Название товара")
+    stock: int = Field(..., description="Текущий остаток товара на складе")
+    orders: int = Field(..., description="Количество заказов")
+    units: int = Field(..., description="Количество проданных единиц товара")
+    revenue: float = Field(..., description="Выручка по ценам на момент заказа")
+
+
+class DailySales(BaseModel):
+    day: date = Field(..., description="День создания заказов")
+    status: Optional[str] = Field(..., description="Текущий статус заказов")
+    orders: int = Field(..., description="Количество заказов")
+    units: int = Field(..., description="Количество проданных единиц товара")
+    revenue: float = Field(..., description="Выручка по ценам на момент заказа")
@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+
+
+class CacheStats(BaseModel):
+    hits: int = Field(..., description="Количество попаданий в кэш")
+    shared_hits: int = Field(..., description="Из них попаданий в общий кэш")
+    misses: int = Field(..., description="Количество промахов")
+    evictions: int = Field(..., description="Количество вытесненных записей")
+    invalidations: int = Field(..., description="Количество сброшенных записей")
+    size: int = Field(..., description="Количество записей в кэше процесса")
@@ -0,0 +1,13 @@
+from enum import Enum
+
+
+class DataFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+    @property
+    def media_type(self) -> str:
+        return {
+            DataFormat.ndjson: "application/x-ndjson",
+            DataFormat.csv: "text/csv; charset=utf-8",
+        }[self]
@@ -0,0 +1,47 @@
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class EventEntity(str, Enum):
+    order = "order"
+    product = "product"
+
+
+class EventAction(str, Enum):
+    created = "created"
+    status_changed = "status_changed"
+    stock_changed = "stock_changed"
+    updated = "updated"
+    deleted = "deleted"
+
+
+class ChangeEvent(BaseModel):
+    id: int = Field(..., description="Номер события, передаётся в заголовке Last-Event-ID")
+    entity: EventEntity
+    action: EventAction
+    product_id: int = Field(..., description="Товар, которого касается событие")
+    order_id: Optional[int] = Field(None, description="Заказ, если событие касается заказа")
+    data: dict = Field(..., description="Новое состояние изменённых полей")
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class EventFilter(BaseModel):
+    entity: Optional[List[EventEntity]] = Field(
+        None,
+        description="Только события указанных сущностей, по умолчанию все",
+    )
+    product_id: Optional[int] = Field(
+        None,
+        description="Только события указанного товара и его заказов",
+    )
+
+    def matches(self, event: ChangeEvent) -> bool:
+        return (
+            (self.entity is None or event.entity in self.entity)
+            and (self.product_id is None or event.product_id == self.product_id)
+        )
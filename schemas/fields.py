@@ -0,0 +1,26 @@
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, field_validator
+
+
+class FieldsParams(BaseModel):
+    """
+    Основа параметров с выбором полей ответа: наследники объявляют
+    `fields` списком значений своего Enum. Поля передаются через запятую
+    (?fields=id,name) или повтором параметра (?fields=id&fields=name).
+
+    """
+
+    @field_validator("fields", mode="before", check_fields=False)
+    @classmethod
+    def split_fields(cls, value: Any) -> Any:
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = [value]
+        return [name.strip() for item in value for name in item.split(",") if name.strip()]
+
+    @field_validator("fields", check_fields=False)
+    @classmethod
+    def unique_fields(cls, value: Optional[List[Any]]) -> Optional[List[Any]]:
+        return None if value is None else list(dict.fromkeys(value))
@@ -0,0 +1,14 @@
+import hashlib
+
+from pydantic import BaseModel, Field
+
+
+class IdempotencyRequest(BaseModel):
+    scope: str = Field(..., description="Метод и путь запроса")
+    key: str = Field(..., description="Значение заголовка Idempotency-Key")
+    fingerprint: str = Field(..., description="Хэш тела запроса")
+
+    @classmethod
+    def for_payload(cls, scope: str, key: str, payload: BaseModel) -> "IdempotencyRequest":
+        fingerprint = hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+        return cls(scope=scope, key=key, fingerprint=fingerprint)
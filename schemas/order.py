@@ -1,8 +1,11 @@
 from datetime import datetime
-from typing import Optional
+from enum import Enum
+from typing import List, Optional
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 import schemas
+from schemas.fields import FieldsParams
+from schemas.pagination import PageParams
 
 
 class Order(BaseModel):
@@ -24,6 +27,27 @@ class OrderResponse(Order):
     id: int
 
 
+class OrderBatch(BaseModel):
+    orders: List[Order] = Field(
+        ...,
+        description="Список заказов",
+        min_length=1,
+        max_length=1000,
+    )
+
+
+class OrderBatchResult(BaseModel):
+    index: int = Field(..., description="Порядковый номер заказа в запросе")
+    order: Optional[OrderResponse] = Field(None, description="Созданный заказ")
+    error: Optional[str] = Field(None, description="Причина, по которой заказ не создан")
+
+
+class OrderBatchResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[OrderBatchResult]
+
+
 class OrderDetails(BaseModel):
     id: int
     quantity: int
@@ -34,6 +58,22 @@ class OrderDetails(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class OrderDetailsField(str, Enum):
+    id = "id"
+    quantity = "quantity"
+    status = "status"
+    created_at = "created_at"
+    product = "product"
+
+
+class OrderDetailsParams(FieldsParams):
+    fields: Optional[List[OrderDetailsField]] = Field(
+        None,
+        description="Поля заказа в ответе через запятую, по умолчанию все",
+        min_length=1,
+    )
+
+
 class StatusUpdate(BaseModel):
     status_id: int = Field(
         ...,
@@ -41,3 +81,81 @@ class StatusUpdate(BaseModel):
         ge=1,
         le=3,
     )
+
+
+class OrderStatusBulkUpdate(StatusUpdate):
+    order_ids: Optional[List[int]] = Field(
+        None,
+        description="Идентификаторы (ID) заказов",
+        min_length=1,
+        max_length=10000,
+    )
+    product_id: Optional[int] = Field(
+        None,
+        description="Только заказы товара с указанным ID",
+        gt=0,
+    )
+    current_status_id: Optional[int] = Field(
+        None,
+        description="Только заказы в указанном статусе",
+        ge=1,
+        le=3,
+    )
+
+    @model_validator(mode="after")
+    def check_selector(self) -> "OrderStatusBulkUpdate":
+        if self.order_ids is None and self.product_id is None and self.current_status_id is None:
+            raise ValueError("Specify order_ids, product_id or current_status_id")
+        return self
+
+
+class OrderStatusBulkResult(BaseModel):
+    updated: int = Field(..., description="Количество обновлённых заказов")
+    missing_ids: List[int] = Field(
+        ...,
+        description="ID из order_ids, которые не найдены или не подошли под условия",
+    )
+
+
+class OrderSort(str, Enum):
+    id = "id"
+    created_at = "created_at"
+
+
+class OrderField(str, Enum):
+    product_id = "product_id"
+    quantity = "quantity"
+    id = "id"
+    status = "status"
+    created_at = "created_at"
+
+
+class OrderListParams(PageParams, FieldsParams):
+    sort: OrderSort = Field(
+        OrderSort.id,
+        description="Поле сортировки",
+    )
+    status_id: Optional[int] = Field(
+        None,
+        description="Идентификатор (ID) статуса",
+        ge=1,
+        le=3,
+    )
+    product_id: Optional[int] = Field(
+        None,
+        description="Идентификатор (ID) товара",
+        gt=0,
+    )
+    created_from: Optional[datetime] = Field(
+        None,
+        description="Заказы, созданные не раньше указанного момента",
+    )
+    created_to: Optional[datetime] = Field(
+        None,
+        description="Заказы, созданные раньше указанного момента",
+    )
+    fields: Optional[List[OrderField]] = Field(
+        None,
+        description="Поля заказа в ответе через запятую, по умолчанию id, product_id и quantity",
+        min_length=1,
+    )
@@ -0,0 +1,32 @@
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+
+class SortOrder(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
+
+class CursorParams(BaseModel):
+    cursor: Optional[str] = Field(
+        None,
+        description="Курсор следующей страницы из заголовка X-Next-Cursor",
+    )
+    limit: int = Field(
+        DEFAULT_PAGE_LIMIT,
+        description="Количество элементов на странице",
+        ge=1,
+        le=MAX_PAGE_LIMIT,
+    )
+
+
+class PageParams(CursorParams):
+    order: SortOrder = Field(
+        SortOrder.asc,
+        description="Направление сортировки",
+    )
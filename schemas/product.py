@@ -1,5 +1,12 @@
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
 from pydantic import BaseModel, ConfigDict, Field
 
+from schemas.fields import FieldsParams
+from schemas.pagination import CursorParams, PageParams
+
 
 class Product(BaseModel):
     name: str = Field(
@@ -30,3 +37,118 @@ class Product(BaseModel):
 
 class ProductResponse(Product):
     id: int
+
+
+class ProductSnapshot(ProductResponse):
+    """
+    Карточка товара вместе с версией строки: хранится в кэше,
+    чтобы ETag и тело ответа всегда соответствовали друг другу.
+
+    """
+    version: int = Field(..., description="Версия строки товара")
+    updated_at: datetime = Field(..., description="Время последнего изменения товара")
+
+
+class StockShardsUpdate(BaseModel):
+    shards: int = Field(
+        ...,
+        description="Число счётчиков остатка товара; 0 - остаток хранится в строке товара",
+        ge=0,
+        le=64,
+    )
+
+
+class StockShard(BaseModel):
+    shard: int = Field(..., description="Номер счётчика")
+    quantity: int = Field(..., description="Остаток в счётчике")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class StockShards(BaseModel):
+    product_id: int
+    quantity: int = Field(..., description="Количество товара на складе: сумма счётчиков")
+    shards: List[StockShard] = Field(
+        ..., description="Счётчики остатка; пусто, если остаток хранится в строке товара"
+    )
+
+
+class ProductSort(str, Enum):
+    id = "id"
+    name = "name"
+    price = "price"
+
+
+class ProductField(str, Enum):
+    name = "name"
+    description = "description"
+    price = "price"
+    quantity = "quantity"
+    id = "id"
+
+
+class ProductFieldsParams(FieldsParams):
+    fields: Optional[List[ProductField]] = Field(
+        None,
+        description="Поля товара в ответе через запятую, по умолчанию все",
+        min_length=1,
+    )
+
+
+class ProductListParams(PageParams, ProductFieldsParams):
+    sort: ProductSort = Field(
+        ProductSort.id,
+        description="Поле сортировки",
+    )
+    name_prefix: Optional[str] = Field(
+        None,
+        description="Начало названия товара",
+        max_length=100,
+        min_length=1,
+    )
+    price_min: Optional[float] = Field(
+        None,
+        description="Минимальная цена товара",
+        ge=0,
+    )
+    price_max: Optional[float] = Field(
+        None,
+        description="Максимальная цена товара",
+        ge=0,
+    )
+    in_stock: Optional[bool] = Field(
+        None,
+        description="Только товары в наличии (true) или только отсутствующие (false)",
+    )
+
+
+class ProductSearchParams(CursorParams):
+    q: str = Field(
+        ...,
+        description="Поисковый запрос: слова или начала слов из названия или описания",
+        min_length=1,
+        max_length=100,
+    )
+
+
+class ProductSearchResult(ProductResponse):
+    rank: float = Field(..., description="Релевантность от 0 до 1")
+
+
+class ProductImportError(BaseModel):
+    line: int = Field(..., description="Номер строки во входных данных")
+    detail: str = Field(..., description="Причина отклонения строки")
+
+
+class ProductImportResult(BaseModel):
+    inserted: int = Field(..., description="Количество добавленных товаров")
+    updated: int = Field(..., description="Количество обновлённых товаров")
+    rejected: int = Field(..., description="Количество отклонённых строк")
+    duplicates: int = Field(
+        ...,
+        description="Количество строк, перекрытых более поздней строкой с тем же названием",
+    )
+    errors: List[ProductImportError] = Field(
+        ...,
+        description="Первые ошибки разбора и валидации строк",
+    )
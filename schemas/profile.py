@@ -0,0 +1,31 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class QueryProfile(BaseModel):
+    statement: str = Field(..., description="Текст SQL-запроса")
+    duration_ms: float = Field(..., description="Время выполнения, мс")
+    rows: Optional[int] = Field(None, description="Число строк, если драйвер его сообщил")
+    location: str = Field(..., description="Место в коде сервиса, откуда выполнен запрос")
+
+
+class RepeatedQuery(BaseModel):
+    statement: str = Field(..., description="Запрос без значений параметров")
+    count: int = Field(..., description="Сколько раз он выполнен за HTTP-запрос")
+    locations: List[str] = Field(..., description="Места в коде, откуда он выполнялся")
+
+
+class RequestProfile(BaseModel):
+    id: str = Field(..., description="ID профиля из заголовка X-Profile-Id")
+    method: str
+    path: str
+    route: str = Field(..., description="Шаблон маршрута")
+    status: int
+    duration_ms: float = Field(..., description="Время обработки HTTP-запроса, мс")
+    db_duration_ms: float = Field(..., description="Суммарное время запросов к БД, мс")
+    connection_checkouts: int = Field(..., description="Сколько раз соединение бралось из пула")
+    queries: List[QueryProfile] = Field(..., description="Запросы к БД в порядке выполнения")
+    repeated: List[RepeatedQuery] = Field(
+        ..., description="Запросы одного вида, выполненные несколько раз (возможный N+1)"
+    )
@@ -0,0 +1,114 @@
+"""
+Запуск сервиса в нескольких процессах.
+
+    python server.py                 # воркеров по числу ядер
+    python server.py --workers 4 --port 8000
+
+Перед запуском воркеров схема БД один раз обновляется до последней версии
+под advisory lock, поэтому несколько одновременно стартующих экземпляров
+сервиса не выполняют миграции параллельно. Тогда же создаются партиции
+заказов на ORDERS_PARTITIONS_AHEAD месяцев вперёд. Воркеры при старте только
+проверяют версию схемы и читают справочник статусов.
+
+"""
+import argparse
+import asyncio
+from datetime import date
+import logging
+import os
+from typing import Optional
+
+import uvicorn
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import Settings, settings
+from database import make_engine, unit_of_work
+import migrate
+import partitions
+
+logger = logging.getLogger("warehouse.server")
+
+
+def available_cpus() -> int:
+    # The affinity mask respects cpusets of containers, os.cpu_count() doesn't
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def worker_connections(settings_: Settings) -> int:
+    """Сколько соединений с основной БД может открыть один воркер."""
+    # The pool plus the LISTEN connections of the event feed and the product cache
+    return settings_.db_pool_size + settings_.db_max_overflow + 2
+
+
+def worker_count(settings_: Settings, cpus: int, requested: Optional[int] = None) -> int:
+    """
+    Число воркеров: запрошенное явно, из настройки WEB_CONCURRENCY или по числу
+    ядер. Если задан DB_CONNECTION_BUDGET, воркеров не больше, чем помещается
+    в него вместе с их пулами соединений.
+
+    """
+    workers = requested or settings_.web_concurrency or cpus
+    if settings_.db_connection_budget:
+        per_worker = worker_connections(settings_)
+        fits = settings_.db_connection_budget // per_worker
+        if fits < 1:
+            raise ValueError(
+                "DB_CONNECTION_BUDGET=%s is less than one worker needs (%s connections): "
+                "lower DB_POOL_SIZE or DB_MAX_OVERFLOW"
+                % (settings_.db_connection_budget, per_worker)
+            )
+        workers = min(workers, fits)
+
+    return workers
+
+
+async def prepare_database(settings_: Settings) -> None:
+    # Index builds on large tables may run longer than the request statement timeout
+    engine = make_engine(settings_.model_copy(update={"db_statement_timeout_ms": 0}))
+    await migrate.upgrade(engine)
+    today = date.today()
+    async with unit_of_work(AsyncSession(engine)) as db_async_session:
+        await partitions.create_partitions(
+            db_async_session, today, partitions.add_months(today, settings_.orders_partitions_ahead)
+        )
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, help="число воркеров вместо WEB_CONCURRENCY")
+    parser.add_argument(
+        "--skip-migrations", action="store_true", help="не обновлять схему БД перед запуском"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.log_level, format="%(levelname)s:     %(name)s - %(message)s")
+    workers = worker_count(settings, available_cpus(), args.workers)
+    logger.info(
+        "Starting %s workers, up to %s primary DB connections",
+        workers, workers * worker_connections(settings),
+    )
+    if not args.skip_migrations:
+        asyncio.run(prepare_database(settings))
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        # On SIGTERM a worker stops accepting connections and finishes started requests;
+        # long-lived ones, such as event streams, are cut after the timeout
+        timeout_graceful_shutdown=settings.shutdown_timeout,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,24 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 from testcontainers.postgres import PostgresContainer
 
-from database import Base
-from main import app, get_db_async_session
+from main import (
+    app, get_db_async_session, get_db_primary_read_session, get_db_primary_session_factory,
+    get_db_read_session, get_db_session_opener,
+)
+from config import settings
+from database import unit_of_work
+import metrics
+import migrate
 import models
+import profiler
 import schemas
 
 postgres = PostgresContainer(image="postgres:16.2", driver="asyncpg")
 postgres.start()
 
 engine = create_async_engine(postgres.get_connection_url(), poolclass=NullPool)
+metrics.instrument_engine(engine, "test")
+profiler.instrument_engine(engine)
 AsyncTestSession = sessionmaker(
     bind=engine,
     class_=AsyncSession,
@@ -23,6 +32,16 @@ AsyncTestSession = sessionmaker(
 )
 
 
+@pytest.fixture(scope="session")
+def database_url():
+    return postgres.get_connection_url()
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    return engine
+
+
 @pytest.fixture(scope="session")
 async def db_session():
     yield AsyncTestSession
@@ -32,42 +51,66 @@ async def db_session():
 @pytest.fixture(scope="session")
 async def client(db_session):
     async def override_get_db():
-        db: AsyncSession = db_session()
-        try:
+        async with unit_of_work(db_session()) as db:
+            yield db
+
+    async def override_get_read_db():
+        async with unit_of_work(db_session(), read_only=True) as db:
             yield db
-        finally:
-            await db.aclose()
 
     app.dependency_overrides[get_db_async_session] = override_get_db
+    app.dependency_overrides[get_db_read_session] = override_get_read_db
+    app.dependency_overrides[get_db_primary_read_session] = override_get_read_db
+    async def open_read_session():
+        return db_session()
+
+    app.dependency_overrides[get_db_session_opener] = lambda: open_read_session
+    app.dependency_overrides[get_db_primary_session_factory] = lambda: db_session
     yield TestClient(app)
 
 
+@pytest.fixture
+def query_profile(client, monkeypatch):
+    """
+    Выполняет запрос с профилированием и возвращает ответ и профиль его запросов к БД,
+    например чтобы проверить, что эндпоинт выполняет не больше N запросов.
+
+    """
+    monkeypatch.setattr(settings, "profiling", "header")
+
+    def request(method, url, **kwargs):
+        headers = {"X-Profile": "1", **kwargs.pop("headers", {})}
+        response = client.request(method, url, headers=headers, **kwargs)
+        profile = client.get("/api/profiles/%s" % response.headers[profiler.PROFILE_ID_HEADER])
+        return response, profile.json()
+
+    return request
+
+
 @pytest.fixture(scope="session", autouse=True)
 async def create_data(db_session: AsyncSession):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-    async_db_session = db_session()
-
-    await models.Status.create_statuses(async_db_session)
-
-    await models.Product.add_product(
-        async_db_session,
-        schemas.Product(name="Laptop", description="Best laptop in market", price=1200.99, quantity=100)
-    )
-    await models.Product.add_product(
-        async_db_session,
-        schemas.Product(name="Phone", description="Best phone in market", price=600.99, quantity=200)
-    )
-    await models.Product.add_product(
-        async_db_session,
-        schemas.Product(name="Printer", description="Best printer in market", price=300.99, quantity=500)
-    )
-    await models.Order.add_order(
-        async_db_session,
-        schemas.Order(product_id=1, quantity=5)
-    )
-    await models.Order.add_order(
-        async_db_session,
-        schemas.Order(product_id=2, quantity=10)
-    )
+    await migrate.upgrade(engine)
+
+    async with unit_of_work(db_session()) as async_db_session:
+        await models.Status.load_statuses(async_db_session)
+
+        await models.Product.add_product(
+            async_db_session,
+            schemas.Product(name="Laptop", description="Best laptop in market", price=1200.99, quantity=100)
+        )
+        await models.Product.add_product(
+            async_db_session,
+            schemas.Product(name="Phone", description="Best phone in market", price=600.99, quantity=200)
+        )
+        await models.Product.add_product(
+            async_db_session,
+            schemas.Product(name="Printer", description="Best printer in market", price=300.99, quantity=500)
+        )
+        await models.Order.add_order(
+            async_db_session,
+            schemas.Order(product_id=1, quantity=5)
+        )
+        await models.Order.add_order(
+            async_db_session,
+            schemas.Order(product_id=2, quantity=10)
+        )
@@ -0,0 +1,83 @@
+import pytest
+
+from database import unit_of_work
+import models
+
+
+@pytest.fixture
+def product_id(client):
+    response = client.post(
+        "/api/products",
+        json={"name": "Analytics product", "description": "", "price": 10, "quantity": 100},
+    )
+    yield response.json()["id"]
+    client.delete("/api/products/%s" % response.json()["id"])
+
+
+def rounded(rows):
+    return [{**row, "revenue": round(row["revenue"], 2)} for row in rows]
+
+
+def daily(client, product_id):
+    return [
+        (row["status"], row["orders"], row["units"], row["revenue"])
+        for row in client.get("/api/analytics/daily", params={"product_id": product_id}).json()
+    ]
+
+
+@pytest.mark.usefixtures("client")
+class TestAnalytics:
+
+    def test_orders_are_counted_when_created(self, client, product_id):
+        client.post("/api/orders", json={"product_id": product_id, "quantity": 3})
+        client.post("/api/orders/batch", json={"orders": [
+            {"product_id": product_id, "quantity": 1},
+            {"product_id": product_id, "quantity": 2},
+        ]})
+
+        assert daily(client, product_id) == [("в процессе", 3, 6, 60.0)]
+
+    def test_orders_move_between_statuses(self, client, product_id):
+        first = client.post("/api/orders", json={"product_id": product_id, "quantity": 3}).json()
+        second = client.post("/api/orders", json={"product_id": product_id, "quantity": 1}).json()
+
+        client.patch("/api/orders/%s" % first["id"], json={"status_id": 2})
+        client.patch("/api/orders/%s" % first["id"], json={"status_id": 2})
+        client.patch("/api/orders/status", json={"status_id": 3, "order_ids": [second["id"]]})
+
+        assert daily(client, product_id) == [("отправлен", 1, 3, 30.0), ("доставлен", 1, 1, 10.0)]
+
+    def test_revenue_uses_price_at_order_time(self, client, product_id):
+        client.post("/api/orders", json={"product_id": product_id, "quantity": 2})
+        client.put(
+            "/api/products/%s" % product_id,
+            json={"name": "Analytics product", "description": "", "price": 50, "quantity": 98},
+        )
+        client.post("/api/orders", json={"product_id": product_id, "quantity": 1})
+
+        assert daily(client, product_id) == [("в процессе", 2, 3, 70.0)]
+
+    def test_top_products_by_units(self, client, product_id):
+        client.post("/api/orders", json={"product_id": product_id, "quantity": 90})
+
+        top = client.get("/api/analytics/products", params={"sort": "units", "limit": 1}).json()
+
+        assert top == [{
+            "product_id": product_id,
+            "name": "Analytics product",
+            "stock": 10,
+            "orders": 1,
+            "units": 90,
+            "revenue": 900.0,
+        }]
+
+    async def test_rebuild_matches_incremental_summary(self, client, db_session, product_id):
+        client.post("/api/orders", json={"product_id": product_id, "quantity": 4})
+        client.patch("/api/orders/status", json={"status_id": 2, "product_id": product_id})
+        client.post("/api/orders", json={"product_id": product_id, "quantity": 1})
+        incremental = rounded(client.get("/api/analytics/daily").json())
+
+        async with unit_of_work(db_session()) as db_async_session:
+            await models.OrderStats.rebuild(db_async_session)
+
+        assert rounded(client.get("/api/analytics/daily").json()) == incremental
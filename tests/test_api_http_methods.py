@@ -1,5 +1,6 @@
 import pytest
 
+from database import unit_of_work
 import models
 import schemas
 
@@ -29,8 +30,8 @@ class TestProductRoutes:
             "/api/products",
             json=test_product,
         )
-        async_db_session = db_session()
-        await models.Product.delete_product(async_db_session, product_id=response.json()["id"])
+        async with unit_of_work(db_session()) as async_db_session:
+            await models.Product.delete_product(async_db_session, product_id=response.json()["id"])
         assert len(response.json()) == 5
         assert response.status_code == 201
 
@@ -50,19 +51,20 @@ class TestProductRoutes:
         assert response.status_code == 200
 
     async def test_successfully_response_when_delete_product(self, client, db_session):
-        async_db_session = db_session()
         test_product = {
             "name": "Test product",
             "description": "Test description",
             "price": 50,
             "quantity": 50
         }
-        product = await models.Product.add_product(async_db_session, schemas.Product(**test_product))
-        products_before = await models.Product.get_products(async_db_session)
+        async with unit_of_work(db_session()) as async_db_session:
+            product = await models.Product.add_product(async_db_session, schemas.Product(**test_product))
+            products_before = await models.Product.get_products(async_db_session)
 
         response = client.delete(f"/api/products/{product.id}")
 
-        products_after = await models.Product.get_products(async_db_session)
+        async with unit_of_work(db_session(), read_only=True) as async_db_session:
+            products_after = await models.Product.get_products(async_db_session)
         assert len(products_before) == len(products_after) + 1
         assert response.status_code == 204
 
@@ -0,0 +1,91 @@
+import gzip
+
+import brotli
+import pytest
+
+import compression
+import conditional
+from config import settings
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip, deflate", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("gzip;q=0", None),
+        ("*;q=0.5", compression.supported_encodings()[0]),
+        ("deflate, *;q=0", None),
+    ],
+)
+def test_choose_encoding(accept_encoding, expected):
+    assert compression.choose_encoding(accept_encoding) == expected
+
+
+@pytest.mark.usefixtures("client")
+class TestCompression:
+
+    def test_large_list_is_compressed_with_gzip(self, client, monkeypatch):
+        monkeypatch.setattr(settings, "compression_min_size", 10)
+        plain = client.get(
+            "/api/products", params={"limit": 100}, headers={"Accept-Encoding": "identity"}
+        )
+
+        response = client.get(
+            "/api/products", params={"limit": 100}, headers={"Accept-Encoding": "gzip"}
+        )
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert int(response.headers["Content-Length"]) < len(plain.content)
+        assert response.content == plain.content
+        assert "Content-Encoding" not in plain.headers
+
+    def test_brotli_response_decodes_and_has_own_etag(self, client, monkeypatch):
+        monkeypatch.setattr(settings, "compression_min_size", 10)
+        plain = client.get("/api/products/3", headers={"Accept-Encoding": "identity"})
+
+        response = client.get("/api/products/3", headers={"Accept-Encoding": "br"})
+        revalidated = client.get(
+            "/api/products/3",
+            headers={"Accept-Encoding": "br", "If-None-Match": response.headers["ETag"]},
+        )
+
+        assert response.headers["Content-Encoding"] == "br"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert response.json() == plain.json()
+        assert response.headers["ETag"] == conditional.encoding_etag(plain.headers["ETag"], "br")
+        assert revalidated.status_code == 304
+        assert revalidated.headers["ETag"] == response.headers["ETag"]
+
+    def test_small_response_is_not_compressed(self, client, monkeypatch):
+        monkeypatch.setattr(settings, "compression_min_size", 1_000_000)
+
+        response = client.get("/api/products/3", headers={"Accept-Encoding": "gzip"})
+
+        assert "Content-Encoding" not in response.headers
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert int(response.headers["Content-Length"]) == len(response.content)
+
+
+def test_compress_gzip_round_trip():
+    body = b'{"id": 1}' * 100
+
+    assert gzip.decompress(compression.compress(body, "gzip")) == body
+
+
+def test_compress_brotli_round_trip():
+    body = b'{"id": 1}' * 100
+
+    assert brotli.decompress(compression.compress(body, "br")) == body
+
+
+def test_encoding_etag_is_compared_without_encoding():
+    etag = conditional.encoding_etag('"5"', "gzip")
+
+    assert etag == '"5-gzip"'
+    assert conditional.strip_encoding(etag) == '"5"'
+    assert conditional.strip_encoding('W/"5"') == 'W/"5"'
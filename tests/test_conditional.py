@@ -0,0 +1,92 @@
+import pytest
+
+
+@pytest.mark.usefixtures("client")
+class TestConditionalProductRequests:
+
+    def test_not_modified_when_etag_matches(self, client):
+        response = client.get("/api/products/3")
+        etag = response.headers["ETag"]
+
+        cached = client.get("/api/products/3", headers={"If-None-Match": etag})
+
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["ETag"] == etag
+        assert len(response.json()) == 5
+
+    def test_not_modified_when_not_changed_since(self, client):
+        response = client.get("/api/products/3")
+
+        cached = client.get(
+            "/api/products/3", headers={"If-Modified-Since": response.headers["Last-Modified"]}
+        )
+
+        assert cached.status_code == 304
+
+    def test_list_etag_changes_after_update(self, client):
+        response = client.get("/api/products")
+        etag = response.headers["ETag"]
+        product = client.get("/api/products/3").json()
+
+        assert client.get("/api/products", headers={"If-None-Match": etag}).status_code == 304
+
+        client.put("/api/products/3", json={**product, "description": "Changed for ETag"})
+        changed = client.get("/api/products", headers={"If-None-Match": etag})
+
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+
+    def test_precondition_failed_when_if_match_is_stale(self, client):
+        response = client.get("/api/products/3")
+        etag, product = response.headers["ETag"], response.json()
+
+        updated = client.put(
+            "/api/products/3",
+            json={**product, "price": 299.99},
+            headers={"If-Match": etag},
+        )
+        stale = client.put(
+            "/api/products/3",
+            json={**product, "price": 199.99},
+            headers={"If-Match": etag},
+        )
+
+        assert updated.status_code == 200
+        assert updated.headers["ETag"] != etag
+        assert stale.status_code == 412
+        assert client.get("/api/products/3").json()["price"] == 299.99
+
+    def test_not_found_when_if_match_for_missing_product(self, client):
+        response = client.put(
+            "/api/products/100500",
+            json={"name": "Missing", "description": "", "price": 1, "quantity": 1},
+            headers={"If-Match": '"1"'},
+        )
+
+        assert response.status_code == 404
+
+
+@pytest.mark.usefixtures("client")
+class TestConditionalOrderRequests:
+
+    def test_etag_changes_after_status_update(self, client):
+        order_id = client.post("/api/orders", json={"product_id": 3, "quantity": 1}).json()["id"]
+        response = client.get("/api/orders/%s" % order_id)
+        etag = response.headers["ETag"]
+
+        assert client.get(
+            "/api/orders/%s" % order_id, headers={"If-None-Match": etag}
+        ).status_code == 304
+
+        client.patch("/api/orders/%s" % order_id, json={"status_id": 2})
+        changed = client.get("/api/orders/%s" % order_id, headers={"If-None-Match": etag})
+
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+        assert changed.json()["status"] == "отправлен"
+
+    def test_not_found_for_missing_order(self, client):
+        response = client.get("/api/orders/100500", headers={"If-None-Match": '"1.1"'})
+
+        assert response.status_code == 404
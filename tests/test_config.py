@@ -0,0 +1,35 @@
+from sqlalchemy import text
+
+from config import Settings
+from database import make_engine
+
+
+class TestSettings:
+
+    def test_settings_from_environment(self, monkeypatch):
+        monkeypatch.setenv("DB_POOL_SIZE", "3")
+        monkeypatch.setenv("DB_ECHO", "debug")
+        monkeypatch.setenv("DATABASE_URL", "postgresql+asyncpg://user:secret@db:5432/app")
+
+        settings = Settings()
+        engine = make_engine(settings)
+
+        assert engine.pool.size() == 3
+        assert engine.echo == "debug"
+        assert "secret" not in settings.safe_dump()["database_url"]
+
+    async def test_engine_applies_session_settings(self, database_url):
+        engine = make_engine(
+            Settings(
+                database_url=database_url,
+                db_statement_timeout_ms=1234,
+                db_application_name="warehouse-test",
+            )
+        )
+        async with engine.connect() as conn:
+            statement_timeout = await conn.scalar(text("SHOW statement_timeout"))
+            application_name = await conn.scalar(text("SHOW application_name"))
+        await engine.dispose()
+
+        assert statement_timeout == "1234ms"
+        assert application_name == "warehouse-test"
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from sqlalchemy import insert
+
+from database import unit_of_work
+import events
+import models
+import schemas
+
+
+@pytest.fixture
+async def broker(database_url):
+    event_broker = events.EventBroker(database_url, queue_size=100)
+    yield event_broker
+    await event_broker.close()
+
+
+@pytest.fixture
+async def product(db_session):
+    async with unit_of_work(db_session()) as db_async_session:
+        new_product = await models.Product.add_product(
+            db_async_session,
+            schemas.Product(name="Evented product", description="", price=5, quantity=10),
+        )
+    yield new_product
+    async with unit_of_work(db_session()) as db_async_session:
+        await models.Product.delete_product(db_async_session, new_product.id)
+
+
+async def next_events(subscription, count):
+    return [await asyncio.wait_for(subscription.get(), 5) for _ in range(count)]
+
+
+def make_event(event_id, product_id=1, entity=schemas.EventEntity.order):
+    return schemas.ChangeEvent(
+        id=event_id,
+        entity=entity,
+        action=schemas.EventAction.created,
+        product_id=product_id,
+        data={},
+        created_at="2026-01-01T00:00:00Z",
+    )
+
+
+class TestSubscription:
+
+    def test_filter_by_entity_and_product(self):
+        event_filter = schemas.EventFilter(entity=[schemas.EventEntity.product], product_id=2)
+
+        assert event_filter.matches(make_event(1, product_id=2, entity=schemas.EventEntity.product))
+        assert not event_filter.matches(make_event(2, product_id=2))
+        assert not event_filter.matches(make_event(3, product_id=3, entity=schemas.EventEntity.product))
+
+    async def test_slow_subscriber_is_closed_when_queue_overflows(self):
+        subscription = events.Subscription(schemas.EventFilter(), maxsize=2)
+        for event_id in range(3):
+            subscription.publish(make_event(event_id))
+
+        assert subscription.closed
+        assert await subscription.get() is None
+
+    def test_server_sent_event_format(self):
+        text = events.format_event(make_event(7))
+
+        assert text.startswith("id: 7\nevent: order.created\ndata: {")
+        assert text.endswith("}\n\n")
+
+
+@pytest.mark.usefixtures("db_session")
+class TestEventBroker:
+
+    async def test_order_emits_order_and_stock_events(self, broker, db_session, product):
+        subscription = await broker.subscribe(schemas.EventFilter(product_id=product.id))
+
+        async with unit_of_work(db_session()) as db_async_session:
+            order_item = await models.Order.add_order(
+                db_async_session, schemas.Order(product_id=product.id, quantity=3)
+            )
+        created, stock = await next_events(subscription, 2)
+
+        assert (created.entity, created.action) == (schemas.EventEntity.order, schemas.EventAction.created)
+        assert created.order_id == order_item.id
+        assert (stock.action, stock.data) == (schemas.EventAction.stock_changed, {"quantity": 7})
+
+    async def test_status_change_is_published(self, broker, db_session, product):
+        async with unit_of_work(db_session()) as db_async_session:
+            order_item = await models.Order.add_order(
+                db_async_session, schemas.Order(product_id=product.id, quantity=1)
+            )
+        subscription = await broker.subscribe(schemas.EventFilter(
+            entity=[schemas.EventEntity.order], product_id=product.id
+        ))
+
+        async with unit_of_work(db_session()) as db_async_session:
+            await models.Order.update_status(
+                db_async_session, order_item.id, schemas.StatusUpdate(status_id=2)
+            )
+        event, = await next_events(subscription, 1)
+
+        assert event.action == schemas.EventAction.status_changed
+        assert event.data == {"status_id": 2, "previous_status_id": 1}
+
+    async def test_stream_replays_events_after_last_event_id(self, broker, db_session, product):
+        event_filter = schemas.EventFilter(product_id=product.id)
+        async with unit_of_work(db_session()) as db_async_session:
+            first, = await models.ChangeEvent.read_after(db_async_session, 0, event_filter, 1)
+            await models.Product.update_product(
+                db_async_session, product.id,
+                schemas.Product(name="Evented product", description="Changed", price=5, quantity=10),
+            )
+
+        stream = events.stream_events(broker, db_session, event_filter, last_event_id=first.id)
+        messages = [await stream.__anext__() for _ in range(2)]
+        await stream.aclose()
+
+        assert messages[0] == "retry: %s\n\n" % events.RETRY_MS
+        assert first.action == schemas.EventAction.created
+        assert "\nevent: product.updated\n" in messages[1]
+        assert broker.subscriptions == set()
+
+    async def test_replay_returns_event_committed_after_greater_id(self, db_session, product):
+        event_filter = schemas.EventFilter(product_id=product.id)
+
+        def insert_event(action):
+            return insert(models.ChangeEvent).values(
+                entity="product", action=action, product_id=product.id, data={}
+            ).returning(models.ChangeEvent.id)
+
+        async with unit_of_work(db_session()) as late_session:
+            late_id = await late_session.scalar(insert_event(schemas.EventAction.stock_changed.value))
+            async with unit_of_work(db_session()) as early_session:
+                early_id = await early_session.scalar(insert_event(schemas.EventAction.updated.value))
+            # The client got the event with the greater ID and reconnects
+            async with unit_of_work(db_session()) as db_async_session:
+                before_commit = await models.ChangeEvent.read_after(
+                    db_async_session, early_id, event_filter, 100
+                )
+
+        async with unit_of_work(db_session()) as db_async_session:
+            after_commit = await models.ChangeEvent.read_after(
+                db_async_session, early_id, event_filter, 100
+            )
+
+        assert late_id < early_id
+        assert before_commit == []
+        assert [event.id for event in after_commit] == [late_id]
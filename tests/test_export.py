@@ -0,0 +1,25 @@
+import csv
+import io
+import json
+
+import pytest
+
+
+@pytest.mark.usefixtures("client")
+class TestExportRoutes:
+
+    def test_products_ndjson(self, client):
+        response = client.get("/api/products/export")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [row["name"] for row in rows] == ["Laptop", "Phone", "Printer"]
+
+    def test_orders_csv(self, client):
+        response = client.get("/api/orders/export", params={"format": "csv"})
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+
+        assert response.status_code == 200
+        assert list(rows[0]) == ["id", "product_id", "quantity", "status_id", "created_at"]
+        assert [(row["product_id"], row["quantity"]) for row in rows[:2]] == [("1", "5"), ("2", "10")]
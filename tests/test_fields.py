@@ -0,0 +1,45 @@
+import pytest
+
+
+@pytest.mark.usefixtures("client")
+class TestSparseFields:
+
+    def test_product_list_returns_only_requested_fields(self, client):
+        full = client.get("/api/products", params={"limit": 2}).json()
+
+        response = client.get("/api/products", params={"limit": 2, "fields": "id,quantity"})
+
+        assert response.status_code == 200
+        assert response.json() == [
+            {"id": product["id"], "quantity": product["quantity"]} for product in full
+        ]
+
+    def test_product_fields_may_be_repeated(self, client):
+        response = client.get("/api/products/3", params=[("fields", "price"), ("fields", "name")])
+
+        assert response.status_code == 200
+        assert set(response.json()) == {"price", "name"}
+        assert response.headers["ETag"] == client.get("/api/products/3").headers["ETag"]
+
+    def test_order_list_and_details_return_only_requested_fields(self, client):
+        order = client.post("/api/orders", json={"product_id": 3, "quantity": 1}).json()
+        url = "/api/orders/%s" % order["id"]
+
+        listed = client.get(
+            "/api/orders", params={"product_id": 3, "limit": 1000, "fields": "id,status"}
+        ).json()
+        details = client.get(url, params={"fields": "quantity,status"})
+        with_product = client.get(url, params={"fields": "product"}).json()
+
+        assert all(set(row) == {"id", "status"} for row in listed)
+        assert order["id"] in [row["id"] for row in listed]
+        assert details.status_code == 200
+        assert details.json() == {
+            "quantity": 1, "status": client.get(url).json()["status"],
+        }
+        assert details.headers["ETag"] == client.get(url).headers["ETag"]
+        assert with_product["product"] == client.get(url).json()["product"]
+
+    def test_unprocessable_entity_when_field_is_unknown(self, client):
+        assert client.get("/api/products", params={"fields": "id,secret"}).status_code == 422
+        assert client.get("/api/orders/1", params={"fields": "price"}).status_code == 422
@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+
+import pytest
+
+from database import unit_of_work
+import models
+import schemas
+
+
+def idempotency_headers():
+    return {"Idempotency-Key": uuid.uuid4().hex}
+
+
+@pytest.mark.usefixtures("client", "db_session")
+class TestIdempotentOrders:
+
+    def test_retry_returns_first_order_without_reserving_again(self, client):
+        headers = idempotency_headers()
+        stock_before = client.get("/api/products/3").json()["quantity"]
+
+        first = client.post("/api/orders", json={"product_id": 3, "quantity": 1}, headers=headers)
+        retry = client.post("/api/orders", json={"product_id": 3, "quantity": 1}, headers=headers)
+
+        assert first.status_code == retry.status_code == 201
+        assert retry.json() == first.json()
+        assert client.get("/api/products/3").json()["quantity"] == stock_before - 1
+
+    def test_unprocessable_when_key_is_reused_with_other_body(self, client):
+        headers = idempotency_headers()
+        client.post("/api/orders", json={"product_id": 3, "quantity": 1}, headers=headers)
+
+        response = client.post("/api/orders", json={"product_id": 3, "quantity": 2}, headers=headers)
+
+        assert response.status_code == 422
+
+    def test_failed_order_is_not_stored(self, client):
+        headers = idempotency_headers()
+        stock = client.get("/api/products/3").json()["quantity"]
+
+        rejected = client.post(
+            "/api/orders", json={"product_id": 3, "quantity": stock + 1}, headers=headers
+        )
+        client.put("/api/products/3", json={**client.get("/api/products/3").json(), "quantity": stock + 1})
+        retry = client.post(
+            "/api/orders", json={"product_id": 3, "quantity": stock + 1}, headers=headers
+        )
+        client.put("/api/products/3", json={**client.get("/api/products/3").json(), "quantity": stock})
+
+        assert rejected.status_code == 409
+        assert retry.status_code == 201
+
+    async def test_concurrent_duplicates_create_one_order(self, db_session):
+        async with unit_of_work(db_session()) as db_async_session:
+            product = await models.Product.add_product(
+                db_async_session,
+                schemas.Product(name="Idempotent product", description="", price=1, quantity=10)
+            )
+        order_schema = schemas.Order(product_id=product.id, quantity=1)
+        idempotency = schemas.IdempotencyRequest.for_payload(
+            "POST /api/orders", uuid.uuid4().hex, order_schema
+        )
+
+        async def place_order():
+            async with unit_of_work(db_session()) as db_async_session:
+                return await models.Order.add_order(db_async_session, order_schema, idempotency)
+
+        results = await asyncio.gather(*(place_order() for _ in range(10)))
+        async with unit_of_work(db_session()) as db_async_session:
+            product = await models.Product.get_product(db_async_session, product.id)
+            await models.Product.delete_product(db_async_session, product.id)
+
+        assert len({result.id for result in results}) == 1
+        assert product.quantity == 9
+
+
+@pytest.mark.usefixtures("client")
+class TestIdempotentProducts:
+
+    def test_retry_returns_created_product_instead_of_conflict(self, client):
+        headers = idempotency_headers()
+        body = {"name": "Idempotent kettle", "description": "", "price": 10, "quantity": 1}
+
+        first = client.post("/api/products", json=body, headers=headers)
+        retry = client.post("/api/products", json=body, headers=headers)
+        without_key = client.post("/api/products", json=body)
+        client.delete("/api/products/%s" % first.json()["id"])
+
+        assert first.status_code == retry.status_code == 201
+        assert retry.json() == first.json()
+        assert without_key.status_code == 409
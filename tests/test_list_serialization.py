@@ -0,0 +1,24 @@
+import pytest
+
+from config import settings
+import pagination
+
+
+@pytest.mark.usefixtures("client")
+class TestFastListSerialization:
+
+    @pytest.mark.parametrize(
+        "path, params",
+        [
+            ("/api/products", {"limit": 2, "sort": "price"}),
+            ("/api/orders", {"limit": 1, "sort": "created_at"}),
+        ],
+    )
+    def test_fast_path_returns_same_payload(self, client, monkeypatch, path, params):
+        regular = client.get(path, params=params)
+        monkeypatch.setattr(settings, "fast_list_serialization", True)
+        fast = client.get(path, params=params)
+
+        assert fast.status_code == 200
+        assert fast.content == regular.content
+        assert fast.headers[pagination.NEXT_CURSOR_HEADER] == regular.headers[pagination.NEXT_CURSOR_HEADER]
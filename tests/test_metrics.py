@@ -0,0 +1,69 @@
+import pytest
+
+import metrics
+
+
+class TestHistogram:
+
+    def test_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram("latency", "Latency", ("route",), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(("/a",), value)
+
+        assert histogram.render()[2:] == [
+            'latency_bucket{route="/a",le="0.1"} 2',
+            'latency_bucket{route="/a",le="1"} 3',
+            'latency_bucket{route="/a",le="+Inf"} 4',
+            'latency_sum{route="/a"} 3.65',
+            'latency_count{route="/a"} 4',
+        ]
+
+    def test_escapes_label_values(self):
+        counter = metrics.Counter("requests", "Requests", ("route",))
+        counter.inc(('say "hi"\\',))
+
+        assert counter.render()[2] == 'requests{route="say \\"hi\\"\\\\"} 1'
+
+
+@pytest.mark.usefixtures("client")
+class TestMetricsEndpoint:
+
+    def test_counts_requests_by_route_template_and_status(self, client):
+        labels = ("GET", "/api/products/{product_id}")
+        before_ok = metrics.requests_total.value(labels + ("200",))
+        before_missing = metrics.requests_total.value(labels + ("404",))
+
+        client.get("/api/products/1")
+        client.get("/api/products/999999")
+
+        assert metrics.requests_total.value(labels + ("200",)) == before_ok + 1
+        assert metrics.requests_total.value(labels + ("404",)) == before_missing + 1
+
+    def test_records_db_queries_of_request(self, client):
+        labels = ("GET", "/api/orders/{order_id}")
+        requests_before = metrics.request_db_queries.count(labels)
+        queries_before = metrics.request_db_queries.sum(labels)
+        checkouts_before = metrics.request_db_checkouts.sum(labels)
+
+        client.get("/api/orders/1")
+
+        assert metrics.request_db_queries.count(labels) == requests_before + 1
+        assert metrics.request_db_queries.sum(labels) > queries_before
+        assert metrics.request_db_checkouts.sum(labels) == checkouts_before + 1
+        assert metrics.query_duration.count(("test",)) > 0
+
+    def test_unknown_paths_share_one_label(self, client):
+        client.get("/no/such/path/%s" % id(self))
+
+        assert metrics.requests_total.value(("GET", metrics.UNMATCHED_ROUTE, "404")) >= 1
+
+    def test_prometheus_text_format(self, client):
+        client.get("/api/products")
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE http_request_duration_seconds histogram" in response.text
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/products"}' in response.text
+        assert 'db_query_duration_seconds_count{db="test"}' in response.text
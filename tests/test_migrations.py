@@ -0,0 +1,136 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import make_url, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from database import Base
+import migrate
+
+
+def index_names(plan):
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= index_names(child)
+    return names
+
+
+@pytest.fixture
+async def scratch_engine(db_engine, database_url):
+    """
+    Движок отдельной пустой БД, которая удаляется после теста. Тесты,
+    откатывающие миграции, не трогают общую БД остальных тестов.
+
+    """
+    name = "scratch_%s" % uuid.uuid4().hex
+    admin = db_engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with admin.connect() as connection:
+        await connection.execute(text("CREATE DATABASE %s" % name))
+    engine = create_async_engine(make_url(database_url).set(database=name), poolclass=NullPool)
+    try:
+        yield engine
+    finally:
+        await engine.dispose()
+        async with admin.connect() as connection:
+            await connection.execute(text("DROP DATABASE %s" % name))
+
+
+class TestMigrations:
+
+    async def test_schema_is_at_head(self, db_engine):
+        await migrate.check_schema(db_engine)
+
+        assert await migrate.current_revision(db_engine) == migrate.head_revision()
+
+    async def test_migrations_match_models(self, db_engine):
+        async with db_engine.connect() as connection:
+            diff = await connection.run_sync(
+                lambda sync_connection: compare_metadata(
+                    MigrationContext.configure(
+                        sync_connection, opts={"include_name": migrate.include_name}
+                    ),
+                    Base.metadata,
+                )
+            )
+
+        assert diff == []
+
+    async def test_concurrent_upgrades_run_one_at_a_time(self, scratch_engine):
+        await migrate.upgrade(scratch_engine)
+        await migrate.downgrade(scratch_engine, "-1")
+
+        await asyncio.gather(*(migrate.upgrade(scratch_engine) for _ in range(3)))
+
+        assert await migrate.current_revision(scratch_engine) == migrate.head_revision()
+
+    async def test_upgrade_of_empty_database_from_base(self, scratch_engine):
+        await migrate.upgrade(scratch_engine)
+
+        async with scratch_engine.connect() as connection:
+            locks = await connection.scalar(text(
+                "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND objid = :key"
+            ), {"key": migrate.MIGRATION_LOCK_KEY})
+        assert await migrate.current_revision(scratch_engine) == migrate.head_revision()
+        assert locks == 0
+
+    async def test_downgrade_and_upgrade_keep_data(self, scratch_engine):
+        await migrate.upgrade(scratch_engine)
+        async with scratch_engine.begin() as connection:
+            await connection.execute(text(
+                "INSERT INTO products (name, description, price) VALUES ('Scratch', 'Kept', 10)"
+            ))
+
+        await migrate.downgrade(scratch_engine, "0001")
+        assert await migrate.current_revision(scratch_engine) == "0001"
+        await migrate.upgrade(scratch_engine)
+
+        async with scratch_engine.connect() as connection:
+            products = (await connection.execute(
+                text("SELECT name, description, price FROM products")
+            )).all()
+        assert await migrate.current_revision(scratch_engine) == migrate.head_revision()
+        assert products == [("Scratch", "Kept", 10)]
+
+
+class TestQueryPlans:
+
+    @pytest.mark.parametrize(
+        "query, index",
+        [
+            ("SELECT id FROM order_items WHERE product_id = 1", "ix_order_items_product_id"),
+            ("SELECT id FROM order_items WHERE order_id = 1", "ix_order_items_order_id"),
+            ("SELECT id FROM orders WHERE status_id = 1", "ix_orders_status_id"),
+            ("SELECT id FROM orders ORDER BY created_at LIMIT 10", "ix_orders_created_at"),
+            ("SELECT id FROM products WHERE name LIKE 'Ph%'", "ix_products_name_pattern"),
+            ("SELECT id FROM products ORDER BY price, id LIMIT 10", "ix_products_price_id"),
+            (
+                "SELECT product_id FROM product_terms WHERE term = 'laptop' "
+                "ORDER BY field, product_id LIMIT 10",
+                "ix_product_terms_term",
+            ),
+            ("SELECT term FROM search_terms WHERE 'lapt' <% term", "ix_search_terms_term_trgm"),
+        ],
+    )
+    async def test_query_uses_index(self, db_engine, query, index):
+        # Test tables are tiny, so sequential scans are ruled out to see which index would be used
+        async with db_engine.connect() as connection:
+            await connection.execute(text("SET LOCAL enable_seqscan = off"))
+            plan = await connection.scalar(text("EXPLAIN (FORMAT JSON) " + query))
+
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            # Partitions are scanned with their own indexes, created from the index of the table
+            roots = set((await connection.execute(
+                text(
+                    "SELECT coalesce(CAST(pg_partition_root(CAST(name AS regclass)) AS text), name) "
+                    "FROM unnest(CAST(:names AS text[])) AS name"
+                ),
+                {"names": sorted(index_names(plan[0]["Plan"]))},
+            )).scalars())
+
+        assert index in roots
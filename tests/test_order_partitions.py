@@ -0,0 +1,85 @@
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from database import unit_of_work
+import models
+import partitions
+
+
+async def add_order_item(db_session, created_at: datetime) -> int:
+    async with unit_of_work(db_session()) as db_async_session:
+        order_item = models.OrderItem(
+            product_id=3, order=models.Order(created_at=created_at), quantity=2, price=300.99
+        )
+        db_async_session.add(order_item)
+        await db_async_session.flush()
+        return order_item.id
+
+
+async def delete_order_item(db_session, order_item_id: int, suffix: str = "") -> None:
+    async with unit_of_work(db_session()) as db_async_session:
+        order_id = await db_async_session.scalar(
+            text("DELETE FROM order_items%s WHERE id = :id RETURNING order_id" % suffix),
+            {"id": order_item_id},
+        )
+        await db_async_session.execute(
+            text("DELETE FROM orders%s WHERE id = :id" % suffix), {"id": order_id}
+        )
+
+
+class TestOrderPartitions:
+
+    def test_orders_get_creation_time_of_their_transaction(self, client):
+        first = client.post("/api/orders", json={"product_id": 1, "quantity": 1}).json()
+        second = client.post("/api/orders", json={"product_id": 1, "quantity": 1}).json()
+
+        first_created = client.get("/api/orders/%s" % first["id"]).json()["created_at"]
+        second_created = client.get("/api/orders/%s" % second["id"]).json()["created_at"]
+
+        assert first_created < second_created
+
+    async def test_new_partition_takes_rows_from_default_partition(self, db_session):
+        month = partitions.add_months(date.today(), 12)
+        order_item_id = await add_order_item(db_session, datetime(month.year, month.month, 10))
+
+        async with unit_of_work(db_session()) as db_async_session:
+            created = await partitions.create_partitions(db_async_session, month, month)
+            table = await db_async_session.scalar(
+                text(
+                    "SELECT CAST(CAST(tableoid AS regclass) AS text) "
+                    "FROM order_items WHERE id = :id"
+                ),
+                {"id": order_item_id},
+            )
+        await delete_order_item(db_session, order_item_id)
+
+        assert created == [
+            partitions.partition_name("orders", month),
+            partitions.partition_name("order_items", month),
+        ]
+        assert table == partitions.partition_name("order_items", month)
+
+    async def test_archived_order_is_found_by_id_only(self, client, db_session):
+        month = partitions.add_months(date.today(), -24)
+        order_item_id = await add_order_item(db_session, datetime(month.year, month.month, 10))
+        async with unit_of_work(db_session()) as db_async_session:
+            await partitions.create_partitions(db_async_session, month, month)
+            archived = await partitions.archive_partitions(
+                db_async_session, partitions.add_months(month, 1)
+            )
+            recreated = await partitions.create_partitions(db_async_session, month, month)
+
+        response = client.get("/api/orders/%s" % order_item_id)
+        listed = client.get("/api/orders", params={"product_id": 3, "limit": 100}).json()
+        updated = client.patch("/api/orders/%s" % order_item_id, json={"status_id": 2})
+        await delete_order_item(db_session, order_item_id, partitions.ARCHIVE_SUFFIX)
+
+        assert archived == [month]
+        assert recreated == []
+        assert response.status_code == 200
+        assert response.json()["quantity"] == 2
+        assert response.json()["created_at"].startswith(month.strftime("%Y-%m-10"))
+        assert response.headers["ETag"]
+        assert order_item_id not in [order["id"] for order in listed]
+        assert updated.status_code == 404
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from database import unit_of_work
+import models
+import schemas
+
+
+@pytest.mark.usefixtures("client", "db_session")
+class TestOrderRoutes:
+
+    def test_successfully_response_when_post_order(self, client):
+        stock_before = client.get("/api/products/3").json()["quantity"]
+
+        response = client.post("/api/orders", json={"product_id": 3, "quantity": 2})
+
+        assert response.status_code == 201
+        assert response.json()["product_id"] == 3
+        assert client.get("/api/products/3").json()["quantity"] == stock_before - 2
+
+    def test_conflict_when_not_enough_stock(self, client):
+        stock_before = client.get("/api/products/3").json()["quantity"]
+
+        response = client.post("/api/orders", json={"product_id": 3, "quantity": stock_before + 1})
+
+        assert response.status_code == 409
+        assert client.get("/api/products/3").json()["quantity"] == stock_before
+
+    def test_not_found_when_product_does_not_exist(self, client):
+        response = client.post("/api/orders", json={"product_id": 100500, "quantity": 1})
+
+        assert response.status_code == 404
+
+    async def test_concurrent_orders_do_not_oversell(self, db_session):
+        async with unit_of_work(db_session()) as db_async_session:
+            product = await models.Product.add_product(
+                db_async_session,
+                schemas.Product(name="Hot product", description="", price=1, quantity=5)
+            )
+
+        async def place_order():
+            try:
+                async with unit_of_work(db_session()) as db_async_session:
+                    await models.Order.add_order(
+                        db_async_session, schemas.Order(product_id=product.id, quantity=1)
+                    )
+                return True
+            except HTTPException as exc:
+                assert exc.status_code == 409
+                return False
+
+        results = await asyncio.gather(*(place_order() for _ in range(20)))
+        async with unit_of_work(db_session()) as db_async_session:
+            product = await models.Product.get_product(db_async_session, product.id)
+            await models.Product.delete_product(db_async_session, product.id)
+
+        assert results.count(True) == 5
+        assert product.quantity == 0
+
+    def test_batch_creates_valid_orders_and_reports_failures(self, client):
+        stock_before = client.get("/api/products/3").json()["quantity"]
+
+        response = client.post(
+            "/api/orders/batch",
+            json={
+                "orders": [
+                    {"product_id": 3, "quantity": 1},
+                    {"product_id": 100500, "quantity": 1},
+                    {"product_id": 3, "quantity": stock_before},
+                    {"product_id": 3, "quantity": 2},
+                ]
+            },
+        )
+        results = response.json()["results"]
+
+        assert response.status_code == 200
+        assert response.json()["created"] == 2
+        assert [result["order"] is not None for result in results] == [True, False, False, True]
+        assert results[3]["order"]["quantity"] == 2
+        assert client.get("/api/orders/%s" % results[3]["order"]["id"]).json()["product"]["name"] == "Printer"
+        assert client.get("/api/products/3").json()["quantity"] == stock_before - 3
+
+    def test_order_details_resolve_status_without_join(self, client):
+        response = client.patch("/api/orders/2", json={"status_id": 2})
+        query = str(select(models.OrderItem).compile(dialect=postgresql.dialect()))
+
+        assert response.json()["status"] == "отправлен"
+        assert client.get("/api/orders/1").json()["status"] == "в процессе"
+        assert "statuses" not in query
+
+    def test_bulk_status_update_by_ids(self, client):
+        response = client.patch(
+            "/api/orders/status", json={"status_id": 3, "order_ids": [1, 2, 100500]}
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"updated": 2, "missing_ids": [100500]}
+        assert client.get("/api/orders/1").json()["status"] == "доставлен"
+
+    def test_bulk_status_update_by_filter(self, client):
+        response = client.patch(
+            "/api/orders/status", json={"status_id": 1, "current_status_id": 3, "product_id": 1}
+        )
+
+        assert response.json()["updated"] >= 1
+        assert client.get("/api/orders/1").json()["status"] == "в процессе"
+        assert client.get("/api/orders/2").json()["status"] == "доставлен"
+
+    def test_bulk_status_update_requires_selector(self, client):
+        response = client.patch("/api/orders/status", json={"status_id": 1})
+
+        assert response.status_code == 422
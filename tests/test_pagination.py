@@ -0,0 +1,74 @@
+import pytest
+
+import pagination
+
+
+@pytest.mark.usefixtures("client")
+class TestProductsPagination:
+
+    def test_pages_cover_all_products_when_following_cursor(self, client):
+        all_ids = [product["id"] for product in client.get("/api/products").json()]
+
+        first_page = client.get("/api/products", params={"limit": 2})
+        cursor = first_page.headers[pagination.NEXT_CURSOR_HEADER]
+        second_page = client.get("/api/products", params={"limit": 2, "cursor": cursor})
+
+        ids = [product["id"] for product in first_page.json() + second_page.json()]
+        assert ids == all_ids
+        assert pagination.NEXT_CURSOR_HEADER not in second_page.headers
+
+    def test_sort_by_price_desc(self, client):
+        cursor, prices = None, []
+        while True:
+            params = {"limit": 1, "sort": "price", "order": "desc"}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response = client.get("/api/products", params=params)
+            prices += [product["price"] for product in response.json()]
+            cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+
+        assert prices == sorted(prices, reverse=True)
+        assert len(prices) == 3
+
+    def test_filters(self, client):
+        by_name = client.get("/api/products", params={"name_prefix": "Ph"}).json()
+        by_price = client.get("/api/products", params={"price_min": 500, "price_max": 1000}).json()
+
+        assert [product["name"] for product in by_name] == ["Phone"]
+        assert [product["name"] for product in by_price] == ["Phone"]
+
+    def test_bad_request_when_cursor_from_other_sort(self, client):
+        response = client.get("/api/products", params={"limit": 1, "sort": "name"})
+        cursor = response.headers[pagination.NEXT_CURSOR_HEADER]
+
+        response = client.get("/api/products", params={"limit": 1, "cursor": cursor})
+        assert response.status_code == 400
+
+    def test_validation_error_when_limit_above_cap(self, client):
+        response = client.get("/api/products", params={"limit": 100000})
+        assert response.status_code == 422
+
+
+@pytest.mark.usefixtures("client")
+class TestOrdersPagination:
+
+    def test_pages_when_sort_by_created_at(self, client):
+        first_page = client.get("/api/orders", params={"limit": 1, "sort": "created_at"})
+        cursor = first_page.headers[pagination.NEXT_CURSOR_HEADER]
+        second_page = client.get(
+            "/api/orders", params={"limit": 1, "sort": "created_at", "cursor": cursor}
+        )
+
+        assert len(first_page.json()) == 1
+        assert first_page.json()[0]["id"] != second_page.json()[0]["id"]
+
+    def test_filters(self, client):
+        by_product = client.get("/api/orders", params={"product_id": 2}).json()
+        by_status = client.get("/api/orders", params={"status_id": 1}).json()
+        statuses = {client.get("/api/orders/%s" % order["id"]).json()["status"] for order in by_status}
+
+        assert by_product
+        assert {order["product_id"] for order in by_product} == {2}
+        assert statuses == {"в процессе"}
@@ -0,0 +1,50 @@
+import pytest
+
+from database import unit_of_work
+import models
+
+
+@pytest.mark.usefixtures("client", "db_session")
+class TestProductImport:
+
+    async def test_import_csv(self, client, db_session):
+        body = (
+            "name,description,price,quantity\n"
+            "Import A,\"Multi\nline\",10.5,3\n"
+            "Import B,,abc,1\n"
+            "Import A,Updated,11,4\n"
+        )
+        response = client.post(
+            "/api/products/import", params={"format": "csv"}, content=body.encode()
+        )
+        result = response.json()
+        async with unit_of_work(db_session()) as db_async_session:
+            products = await models.Product.get_products(db_async_session)
+            imported = [product for product in products if product.name == "Import A"]
+            for product in imported:
+                await models.Product.delete_product(db_async_session, product.id)
+
+        assert response.status_code == 200
+        assert (result["inserted"], result["rejected"], result["duplicates"]) == (1, 1, 1)
+        assert result["errors"][0]["line"] == 4
+        assert [(product.description, product.quantity) for product in imported] == [("Updated", 4)]
+
+    async def test_import_ndjson_updates_existing(self, client, db_session):
+        client.post(
+            "/api/products/import",
+            content=b'{"name": "Import C", "description": "Old", "price": 5, "quantity": 1}\n',
+        )
+        body = (
+            '{"name": "Import C", "description": "Imported", "price": 6, "quantity": 2}\n'
+            'not json\n'
+        )
+        response = client.post("/api/products/import", content=body.encode())
+        result = response.json()
+        async with unit_of_work(db_session()) as db_async_session:
+            products = await models.Product.get_products(db_async_session)
+            imported = [product for product in products if product.name == "Import C"]
+            for product in imported:
+                await models.Product.delete_product(db_async_session, product.id)
+
+        assert (result["inserted"], result["updated"], result["rejected"]) == (0, 1, 1)
+        assert [(product.description, product.quantity) for product in imported] == [("Imported", 2)]
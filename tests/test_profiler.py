@@ -0,0 +1,68 @@
+import pytest
+
+import profiler
+
+
+class TestProfile:
+
+    def test_repeated_queries_are_grouped_by_shape(self):
+        profile = profiler.Profile()
+        for statement in (
+                "SELECT * FROM products WHERE id = $1",
+                "SELECT *\n FROM products WHERE id = $1",
+                "SELECT * FROM products WHERE id IN ($1, $2)",
+                "SELECT * FROM products WHERE id IN ($1, $2, $3)",
+        ):
+            profile.add(statement, 0.001, 1, "models/product.py:1 in get_product")
+
+        repeated = profile.repeated(threshold=2)
+
+        assert [(query.statement, query.count) for query in repeated] == [
+            ("SELECT * FROM products WHERE id = ?", 2),
+            ("SELECT * FROM products WHERE id IN (?)", 2),
+        ]
+        assert repeated[0].locations == ["models/product.py:1 in get_product"]
+
+
+@pytest.mark.usefixtures("client")
+class TestProfiledRequests:
+
+    def test_profile_lists_queries_with_code_location(self, query_profile):
+        response, profile = query_profile("GET", "/api/orders/1")
+
+        assert response.status_code == 200
+        assert profile["route"] == "/api/orders/{order_id}"
+        assert profile["queries"]
+        assert all(query["duration_ms"] >= 0 for query in profile["queries"])
+        assert any(query["location"].startswith("models/order.py") for query in profile["queries"])
+
+    def test_server_timing_header(self, query_profile):
+        response, profile = query_profile("GET", "/api/products")
+
+        assert response.headers["Server-Timing"].startswith(
+            'db;dur=%s;desc="%s queries"' % (profile["db_duration_ms"], len(profile["queries"]))
+        )
+
+    @pytest.mark.parametrize(
+        "method, url, max_queries",
+        [
+            ("GET", "/api/products", 2),
+            ("GET", "/api/orders", 2),
+            ("GET", "/api/orders/1", 2),
+        ],
+    )
+    def test_endpoint_query_budget(self, query_profile, method, url, max_queries):
+        response, profile = query_profile(method, url)
+
+        assert response.status_code == 200
+        assert len(profile["queries"]) <= max_queries, profile["queries"]
+        assert profile["repeated"] == []
+
+    def test_not_profiled_when_disabled(self, client):
+        response = client.get("/api/products", headers={"X-Profile": "1"})
+
+        assert profiler.PROFILE_ID_HEADER not in response.headers
+        assert "Server-Timing" not in response.headers
+
+    def test_not_found_when_profile_is_unknown(self, client):
+        assert client.get("/api/profiles/unknown").status_code == 404
@@ -0,0 +1,99 @@
+import pytest
+
+import pagination
+
+PRODUCTS = [
+    {"name": "Espresso machine", "description": "Stainless steel coffee maker"},
+    {"name": "Electric kettle", "description": "Stainless steel kettle for tea"},
+    {"name": "Coffee grinder", "description": "Burr grinder for espresso beans"},
+]
+
+
+@pytest.fixture
+def products(client):
+    ids = [
+        client.post("/api/products", json={**product, "price": 10, "quantity": 10}).json()["id"]
+        for product in PRODUCTS
+    ]
+    yield ids
+    for product_id in ids:
+        client.delete("/api/products/%s" % product_id)
+
+
+def search(client, q, **params):
+    return client.get("/api/products/search", params={"q": q, **params})
+
+
+def names(response):
+    return [product["name"] for product in response.json()]
+
+
+@pytest.mark.usefixtures("client")
+class TestProductSearch:
+
+    def test_prefix_match_in_name_ranked_before_description(self, client, products):
+        response = search(client, "Espr")
+
+        assert response.status_code == 200
+        assert names(response) == ["Espresso machine", "Coffee grinder"]
+
+    def test_fuzzy_match_with_typo(self, client, products):
+        assert names(search(client, "kettel")) == ["Electric kettle"]
+
+    def test_all_words_must_match(self, client, products):
+        assert names(search(client, "steel coffee")) == ["Espresso machine"]
+
+    def test_rank_is_higher_for_closer_words(self, client, products):
+        exact = search(client, "kettle").json()[0]["rank"]
+        typo = search(client, "kettel").json()[0]["rank"]
+
+        assert exact == 1
+        assert 0 < typo < exact
+
+    def test_no_results_for_unrelated_query(self, client, products):
+        response = search(client, "zzzzqqq")
+
+        assert response.status_code == 200
+        assert response.json() == []
+
+    def test_pages_cover_all_results_when_following_cursor(self, client, products):
+        all_ids = [product["id"] for product in search(client, "co").json()]
+
+        ids, cursor = [], None
+        while True:
+            params = {"limit": 1}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response = search(client, "co", **params)
+            ids += [product["id"] for product in response.json()]
+            cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+
+        assert len(ids) >= 2
+        assert ids == all_ids
+
+    def test_index_follows_product_changes(self, client, products):
+        client.put(
+            "/api/products/%s" % products[1],
+            json={"name": "Electric kettle", "description": "Glass teapot", "price": 10, "quantity": 10},
+        )
+        client.delete("/api/products/%s" % products[2])
+
+        assert names(search(client, "teapot")) == ["Electric kettle"]
+        assert names(search(client, "stainless")) == ["Espresso machine"]
+        assert search(client, "grinder").json() == []
+
+    def test_imported_products_are_found(self, client, products):
+        body = '{"name": "Moka pot", "description": "Stovetop coffee maker", "price": 5, "quantity": 1}\n'
+        client.post("/api/products/import", content=body.encode())
+
+        found = search(client, "stovetop").json()
+        client.delete("/api/products/%s" % found[0]["id"])
+
+        assert [product["name"] for product in found] == ["Moka pot"]
+
+    @pytest.mark.parametrize("q", ["", "x" * 101])
+    def test_validation_error_when_query_length_invalid(self, client, q):
+        response = search(client, q)
+        assert response.status_code == 422
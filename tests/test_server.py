@@ -0,0 +1,26 @@
+import pytest
+
+from config import Settings
+import server
+
+
+class TestWorkerCount:
+
+    def test_defaults_to_cpu_count(self):
+        assert server.worker_count(Settings(web_concurrency=0, db_connection_budget=0), cpus=8) == 8
+
+    def test_requested_workers_override_settings(self):
+        assert server.worker_count(Settings(web_concurrency=2), cpus=8, requested=3) == 3
+        assert server.worker_count(Settings(web_concurrency=2), cpus=8) == 2
+
+    def test_limited_by_connection_budget(self):
+        settings = Settings(db_pool_size=5, db_max_overflow=10, db_connection_budget=50)
+
+        assert server.worker_connections(settings) == 17
+        assert server.worker_count(settings, cpus=8) == 2
+
+    def test_budget_smaller_than_one_worker(self):
+        settings = Settings(db_pool_size=5, db_max_overflow=10, db_connection_budget=10)
+
+        with pytest.raises(ValueError):
+            server.worker_count(settings, cpus=8)
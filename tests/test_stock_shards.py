@@ -0,0 +1,133 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from database import unit_of_work
+import models
+import schemas
+
+
+@pytest.fixture
+def sharded_product(client):
+    product = client.post(
+        "/api/products",
+        json={"name": "Hot %s" % uuid.uuid4().hex, "description": "", "price": 1, "quantity": 10},
+    ).json()
+    client.put("/api/products/%s/stock-shards" % product["id"], json={"shards": 4})
+    yield product
+    client.delete("/api/products/%s" % product["id"])
+
+
+@pytest.mark.usefixtures("client", "db_session")
+class TestStockShards:
+
+    def test_sharding_splits_stock_evenly_and_keeps_quantity(self, client, sharded_product):
+        shards = client.get("/api/products/%s/stock-shards" % sharded_product["id"]).json()
+
+        assert shards["quantity"] == 10
+        assert [shard["quantity"] for shard in shards["shards"]] == [3, 3, 2, 2]
+        assert client.get("/api/products/%s" % sharded_product["id"]).json()["quantity"] == 10
+
+    def test_not_found_when_product_does_not_exist(self, client):
+        response = client.put("/api/products/100500/stock-shards", json={"shards": 4})
+
+        assert response.status_code == 404
+
+    def test_order_reserves_from_one_shard_and_changes_etag(self, client, sharded_product):
+        url = "/api/products/%s" % sharded_product["id"]
+        etag = client.get(url).headers["ETag"]
+
+        response = client.post("/api/orders", json={"product_id": sharded_product["id"], "quantity": 2})
+        shards = client.get(url + "/stock-shards").json()["shards"]
+
+        assert response.status_code == 201
+        assert client.get(url).json()["quantity"] == 8
+        assert sorted(shard["quantity"] for shard in shards) in ([0, 2, 3, 3], [1, 2, 2, 3])
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+    def test_order_larger_than_any_shard_rebalances(self, client, sharded_product):
+        response = client.post("/api/orders", json={"product_id": sharded_product["id"], "quantity": 7})
+        shards = client.get("/api/products/%s/stock-shards" % sharded_product["id"]).json()
+
+        assert response.status_code == 201
+        assert shards["quantity"] == 3
+        assert [shard["quantity"] for shard in shards["shards"]] == [1, 1, 1, 0]
+
+    def test_conflict_when_shards_together_are_not_enough(self, client, sharded_product):
+        response = client.post("/api/orders", json={"product_id": sharded_product["id"], "quantity": 11})
+
+        assert response.status_code == 409
+        assert client.get("/api/products/%s" % sharded_product["id"]).json()["quantity"] == 10
+
+    def test_update_sets_total_stock(self, client, sharded_product):
+        url = "/api/products/%s" % sharded_product["id"]
+
+        response = client.put(url, json={**sharded_product, "quantity": 21})
+        shards = client.get(url + "/stock-shards").json()["shards"]
+
+        assert response.json()["quantity"] == 21
+        assert response.headers["ETag"] == client.get(url).headers["ETag"]
+        assert [shard["quantity"] for shard in shards] == [6, 5, 5, 5]
+
+    def test_unsharding_returns_stock_to_product_row(self, client, sharded_product):
+        url = "/api/products/%s" % sharded_product["id"]
+        client.post("/api/orders", json={"product_id": sharded_product["id"], "quantity": 1})
+        etag = client.get(url).headers["ETag"]
+
+        response = client.put(url + "/stock-shards", json={"shards": 0})
+
+        assert response.json() == {"product_id": sharded_product["id"], "quantity": 9, "shards": []}
+        assert client.get(url).json()["quantity"] == 9
+        assert client.get(url).headers["ETag"] != etag
+        assert client.post(
+            "/api/orders", json={"product_id": sharded_product["id"], "quantity": 9}
+        ).status_code == 201
+
+    def test_batch_reserves_from_shards(self, client, sharded_product):
+        response = client.post(
+            "/api/orders/batch",
+            json={
+                "orders": [
+                    {"product_id": sharded_product["id"], "quantity": 6},
+                    {"product_id": sharded_product["id"], "quantity": 5},
+                    {"product_id": 3, "quantity": 1},
+                ]
+            },
+        )
+        shards = client.get("/api/products/%s/stock-shards" % sharded_product["id"]).json()
+
+        assert response.json()["created"] == 2
+        assert shards["quantity"] == 4
+        assert [shard["quantity"] for shard in shards["shards"]] == [1, 1, 1, 1]
+
+    async def test_concurrent_orders_do_not_oversell(self, db_session):
+        async with unit_of_work(db_session()) as db_async_session:
+            product = await models.Product.add_product(
+                db_async_session,
+                schemas.Product(name="Sharded hot product", description="", price=1, quantity=10)
+            )
+            await models.StockShard.set_shards(
+                db_async_session, product.id, schemas.StockShardsUpdate(shards=4)
+            )
+
+        async def place_order():
+            try:
+                async with unit_of_work(db_session()) as db_async_session:
+                    await models.Order.add_order(
+                        db_async_session, schemas.Order(product_id=product.id, quantity=2)
+                    )
+                return True
+            except HTTPException as exc:
+                assert exc.status_code == 409
+                return False
+
+        results = await asyncio.gather(*(place_order() for _ in range(20)))
+        async with unit_of_work(db_session()) as db_async_session:
+            shards = await models.StockShard.get_shards(db_async_session, product.id)
+            await models.Product.delete_product(db_async_session, product.id)
+
+        assert results.count(True) == 5
+        assert shards.quantity == 0
+        assert all(shard.quantity == 0 for shard in shards.shards)
@@ -0,0 +1,81 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from database import on_commit, unit_of_work
+import models
+import schemas
+
+
+def new_product(name):
+    return schemas.Product(name=name, description="", price=1, quantity=1)
+
+
+class TestUnitOfWork:
+
+    async def test_commits_on_exit(self, db_session):
+        async with unit_of_work(db_session()) as db_async_session:
+            product = await models.Product.add_product(db_async_session, new_product("Committed"))
+
+        async with unit_of_work(db_session()) as db_async_session:
+            saved = await models.Product.get_product(db_async_session, product.id)
+            await models.Product.delete_product(db_async_session, product.id)
+
+        assert saved.name == "Committed"
+
+    async def test_rolls_back_on_exception(self, db_session):
+        with pytest.raises(RuntimeError):
+            async with unit_of_work(db_session()) as db_async_session:
+                product = await models.Product.add_product(db_async_session, new_product("Rolled back"))
+                raise RuntimeError
+
+        async with unit_of_work(db_session(), read_only=True) as db_async_session:
+            with pytest.raises(HTTPException) as exc_info:
+                await models.Product.get_product(db_async_session, product.id)
+
+        assert exc_info.value.status_code == 404
+
+    async def test_on_commit_callbacks_run_after_commit_only(self, db_session):
+        called = []
+
+        async def callback():
+            called.append(True)
+
+        async with unit_of_work(db_session()) as db_async_session:
+            on_commit(db_async_session, callback)
+            assert called == []
+        with pytest.raises(RuntimeError):
+            async with unit_of_work(db_session()) as db_async_session:
+                on_commit(db_async_session, callback)
+                raise RuntimeError
+
+        assert called == [True]
+
+    async def test_read_only_transaction(self, db_session):
+        async with unit_of_work(db_session(), read_only=True) as db_async_session:
+            read_only = await db_async_session.scalar(text("SHOW transaction_read_only"))
+        async with unit_of_work(db_session()) as db_async_session:
+            read_write = await db_async_session.scalar(text("SHOW transaction_read_only"))
+
+        assert (read_only, read_write) == ("on", "off")
+
+
+@pytest.mark.usefixtures("client")
+class TestConnectionCheckouts:
+
+    @pytest.mark.parametrize(
+        "method, url, body, status_code",
+        [
+            ("GET", "/api/products", None, 200),
+            ("GET", "/api/orders", None, 200),
+            ("GET", "/api/orders/1", None, 200),
+            ("POST", "/api/orders", {"product_id": 3, "quantity": 1}, 201),
+            ("POST", "/api/orders", {"product_id": 3, "quantity": 10 ** 6}, 409),
+            ("PATCH", "/api/orders/1", {"status_id": 1}, 200),
+        ],
+    )
+    def test_one_connection_checkout_per_request(self, query_profile, method, url, body, status_code):
+        response, profile = query_profile(method, url, json=body)
+
+        assert response.status_code == status_code
+        assert profile["connection_checkouts"] == 1